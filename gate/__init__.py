@@ -0,0 +1,9 @@
+"""
+Runtime das catracas: captura → decodificação → autorização → acionamento → registro
+Cada estágio roda na sua thread, ligado ao próximo por uma fila limitada.
+Importar o pacote não abre câmera, Redis nem GPIO; isso só acontece em build()/run()
+
+    python -m gate --profile redis
+"""
+from .config import GateConfig, PROFILES
+from .pipeline import GatePipeline, build, run
@@ -0,0 +1,18 @@
+import argparse
+
+from .config import PROFILES
+from .pipeline import run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Leitura contínua de QR Code e acionamento da catraca')
+    parser.add_argument('--profile', choices=list(PROFILES), default='redis')
+    parser.add_argument('--redis-host', help='sobrescreve o host do Redis do perfil')
+    args = parser.parse_args()
+
+    overrides = {'redis_host': args.redis_host} if args.redis_host else {}
+    run(args.profile, **overrides)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Consulta de autorização das catracas no registro mantido pelo Django
+(SET de QR codes + ZSETs com a janela de validade)
+"""
+import threading
+import time
+
+
+def dentro_da_janela(inicio, fim, agora) -> bool:
+    """Janela de validade aberta (None = sem limite)"""
+    return (inicio is None or inicio <= agora) and (fim is None or agora <= fim)
+
+
+class CachedAuthorizer:
+    """
+    Perfil 'redis': o registro inteiro e as janelas ficam em memória e são
+    recarregados a cada `cache_refresh` segundos por uma thread própria,
+    então a consulta não faz nenhum round trip
+    """
+
+    def __init__(self, redis_client, config):
+        self.redis_client = redis_client
+        self.config = config
+        self.cache_local = set()
+        self.janelas = {}  # QR code -> (início, fim) dos que têm validade
+        self.last_cache_update = 0
+
+    def refresh(self):
+        """Atualiza o cache local com todos os QR codes do Redis"""
+        try:
+            # Busca todos os QR codes do SET e as janelas de validade de uma vez
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.smembers(self.config.registry_key)
+            pipe.zrange(self.config.valid_from_key, 0, -1, withscores=True)
+            pipe.zrange(self.config.valid_until_key, 0, -1, withscores=True)
+            membros, inicios, fins = pipe.execute()
+
+            janelas = {qrcode: (inicio, None) for qrcode, inicio in inicios}
+            for qrcode, fim in fins:
+                janelas[qrcode] = (janelas.get(qrcode, (None, None))[0], fim)
+            self.cache_local, self.janelas = membros, janelas
+
+            self.last_cache_update = time.time()
+            print(f"[REDIS] Cache atualizado: {len(self.cache_local)} QR codes")
+
+        except Exception as e:
+            print(f"[REDIS] Erro ao atualizar cache: {e}")
+
+    def start(self, stop_event: threading.Event):
+        """Carrega o cache e o mantém atualizado até `stop_event`"""
+        self.refresh()
+
+        def loop():
+            while not stop_event.wait(self.config.cache_refresh):
+                self.refresh()
+
+        threading.Thread(target=loop, name='gate-cache', daemon=True).start()
+
+    def is_authorized(self, qrcode: str, agora: float = None) -> bool:
+        # A validade é conferida na memória, sem consultar o Redis
+        if qrcode not in self.cache_local:
+            return False
+        inicio, fim = self.janelas.get(qrcode, (None, None))
+        return dentro_da_janela(inicio, fim, time.time() if agora is None else agora)
+
+    def count(self) -> int:
+        return len(self.cache_local)
+
+
+class DirectAuthorizer:
+    """
+    Perfil 'django_redis': consulta o Redis a cada leitura, sem cache local
+    Cadastro e janela de validade em um único round trip (O(1) cada)
+    """
+
+    def __init__(self, redis_client, config):
+        self.redis_client = redis_client
+        self.config = config
+
+    def start(self, stop_event: threading.Event):
+        pass
+
+    def is_authorized(self, qrcode: str, agora: float = None) -> bool:
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.sismember(self.config.registry_key, qrcode)
+            pipe.zscore(self.config.valid_from_key, qrcode)
+            pipe.zscore(self.config.valid_until_key, qrcode)
+            cadastrado, inicio, fim = pipe.execute()
+            return bool(cadastrado) and dentro_da_janela(inicio, fim, time.time() if agora is None else agora)
+
+        except Exception as e:
+            print(f"[REDIS] Erro ao verificar QR code: {e}")
+            return False
+
+    def count(self) -> int:
+        try:
+            # SCARD é O(1), não percorre o keyspace
+            return self.redis_client.scard(self.config.registry_key)
+        except Exception as e:
+            print(f"[REDIS] Erro ao contar QR codes: {e}")
+            return 0
+
+
+AUTHORIZERS = {
+    'cache': CachedAuthorizer,
+    'direct': DirectAuthorizer,
+}
@@ -0,0 +1,121 @@
+"""
+Mede o pipeline da catraca sem câmera, Redis nem GPIO
+
+    python -m gate.bench --seconds 5 --authorize-ms 50
+
+Câmera, decodificador e autorizador são stubs com atrasos configuráveis;
+mostra quadros capturados/descartados por estágio e a latência entre a
+captura e o acionamento
+"""
+import argparse
+import functools
+import statistics
+import threading
+import time
+
+from .config import GateConfig
+from .decode_pool import DECODE_POOLS
+from .outputs import SimulatedOutput
+from .pipeline import GatePipeline
+
+
+class StubCamera:
+    """
+    Entrega quadros a `fps` por segundo, como cv2.VideoCapture.read()
+    O número do quadro vai nos primeiros pixels (lido pelo stub_decoder)
+    """
+
+    def __init__(self, fps: float, shape=(720, 1280, 3)):
+        import numpy
+
+        self.numpy = numpy
+        self.interval = 1 / fps
+        self.shape = shape
+        self.frames = 0
+
+    def read(self):
+        time.sleep(self.interval)
+        self.frames += 1
+        frame = self.numpy.zeros(self.shape, dtype=self.numpy.uint8)
+        frame.reshape(-1)[:4] = self.numpy.frombuffer(self.frames.to_bytes(4, 'little'), dtype=self.numpy.uint8)
+        return True, frame
+
+    def release(self):
+        pass
+
+
+class StubAuthorizer:
+    """Autoriza todo QR code após `delay` segundos (simula a ida ao Redis)"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def start(self, stop_event):
+        pass
+
+    def is_authorized(self, qrcode, agora=None):
+        time.sleep(self.delay)
+        return True
+
+    def count(self):
+        return 0
+
+
+def stub_decoder(decode_ms: float, code_every: int):
+    """
+    Decodificador falso: espera `decode_ms` (como o zbar, sem segurar o GIL)
+    Um QR code novo a cada `code_every` quadros, então o debounce não filtra nada
+    Função de módulo para funcionar também nos workers em processos
+    """
+    def decoder(frame):
+        time.sleep(decode_ms / 1000)
+        numero = int.from_bytes(frame.reshape(-1)[:4].tobytes(), 'little')
+        return [f"QR{numero}"] if numero % code_every == 0 else []
+    return decoder
+
+
+class QuietOutput(SimulatedOutput):
+    def on(self):
+        self.is_on = True
+
+    def off(self):
+        self.is_on = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline da catraca com stubs')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--decode-ms', type=float, default=20)
+    parser.add_argument('--authorize-ms', type=float, default=2)
+    parser.add_argument('--code-every', type=int, default=10, help='um QR code a cada N quadros')
+    parser.add_argument('--workers', type=int, default=1, help='workers de decodificação')
+    parser.add_argument('--pool', choices=list(DECODE_POOLS), default='thread')
+    args = parser.parse_args()
+
+    factory = functools.partial(stub_decoder, args.decode_ms, args.code_every)
+    pool = DECODE_POOLS[args.pool](factory, args.workers) if args.workers > 1 else None
+
+    recorded = []
+    config = GateConfig(output_pulse=0.001, debounce=0)
+    camera = StubCamera(args.fps)
+    pipeline = GatePipeline(config, camera, factory(), StubAuthorizer(args.authorize_ms / 1000),
+                            QuietOutput(config.output_pins), lambda qrcode, allowed, captured_at: recorded.append(qrcode),
+                            pool=pool)
+
+    pipeline.start()
+    threading.Event().wait(args.seconds)
+    pipeline.stop()
+
+    print(f"Quadros lidos: {camera.frames} ({camera.frames / args.seconds:.1f}/s)")
+    for name, stats in pipeline.stats().items():
+        print(f"{name}: {stats}")
+    print(f"Acessos registrados: {len(recorded)}")
+    latency = pipeline.stages[3].latency
+    if latency:
+        print(f"Latência captura→acionamento: mediana {statistics.median(latency) * 1000:.1f} ms, "
+              f"máx {max(latency) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
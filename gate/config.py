@@ -0,0 +1,100 @@
+"""
+Configuração das catracas
+Os perfis reproduzem os antigos scripts: 'redis' (qrcode_gate.py e
+qrcode_gate_redis.py) e 'django_redis' (qrcode_gate_django_redis.py)
+"""
+import socket
+
+
+class GateConfig:
+    """
+    Valores padrão de uma catraca; cada perfil troca só o que difere
+    Uso: GateConfig.from_profile('redis', redis_host='10.100.0.105')
+    """
+
+    # ---------- API ----------
+    api_url = "https://api.thalamus.ind.br/acesso"
+    api_timeout = 10          # timeout para chamadas da API
+    notify_api = True         # notifica a API a cada acesso autorizado
+
+    # ---------- REDIS ----------
+    redis_host = "localhost"  # mesma placa = localhost
+    redis_port = 6379
+    redis_db = 1
+    redis_timeout = 5         # timeout para conexão Redis
+    redis_options = {}        # argumentos extras do redis.Redis
+    registry_key = "qrcodes_registry"                 # SET de QR codes mantido pelo Django
+    valid_from_key = "qrcodes_registry:valid_from"    # início da validade (epoch)
+    valid_until_key = "qrcodes_registry:valid_until"  # fim da validade (epoch)
+    lookup = "cache"          # 'cache': registro inteiro em memória | 'direct': consulta a cada leitura
+    cache_refresh = 30        # segundos para atualizar o cache local (lookup 'cache')
+    debug_keys = False        # mostra uma amostra do registro ao iniciar
+
+    # ---------- SAÍDAS ----------
+    output_pins = (23,)       # acionadas juntas
+    output_pulse = 5          # segundos que a saída fica acionada
+    gpio_fallback = False     # sem GPIO: simula as saídas em vez de encerrar
+
+    # ---------- LEITURA ----------
+    camera_index = 0
+    camera_buffer_size = 1    # quadros no buffer do driver (V4L2); 1 = sempre o mais recente
+    debounce = 6              # segundos para ignorar o mesmo QR Code
+
+    # ---------- PRÉ-PROCESSAMENTO (antes do pyzbar) ----------
+    preprocess_gray = True    # converte para cinza em buffer reaproveitado
+    preprocess_scale = 1.0    # redução da imagem (0.5 = metade); 1.0 = resolução original
+    preprocess_roi = None     # (x, y, largura, altura) em frações do quadro; None = inteiro
+    preprocess_fallback_every = 5  # sem QR code, tenta o quadro inteiro a cada N quadros (0 = nunca)
+
+    # ---------- DECODIFICAÇÃO EM VÁRIOS NÚCLEOS ----------
+    decode_workers = 1        # quadros decodificados ao mesmo tempo (Pi 5: até 3, sobra um núcleo)
+    decode_pool = "thread"    # 'thread' (pyzbar libera o GIL) | 'process' (memória compartilhada)
+
+    # ---------- DETECÇÃO DE MOVIMENTO ----------
+    # Cena parada = sem decodificação; ao mudar, decodifica todo quadro por motion_hold segundos
+    motion_threshold = 0.02   # fração da miniatura que precisa mudar (0 = decodifica sempre)
+    motion_pixel_delta = 12   # diferença de cinza (0-255) para um pixel contar como mudado
+    motion_hold = 3           # segundos decodificando após a última mudança
+    gate_id = socket.gethostname()  # identifica a catraca no histórico de acessos
+    direction = "E"           # sentido registrado nos acessos (E = entrada, S = saída)
+
+    # ---------- FILAS ENTRE OS ESTÁGIOS ----------
+    # Cheias, descartam o item mais antigo: o estágio anterior nunca espera
+    # (entre captura e decodificação há só o quadro mais recente, sem fila)
+    code_queue_size = 16
+    decision_queue_size = 16
+    report_queue_size = 1000
+    notify_queue_size = 100   # notificações da API à espera (a API fora do ar não segura o registro)
+
+    def __init__(self, **overrides):
+        for name, value in overrides.items():
+            if name.startswith('_') or not hasattr(type(self), name) or callable(getattr(type(self), name)):
+                raise TypeError(f"Configuração desconhecida: {name}")
+            setattr(self, name, value)
+
+    @classmethod
+    def from_profile(cls, profile: str, **overrides) -> 'GateConfig':
+        if profile not in PROFILES:
+            raise ValueError(f"Perfil desconhecido: {profile} (use {', '.join(PROFILES)})")
+        return cls(**{**PROFILES[profile], **overrides})
+
+
+PROFILES = {
+    # Registro em memória, recarregado a cada 30 s; uma saída; notifica a API
+    'redis': {},
+    # Consulta o Redis a cada leitura (mesma configuração do Django); duas saídas;
+    # sem notificação da API; sem GPIO segue em modo simulação
+    'django_redis': {
+        'redis_host': "127.0.0.1",
+        'redis_options': {
+            'socket_keepalive': True,
+            'retry_on_timeout': True,
+            'health_check_interval': 30,
+        },
+        'lookup': "direct",
+        'debug_keys': True,
+        'output_pins': (23, 24),
+        'gpio_fallback': True,
+        'notify_api': False,
+    },
+}
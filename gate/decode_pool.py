@@ -0,0 +1,230 @@
+"""
+Decodificação em vários núcleos
+
+O estágio de decodificação reserva um worker livre, só então pega o quadro
+mais recente e o envia; com N workers, N quadros consecutivos são
+decodificados ao mesmo tempo. Cada worker tem o seu decodificador (os
+buffers do pré-processamento não são compartilhados).
+
+- 'thread': o pyzbar chama o zbar via ctypes e o OpenCV também libera o
+  GIL, então threads usam vários núcleos e o quadro não é copiado
+- 'process': processos separados; o quadro vai por memória compartilhada
+  (um slot por worker), nunca serializado pelo pickle
+
+Resultados podem chegar fora de ordem: o de um quadro mais antigo que o
+último entregue é descartado (o quadro mais novo vence)
+"""
+import itertools
+import queue
+import signal
+import threading
+from multiprocessing import get_context, shared_memory
+
+
+def build_decoder(config):
+    """pyzbar com o pré-processamento da configuração"""
+    from pyzbar import pyzbar
+
+    from .preprocess import FramePreprocessor, PreprocessedDecoder
+
+    def decode(imagem):
+        return [qr.data.decode('utf-8') for qr in pyzbar.decode(imagem)]
+
+    preprocessor = FramePreprocessor(config.preprocess_roi, config.preprocess_scale, config.preprocess_gray)
+    return PreprocessedDecoder(decode, preprocessor, config.preprocess_fallback_every)
+
+
+class DecodePool:
+    """
+    Slots livres (um por worker), coleta dos resultados e ordem de entrega
+    `factory()` cria o decodificador de cada worker
+    """
+
+    POLL_INTERVAL = 0.2  # segundos; espera máxima antes de conferir o stop_event
+
+    def __init__(self, factory, workers: int):
+        self.factory = factory
+        self.workers = workers
+        self.free = queue.Queue()
+        for slot in range(workers):
+            self.free.put(slot)
+        self.tasks = None
+        self.results = None
+        self.stop_event = None
+        self.on_result = None
+        self.last_seq = -1
+        self.stale = 0  # resultados descartados por chegarem depois de um quadro mais novo
+        self.errors = 0
+        self._seq = itertools.count()
+
+    def start(self, on_result, stop_event: threading.Event):
+        """Sobe os workers; `on_result(captured_at, qrcodes)` recebe cada quadro com QR code"""
+        self.on_result = on_result
+        self.stop_event = stop_event
+        self._spawn()
+        self._collector = threading.Thread(target=self._collect, name='gate-decode-results', daemon=True)
+        self._collector.start()
+
+    def acquire(self, timeout: float):
+        """Reserva um worker livre; None se nenhum liberou dentro do timeout"""
+        try:
+            return self.free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot: int):
+        self.free.put(slot)
+
+    def send(self, slot: int, captured_at: float, frame):
+        self._send(slot, next(self._seq), captured_at, frame)
+
+    def _collect(self):
+        while not self.stop_event.is_set():
+            try:
+                slot, seq, captured_at, qrcodes, erro = self.results.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            self.release(slot)
+            if erro:
+                self.errors += 1
+                print(f"[gate-decode] Erro no worker: {erro}")
+                continue
+            if seq <= self.last_seq:
+                self.stale += 1
+                continue
+            self.last_seq = seq
+            if qrcodes:
+                self.on_result(captured_at, qrcodes)
+
+    def stats(self):
+        return {'workers': self.workers, 'stale': self.stale, 'errors': self.errors}
+
+    def _spawn(self):
+        raise NotImplementedError
+
+    def _send(self, slot, seq, captured_at, frame):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+def _decodificar(decoder, slot, seq, captured_at, frame):
+    try:
+        return slot, seq, captured_at, decoder(frame), None
+    except Exception as e:
+        return slot, seq, captured_at, [], str(e)
+
+
+class ThreadDecodePool(DecodePool):
+    """Workers em threads; o quadro é passado por referência"""
+
+    def _spawn(self):
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'gate-decode-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self):
+        decoder = self.factory()
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            self.results.put(_decodificar(decoder, *task))
+
+    def _send(self, slot, seq, captured_at, frame):
+        self.tasks.put((slot, seq, captured_at, frame))
+
+    def stop(self, timeout: float = 2):
+        for _ in self._threads:
+            self.tasks.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def _process_worker(factory, tasks, results):
+    """Loop de um processo decodificador: lê o quadro direto da memória compartilhada"""
+    import numpy
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # o Ctrl+C é tratado pelo processo principal
+    decoder = factory()
+    anexo = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        name, slot, shape, dtype, seq, captured_at = task
+        try:
+            if anexo is None or anexo.name != name:
+                # Resolução nova: o processo principal criou outro bloco
+                if anexo is not None:
+                    anexo.close()
+                anexo = shared_memory.SharedMemory(name=name)
+            nbytes = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+            frame = numpy.ndarray(shape, dtype=dtype, buffer=anexo.buf, offset=slot * nbytes)
+            results.put(_decodificar(decoder, slot, seq, captured_at, frame))
+            del frame  # libera a view antes de um eventual close()
+        except Exception as e:
+            results.put((slot, seq, captured_at, [], str(e)))
+    if anexo is not None:
+        anexo.close()
+
+
+class ProcessDecodePool(DecodePool):
+    """
+    Workers em processos ('spawn': nada do estado das outras threads é herdado)
+    Um bloco de memória compartilhada com um slot de quadro por worker; o
+    quadro é copiado uma vez para o slot e o worker lê dali sem pickle
+    """
+
+    def _spawn(self):
+        ctx = get_context('spawn')
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.shm = None
+        self._retired = []  # blocos de resoluções anteriores, liberados no stop()
+        self._processes = [
+            ctx.Process(target=_process_worker, args=(self.factory, self.tasks, self.results),
+                        name=f'gate-decode-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+    def _allocate(self, frame):
+        import numpy
+
+        if self.shm is not None:
+            self._retired.append(self.shm)
+        self.shm = shared_memory.SharedMemory(create=True, size=frame.nbytes * self.workers)
+        self.layout = (frame.shape, frame.dtype.str)
+        self.slots = numpy.ndarray((self.workers,) + frame.shape, dtype=frame.dtype, buffer=self.shm.buf)
+
+    def _send(self, slot, seq, captured_at, frame):
+        if self.shm is None or self.layout != (frame.shape, frame.dtype.str):
+            self._allocate(frame)
+        self.slots[slot][...] = frame
+        self.tasks.put((self.shm.name, slot, frame.shape, frame.dtype.str, seq, captured_at))
+
+    def stop(self, timeout: float = 2):
+        for _ in self._processes:
+            self.tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.slots = None
+        for shm in self._retired + ([self.shm] if self.shm is not None else []):
+            shm.close()
+            shm.unlink()
+
+
+DECODE_POOLS = {
+    'thread': ThreadDecodePool,
+    'process': ProcessDecodePool,
+}
@@ -0,0 +1,45 @@
+"""
+Notificação da API externa a cada acesso autorizado (apenas para registro)
+"""
+import json
+
+import requests
+
+
+def notificar_api_acesso(config, cod_qrcode, sentido="E"):
+    """
+    Notifica a API sobre o acesso - apenas para registro
+    """
+    payload = {
+        "cod_qrcode": cod_qrcode,
+        "sentido": sentido
+    }
+
+    try:
+        print(f"[DEBUG] Notificando API: {config.api_url}")
+        print(f"[DEBUG] Payload: {json.dumps(payload, indent=2)}")
+
+        response = requests.post(config.api_url, json=payload, timeout=config.api_timeout)
+
+        print(f"[DEBUG] Status Code: {response.status_code}")
+        print(f"[DEBUG] Response: {response.text}")
+
+        if response.status_code == 200:
+            print("[API] Notificação enviada com sucesso!")
+            return True
+        elif response.status_code == 404:
+            print("[API] Backend não encontrado")
+            return False
+        else:
+            print(f"[ERROR] Erro ao notificar API - Status: {response.status_code}")
+            return False
+
+    except requests.exceptions.ConnectionError:
+        print("[ERROR] Erro de conexão - Verifique a internet e a URL da API")
+        return False
+    except requests.exceptions.Timeout:
+        print(f"[ERROR] Timeout na notificação da API ({config.api_timeout}s)")
+        return False
+    except Exception as e:
+        print(f"[ERROR] Erro inesperado ao notificar API: {e}")
+        return False
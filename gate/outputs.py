@@ -0,0 +1,57 @@
+"""
+Saídas digitais das catracas (gpiozero)
+O GPIO só é configurado em build_output, nunca ao importar o módulo
+"""
+
+
+class OutputBank:
+    """Saídas acionadas juntas (ex.: GPIO 23 e 24)"""
+
+    def __init__(self, devices, pins):
+        self.devices = devices
+        self.pins = pins
+        self.simulated = False
+
+    def on(self):
+        for device in self.devices:
+            device.on()
+
+    def off(self):
+        for device in self.devices:
+            device.off()
+
+
+class SimulatedOutput:
+    """Sem GPIO (ou em testes): só registra no log o que seria acionado"""
+
+    def __init__(self, pins=()):
+        self.pins = pins
+        self.simulated = True
+        self.is_on = False
+
+    def on(self):
+        self.is_on = True
+        print(f"[SIMULAÇÃO] Saídas {self.pins} seriam ACIONADAS.")
+
+    def off(self):
+        if self.is_on:
+            print(f"[SIMULAÇÃO] Saídas {self.pins} seriam DESLIGADAS.")
+        self.is_on = False
+
+
+def build_output(config):
+    """Configura o LGPIO (Raspberry Pi 5) e as saídas do perfil"""
+    try:
+        from gpiozero import Device, OutputDevice
+        from gpiozero.pins.lgpio import LGPIOFactory
+
+        Device.pin_factory = LGPIOFactory()
+        devices = [OutputDevice(pin, active_high=True, initial_value=False) for pin in config.output_pins]
+        print(f"[GPIO] Saídas configuradas nos pinos {config.output_pins} (LGPIO)")
+        return OutputBank(devices, config.output_pins)
+    except Exception as e:
+        if not config.gpio_fallback:
+            raise
+        print(f"[GPIO] Erro ao configurar GPIO: {e}")
+        print("[GPIO] Continuando sem GPIO (modo simulação)")
+        return SimulatedOutput(config.output_pins)
@@ -0,0 +1,178 @@
+"""
+Montagem do pipeline da catraca e execução de um perfil
+"""
+import queue
+import threading
+
+from .authorizers import AUTHORIZERS
+from .config import GateConfig
+from .stages import (ActuateStage, AuthorizeStage, CaptureStage, DecodeStage, LatestFrame, NotifyStage,
+                     ReportStage)
+
+
+class GatePipeline:
+    """
+    Liga os estágios pelas filas limitadas da configuração
+    As dependências são injetadas; build() monta as reais (câmera, Redis, GPIO)
+    """
+
+    def __init__(self, config: GateConfig, camera, decoder, authorizer, output, recorder, notifier=None,
+                 motion=None, pool=None):
+        self.config = config
+        self.camera = camera
+        self.authorizer = authorizer
+        self.output = output
+        self.stop_event = threading.Event()
+
+        frames = LatestFrame()  # decodificação sempre no quadro mais recente
+        codes = queue.Queue(config.code_queue_size)
+        decisions = queue.Queue(config.decision_queue_size)
+        reports = queue.Queue(config.report_queue_size)
+        notifications = queue.Queue(config.notify_queue_size) if notifier is not None else None
+        self.queues = {'frames': frames, 'codes': codes, 'decisions': decisions, 'reports': reports}
+
+        self.stages = [
+            CaptureStage(camera, frames, self.stop_event),
+            DecodeStage(decoder, frames, codes, self.stop_event, motion, pool),
+            AuthorizeStage(authorizer, config.debounce, codes, decisions, self.stop_event),
+            ActuateStage(output, config.output_pulse, decisions, reports, self.stop_event),
+            ReportStage(recorder, reports, notifications, self.stop_event),
+        ]
+        if notifier is not None:
+            self.queues['notifications'] = notifications
+            self.stages.append(NotifyStage(notifier, notifications, self.stop_event))
+
+    def start(self):
+        self.authorizer.start(self.stop_event)
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout: float = 2):
+        self.stop_event.set()
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+        self.output.off()
+        self.camera.release()
+
+    def stats(self):
+        """Contadores por estágio e ocupação das filas"""
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats['queues'] = {name: fila.qsize() for name, fila in self.queues.items()}
+        return stats
+
+
+def build(config: GateConfig) -> GatePipeline:
+    """Monta o pipeline com câmera, Redis e GPIO reais (importados só aqui)"""
+    import functools
+
+    import cv2
+    import redis
+
+    from qrcodeapp.access_events import AccessEventRecorder
+
+    from .notifier import notificar_api_acesso
+    from .decode_pool import DECODE_POOLS, build_decoder
+    from .motion import MotionGate
+    from .outputs import build_output
+
+    redis_client = redis.Redis(
+        host=config.redis_host,
+        port=config.redis_port,
+        db=config.redis_db,
+        socket_timeout=config.redis_timeout,
+        socket_connect_timeout=config.redis_timeout,
+        decode_responses=True,
+        **config.redis_options
+    )
+    try:
+        redis_client.ping()
+        print(f"[REDIS] Conectado com sucesso: {config.redis_host}:{config.redis_port} (DB:{config.redis_db})")
+    except Exception as e:
+        # O redis-py reconecta sozinho no próximo comando; até lá as leituras são negadas
+        print(f"[REDIS] Erro ao conectar: {e}")
+
+    camera = cv2.VideoCapture(config.camera_index)
+    if not camera.isOpened():
+        raise RuntimeError("Não foi possível abrir a webcam.")
+    # Quadros acumulados no buffer do V4L2 chegariam atrasados ao decodificador
+    camera.set(cv2.CAP_PROP_BUFFERSIZE, config.camera_buffer_size)
+
+    decoder = build_decoder(config)  # também valida ROI/escala antes de subir os workers
+    pool = None
+    if config.decode_workers > 1:
+        pool = DECODE_POOLS[config.decode_pool](functools.partial(build_decoder, config), config.decode_workers)
+    motion = None
+    if config.motion_threshold > 0:
+        motion = MotionGate(config.motion_threshold, config.motion_pixel_delta, config.motion_hold)
+
+    eventos = AccessEventRecorder(config.gate_id)  # histórico de acessos
+
+    def recorder(qrcode, autorizado, captured_at):
+        try:
+            eventos.record(redis_client, qrcode, autorizado, config.direction, captured_at)
+        except Exception as e:
+            print(f"[REDIS] Erro ao registrar acesso: {e}")
+
+    def notifier(qrcode):
+        return notificar_api_acesso(config, qrcode, config.direction)
+
+    authorizer = AUTHORIZERS[config.lookup](redis_client, config)
+    if config.debug_keys:
+        _debug_redis_keys(redis_client, config)
+
+    return GatePipeline(config, camera, decoder, authorizer, build_output(config), recorder,
+                        notifier if config.notify_api else None, motion, pool)
+
+
+def _debug_redis_keys(redis_client, config):
+    """Debug: mostra uma amostra do registro"""
+    try:
+        print(f"[DEBUG] Total de chaves no Redis: {redis_client.dbsize()}")
+        # Amostra do SET de QR codes (SSCAN não bloqueia o Redis)
+        print(f"[DEBUG] QR codes no SET {config.registry_key}: {redis_client.scard(config.registry_key)}")
+        _, amostra = redis_client.sscan(config.registry_key, cursor=0, count=20)
+        for qrcode in amostra:
+            print(f"  - {qrcode}")
+    except Exception as e:
+        print(f"[DEBUG] Erro ao debugar chaves: {e}")
+
+
+def run(profile: str = 'redis', **overrides):
+    """Executa a catraca com o perfil pedido até Ctrl+C"""
+    config = GateConfig.from_profile(profile, **overrides)
+    try:
+        pipeline = build(config)
+    except Exception as e:
+        print(f"[ERRO] {e}")
+        return
+
+    pipeline.start()
+
+    print(f"[READY] Sistema de QR Code iniciado (perfil {profile}).")
+    print(f"[CONFIG] API URL: {config.api_url if config.notify_api else 'desativada'}")
+    print(f"[CONFIG] Redis: {config.redis_host}:{config.redis_port} (DB:{config.redis_db})")
+    print(f"[CONFIG] Saídas: GPIO {config.output_pins}{' (SIMULAÇÃO)' if pipeline.output.simulated else ''}")
+    print(f"[CONFIG] QR Codes autorizados: {pipeline.authorizer.count()}")
+    print(f"[CONFIG] Consulta: {config.lookup}"
+          + (f" (atualização a cada {config.cache_refresh} segundos)" if config.lookup == 'cache' else ""))
+    print(f"[CONFIG] Debounce QR Code: {config.debounce} segundos")
+    print(f"[CONFIG] Pré-processamento: cinza={config.preprocess_gray} escala={config.preprocess_scale} "
+          f"ROI={config.preprocess_roi or 'quadro inteiro'}")
+    print(f"[CONFIG] Detecção de movimento: "
+          + (f"{config.motion_threshold:.0%} da cena, mantém {config.motion_hold} segundos"
+             if config.motion_threshold > 0 else "desativada"))
+    print(f"[CONFIG] Decodificação: {config.decode_workers} worker(s)"
+          + (f" ({config.decode_pool})" if config.decode_workers > 1 else ""))
+    print(f"[CONFIG] Tempo de acionamento: {config.output_pulse} segundos")
+    print(f"[CONFIG] Timeout API: {config.api_timeout} segundos")
+    print("[INFO] Pressione Ctrl+C para sair.")
+
+    try:
+        while not pipeline.stop_event.wait(60):
+            print(f"[STATS] {pipeline.stats()}")
+    except KeyboardInterrupt:
+        print("\n[INFO] Encerrando sistema...")
+    finally:
+        pipeline.stop()
+        print("[INFO] Sistema encerrado.")
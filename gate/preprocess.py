@@ -0,0 +1,107 @@
+"""
+Pré-processamento dos quadros antes do pyzbar
+
+O pyzbar recebe o quadro BGR inteiro, usa só o primeiro canal e copia tudo
+a cada leitura. Aqui o quadro é recortado na região onde o celular é
+apresentado (ROI), convertido para tons de cinza e opcionalmente reduzido,
+sempre nos mesmos buffers: nenhuma alocação por quadro depois do primeiro
+"""
+
+
+class FramePreprocessor:
+    """
+    roi: (x, y, largura, altura) em frações do quadro, ex.: (0.25, 0.2, 0.5, 0.6);
+    None = quadro inteiro. scale: fator de redução (0.5 = metade da resolução)
+    """
+
+    def __init__(self, roi=None, scale: float = 1.0, gray: bool = True):
+        import cv2  # só quando o pipeline é montado
+        import numpy
+
+        if roi is not None:
+            x, y, w, h = roi
+            if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 - x and 0 < h <= 1 - y):
+                raise ValueError(f"ROI fora do quadro: {roi}")
+        if not 0 < scale <= 1:
+            raise ValueError(f"Escala inválida: {scale}")
+
+        self.cv2 = cv2
+        self.numpy = numpy
+        self.roi = roi
+        self.scale = scale
+        self.gray = gray
+        self._buffers = {}
+
+    def _buffer(self, name, shape, like):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            # Só realoca se a resolução da câmera mudar
+            buf = self._buffers[name] = self.numpy.empty(shape, dtype=like.dtype)
+        return buf
+
+    def _window(self, frame):
+        """Fatia da ROI (view, sem cópia)"""
+        if self.roi is None:
+            return frame
+        altura, largura = frame.shape[:2]
+        x, y, w, h = self.roi
+        x0, y0 = int(x * largura), int(y * altura)
+        return frame[y0:y0 + max(1, int(h * altura)), x0:x0 + max(1, int(w * largura))]
+
+    def _to_gray(self, name, view):
+        if not self.gray or view.ndim == 2:
+            return view
+        dst = self._buffer(name, view.shape[:2], view)
+        self.cv2.cvtColor(view, self.cv2.COLOR_BGR2GRAY, dst=dst)
+        return dst
+
+    def __call__(self, frame):
+        """Imagem a decodificar: ROI → cinza → redução"""
+        view = self._to_gray('gray', self._window(frame))
+        if self.scale != 1.0:
+            altura, largura = view.shape[:2]
+            shape = (max(1, int(altura * self.scale)), max(1, int(largura * self.scale))) + view.shape[2:]
+            dst = self._buffer('small', shape, view)
+            self.cv2.resize(view, (shape[1], shape[0]), dst=dst, interpolation=self.cv2.INTER_AREA)
+            view = dst
+        return view
+
+    def full(self, frame):
+        """Quadro inteiro em cinza, para a tentativa sem ROI/redução"""
+        return self._to_gray('full', frame)
+
+    @property
+    def reduces(self) -> bool:
+        """True se __call__ entrega menos que o quadro inteiro"""
+        return self.roi is not None or self.scale != 1.0
+
+
+class PreprocessedDecoder:
+    """
+    decode(imagem) na imagem pré-processada; sem nenhum QR code, tenta o
+    quadro inteiro a cada `fallback_every` quadros vazios (0 = nunca), para
+    achar códigos fora da ROI ou pequenos demais depois da redução sem
+    dobrar o custo de todo quadro vazio
+    """
+
+    def __init__(self, decode, preprocessor: FramePreprocessor, fallback_every: int = 5):
+        self.decode = decode
+        self.preprocessor = preprocessor
+        self.fallback_every = fallback_every
+        self._vazios = 0
+        self.fallback_hits = 0
+
+    def __call__(self, frame):
+        qrcodes = self.decode(self.preprocessor(frame))
+        if qrcodes or not self.preprocessor.reduces or not self.fallback_every:
+            self._vazios = 0
+            return qrcodes
+
+        self._vazios += 1
+        if self._vazios < self.fallback_every:
+            return qrcodes
+        self._vazios = 0
+        qrcodes = self.decode(self.preprocessor.full(frame))
+        if qrcodes:
+            self.fallback_hits += 1
+        return qrcodes
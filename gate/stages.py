@@ -0,0 +1,310 @@
+"""
+Estágios do pipeline da catraca: captura → decodificação → autorização →
+acionamento → registro → notificação da API
+
+Cada estágio roda na sua thread e conversa com o próximo por uma fila
+limitada. Quando a fila seguinte está cheia o item mais antigo é
+descartado, então um Redis lento ou uma decodificação lenta nunca travam a
+captura: o estágio lento só passa a ver quadros mais recentes.
+Câmera, decodificador, autorizador, saída e registro são injetados, então
+cada estágio pode ser testado/medido com stubs
+"""
+import queue
+import threading
+import time
+
+
+def offer(fila: queue.Queue, item) -> bool:
+    """Coloca o item sem bloquear; com a fila cheia descarta o mais antigo. True se descartou"""
+    descartou = False
+    while True:
+        try:
+            fila.put_nowait(item)
+            return descartou
+        except queue.Full:
+            try:
+                fila.get_nowait()
+                descartou = True
+            except queue.Empty:
+                pass
+
+
+class LatestFrame:
+    """
+    Buffer de um único quadro entre a captura e a decodificação
+    Cada put substitui o quadro anterior; get espera por um quadro que ainda
+    não foi entregue. O decodificador sempre pega o quadro mais recente, sem
+    fila de quadros velhos na frente
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._fresh = False
+
+    def put(self, item) -> bool:
+        """Publica o quadro; True se descartou um que ninguém tinha lido"""
+        with self._cond:
+            descartou = self._fresh
+            self._item, self._fresh = item, True
+            self._cond.notify()
+            return descartou
+
+    def get(self, timeout: float = None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh, timeout):
+                raise queue.Empty
+            self._fresh = False
+            return self._item
+
+    def qsize(self) -> int:
+        return int(self._fresh)
+
+
+class Decision:
+    """Decisão sobre um QR code lido, do autorizador até o registro"""
+
+    __slots__ = ('qrcode', 'allowed', 'captured_at')
+
+    def __init__(self, qrcode: str, allowed: bool, captured_at: float):
+        self.qrcode = qrcode
+        self.allowed = allowed
+        self.captured_at = captured_at
+
+
+class Stage(threading.Thread):
+    """Consome a fila de entrada e publica na de saída até `stop_event`"""
+
+    POLL_INTERVAL = 0.2  # segundos; espera máxima antes de conferir o stop_event
+
+    def __init__(self, name: str, inbox, outbox, stop_event: threading.Event):
+        super().__init__(name=f"gate-{name}", daemon=True)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop_event = stop_event
+        self.processed = 0
+        self.dropped = 0  # itens descartados na fila de saída
+        self.errors = 0
+
+    def emit(self, item):
+        if self.outbox is not None and offer(self.outbox, item):
+            self.dropped += 1
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                item = self.inbox.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            try:
+                self.process(item)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] Erro: {e}")
+
+    def process(self, item):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'processed': self.processed, 'dropped': self.dropped, 'errors': self.errors}
+
+
+class CaptureStage(Stage):
+    """
+    Lê quadros da câmera (interface do cv2.VideoCapture) o mais rápido
+    possível e publica só o mais recente (LatestFrame). Sem espera fixa entre
+    leituras: o ritmo é o da câmera
+    """
+
+    RETRY_INTERVAL = 0.1  # segundos; espera após uma leitura sem quadro
+
+    def __init__(self, camera, outbox, stop_event):
+        super().__init__('capture', None, outbox, stop_event)
+        self.camera = camera
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                ret, frame = self.camera.read()
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] Erro na câmera: {e}")
+                ret = False
+            if not ret:
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            self.processed += 1
+            if self.outbox.put((time.time(), frame)):
+                self.dropped += 1
+
+
+class DecodeStage(Stage):
+    """
+    Extrai os QR codes de cada quadro; `decoder(frame)` retorna a lista de textos
+    Com `motion(frame, agora)` (MotionGate), quadros de cena parada são pulados
+    Com `pool` (DecodePool), os quadros são distribuídos entre vários workers
+    """
+
+    def __init__(self, decoder, inbox, outbox, stop_event, motion=None, pool=None):
+        super().__init__('decode', inbox, outbox, stop_event)
+        self.decoder = decoder
+        self.motion = motion
+        self.pool = pool
+        self.skipped = 0  # quadros sem movimento, não decodificados
+
+    def _sem_movimento(self, frame, captured_at) -> bool:
+        if self.motion is not None and not self.motion(frame, captured_at):
+            self.skipped += 1
+            return True
+        return False
+
+    def _publicar(self, captured_at, qrcodes):
+        self.emit((captured_at, qrcodes))
+
+    def process(self, item):
+        captured_at, frame = item
+        if self._sem_movimento(frame, captured_at):
+            return
+        qrcodes = self.decoder(frame)
+        if qrcodes:
+            self._publicar(captured_at, qrcodes)
+
+    def run(self):
+        if self.pool is None:
+            return super().run()
+
+        self.pool.start(self._publicar, self.stop_event)
+        try:
+            slot = None
+            while not self.stop_event.is_set():
+                if slot is None:
+                    slot = self.pool.acquire(self.POLL_INTERVAL)
+                    if slot is None:
+                        continue
+                # Só pega o quadro com um worker livre: ele recebe sempre o mais recente
+                try:
+                    captured_at, frame = self.inbox.get(timeout=self.POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if self._sem_movimento(frame, captured_at):
+                    continue
+                try:
+                    self.pool.send(slot, captured_at, frame)
+                    self.processed += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[{self.name}] Erro: {e}")
+                    self.pool.release(slot)
+                slot = None
+        finally:
+            self.pool.stop()
+
+    def stats(self):
+        stats = {**super().stats(), 'skipped': self.skipped}
+        if self.pool is not None:
+            stats['pool'] = self.pool.stats()
+        return stats
+
+
+class AuthorizeStage(Stage):
+    """
+    Consulta o autorizador e aplica o debounce: um acesso (ou uma negação)
+    por apresentação do QR code, não um por quadro
+    """
+
+    def __init__(self, authorizer, debounce: float, inbox, outbox, stop_event):
+        super().__init__('authorize', inbox, outbox, stop_event)
+        self.authorizer = authorizer
+        self.debounce = debounce
+        self.ultimo_qrcode = None
+        self.ultimo_qrcode_time = 0
+        self.ultimo_negado = None
+        self.ultimo_negado_time = 0
+
+    def process(self, item):
+        agora, qrcodes = item
+        for qr_data in qrcodes:
+            if self.authorizer.is_authorized(qr_data, agora):
+                # Só processa se for um QR Code diferente ou se já passou o tempo de debounce
+                if qr_data != self.ultimo_qrcode or (agora - self.ultimo_qrcode_time) > self.debounce:
+                    print(f"[MATCH] QR Code autorizado detectado: {qr_data}")
+                    self.emit(Decision(qr_data, True, agora))
+                    self.ultimo_qrcode = qr_data
+                    self.ultimo_qrcode_time = agora
+                break
+            elif qr_data != self.ultimo_negado or (agora - self.ultimo_negado_time) > self.debounce:
+                print(f"[INFO] QR Code NÃO autorizado: {qr_data}")
+                self.emit(Decision(qr_data, False, agora))
+                self.ultimo_negado = qr_data
+                self.ultimo_negado_time = agora
+
+
+class ActuateStage(Stage):
+    """Aciona a saída por `pulse` segundos sem bloquear o estágio; repassa tudo ao registro"""
+
+    def __init__(self, output, pulse: float, inbox, outbox, stop_event):
+        super().__init__('actuate', inbox, outbox, stop_event)
+        self.output = output
+        self.pulse = pulse
+        self.output_active = threading.Event()
+        self.latency = []  # segundos entre a captura do quadro e o acionamento (últimos 1000)
+
+    def process(self, decision: Decision):
+        if decision.allowed:
+            self.acionar_saida(decision)
+        self.emit(decision)
+
+    def acionar_saida(self, decision: Decision):
+        if self.output_active.is_set():
+            print("[INFO] Saída já está acionada, ignorando novo acionamento.")
+            return
+
+        self.output_active.set()
+        self.output.on()
+        self.latency = self.latency[-999:] + [time.time() - decision.captured_at]
+        print(f"[INFO] Saída ACESA por {self.pulse} segundos (QR Code: {decision.qrcode}).")
+
+        timer = threading.Timer(self.pulse, self._desligar)
+        timer.daemon = True
+        timer.start()
+
+    def _desligar(self):
+        self.output.off()
+        print("[INFO] Saída APAGADA.")
+        self.output_active.clear()
+
+
+class ReportStage(Stage):
+    """
+    Grava cada decisão no histórico de acessos. Fica depois do acionamento:
+    um Redis lento não atrasa a catraca. Os autorizados seguem para o
+    NotifyStage (se houver), então a API nunca atrasa a gravação
+    """
+
+    def __init__(self, recorder, inbox, outbox, stop_event):
+        super().__init__('report', inbox, outbox, stop_event)
+        self.recorder = recorder
+
+    def process(self, decision: Decision):
+        self.recorder(decision.qrcode, decision.allowed, decision.captured_at)
+        if decision.allowed:
+            self.emit(decision)
+
+
+class NotifyStage(Stage):
+    """
+    Notifica a API externa a cada acesso autorizado, na sua própria thread
+    Com a API fora do ar cada chamada espera o timeout; a fila cheia descarta
+    as notificações mais antigas, nunca o histórico
+    """
+
+    def __init__(self, notifier, inbox, stop_event):
+        super().__init__('notify', inbox, None, stop_event)
+        self.notifier = notifier
+
+    def process(self, decision: Decision):
+        if self.notifier(decision.qrcode):
+            print("[API] Acesso registrado com sucesso na API")
+        else:
+            print("[API] Falha ao registrar acesso na API (mas porta foi acionada)")
@@ -0,0 +1,468 @@
+"""
+Testes do pipeline da catraca com câmera, Redis e GPIO falsos
+
+    python -m unittest gate.tests
+"""
+import queue
+import threading
+import time
+import unittest
+
+try:
+    import cv2
+    import numpy
+except ImportError:  # OpenCV/numpy só na placa da catraca
+    cv2 = numpy = None
+
+from .authorizers import CachedAuthorizer, DirectAuthorizer
+from .config import GateConfig
+from .decode_pool import ProcessDecodePool, ThreadDecodePool
+from .stages import AuthorizeStage, Decision, LatestFrame, NotifyStage, ReportStage, offer
+
+
+def wait_until(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class StubRedis:
+    """Só os comandos que os autorizadores usam, com pipeline"""
+
+    def __init__(self, members=(), valid_from=None, valid_until=None):
+        self.members = set(members)
+        self.zsets = {GateConfig.valid_from_key: dict(valid_from or {}),
+                      GateConfig.valid_until_key: dict(valid_until or {})}
+        self.calls = 0
+
+    def pipeline(self, transaction=True):
+        return StubPipeline(self)
+
+    def smembers(self, key):
+        return set(self.members)
+
+    def sismember(self, key, member):
+        return member in self.members
+
+    def zscore(self, key, member):
+        return self.zsets[key].get(member)
+
+    def zrange(self, key, start, end, withscores=False):
+        return sorted(self.zsets[key].items(), key=lambda item: item[1])
+
+    def scard(self, key):
+        return len(self.members)
+
+
+def redis_down(*args, **kwargs):
+    raise ConnectionError('Redis fora do ar')
+
+
+class StubPipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue_command(*args, **kwargs):
+            self.commands.append((getattr(self.redis_client, name), args, kwargs))
+        return queue_command
+
+    def execute(self):
+        self.redis_client.calls += 1
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class StubAuthorizer:
+    def __init__(self, allowed):
+        self.allowed = set(allowed)
+
+    def is_authorized(self, qrcode, agora=None):
+        return qrcode in self.allowed
+
+
+class OfferTests(unittest.TestCase):
+
+    def test_drop_oldest_when_full(self):
+        fila = queue.Queue(2)
+        self.assertFalse(offer(fila, 1))
+        self.assertFalse(offer(fila, 2))
+        self.assertTrue(offer(fila, 3))
+        self.assertTrue(offer(fila, 4))
+        self.assertEqual([fila.get_nowait(), fila.get_nowait()], [3, 4])
+
+
+class LatestFrameTests(unittest.TestCase):
+
+    def test_put_overwrites_unread(self):
+        frames = LatestFrame()
+        self.assertFalse(frames.put('q1'))
+        self.assertTrue(frames.put('q2'))  # q1 nunca foi lido
+        self.assertEqual(frames.qsize(), 1)
+        self.assertEqual(frames.get(0), 'q2')
+        self.assertEqual(frames.qsize(), 0)
+        self.assertFalse(frames.put('q3'))
+
+    def test_get_waits_for_a_new_frame(self):
+        frames = LatestFrame()
+        frames.put('q1')
+        frames.get(0)
+        # O mesmo quadro nunca é entregue duas vezes
+        with self.assertRaises(queue.Empty):
+            frames.get(0.01)
+
+        threading.Timer(0.05, frames.put, args=('q2',)).start()
+        self.assertEqual(frames.get(2), 'q2')
+
+
+class AuthorizeStageTests(unittest.TestCase):
+    """Um acesso (ou negação) por apresentação do QR code, não um por quadro"""
+
+    def setUp(self):
+        self.decisions = queue.Queue()
+        self.stage = AuthorizeStage(StubAuthorizer({'OK', 'OK2'}), 6, None, self.decisions, threading.Event())
+
+    def _emitted(self):
+        itens = []
+        while not self.decisions.empty():
+            decision = self.decisions.get_nowait()
+            itens.append((decision.qrcode, decision.allowed, decision.captured_at))
+        return itens
+
+    def test_allowed_debounce(self):
+        for agora in (100, 101, 105.9):
+            self.stage.process((agora, ['OK']))
+        self.stage.process((106.5, ['OK']))
+        self.stage.process((107, ['OK2']))  # outro código passa na hora
+        self.assertEqual(self._emitted(), [('OK', True, 100), ('OK', True, 106.5), ('OK2', True, 107)])
+
+    def test_denied_debounce(self):
+        for agora in (100, 103):
+            self.stage.process((agora, ['NAO']))
+        self.stage.process((107, ['NAO']))
+        self.assertEqual(self._emitted(), [('NAO', False, 100), ('NAO', False, 107)])
+
+    def test_denied_does_not_reset_allowed(self):
+        self.stage.process((100, ['OK']))
+        self.stage.process((101, ['NAO']))
+        self.stage.process((102, ['OK']))
+        self.assertEqual(self._emitted(), [('OK', True, 100), ('NAO', False, 101)])
+
+    def test_first_allowed_code_in_frame_wins(self):
+        self.stage.process((100, ['NAO', 'OK', 'OK2']))
+        self.assertEqual(self._emitted(), [('NAO', False, 100), ('OK', True, 100)])
+
+
+class AuthorizerWindowTests(unittest.TestCase):
+    """Janela de validade nos dois perfis de consulta"""
+
+    def setUp(self):
+        self.redis = StubRedis(
+            members={'SEMPRE', 'FUTURO', 'VENCIDO', 'VALIDO'},
+            valid_from={'FUTURO': 200, 'VALIDO': 50},
+            valid_until={'VENCIDO': 50, 'VALIDO': 200},
+        )
+        self.expected = {'SEMPRE': True, 'FUTURO': False, 'VENCIDO': False, 'VALIDO': True, 'NENHUM': False}
+
+    def test_cached(self):
+        authorizer = CachedAuthorizer(self.redis, GateConfig())
+        authorizer.refresh()
+        self.assertEqual(authorizer.count(), 4)
+        self.assertEqual({qrcode: authorizer.is_authorized(qrcode, 100) for qrcode in self.expected},
+                         self.expected)
+        self.assertEqual(self.redis.calls, 1)  # consultas só na memória
+        self.assertTrue(authorizer.is_authorized('FUTURO', 200))
+        self.assertFalse(authorizer.is_authorized('VALIDO', 200.5))
+
+    def test_direct(self):
+        authorizer = DirectAuthorizer(self.redis, GateConfig())
+        self.assertEqual({qrcode: authorizer.is_authorized(qrcode, 100) for qrcode in self.expected},
+                         self.expected)
+        self.assertEqual(authorizer.count(), 4)
+
+    def test_direct_denies_when_redis_fails(self):
+        redis_client = StubRedis()
+        redis_client.pipeline = redis_down
+        self.assertFalse(DirectAuthorizer(redis_client, GateConfig()).is_authorized('SEMPRE', 100))
+
+    def test_cached_keeps_last_registry_when_refresh_fails(self):
+        authorizer = CachedAuthorizer(self.redis, GateConfig())
+        authorizer.refresh()
+        self.redis.pipeline = redis_down
+        authorizer.refresh()
+        self.assertTrue(authorizer.is_authorized('SEMPRE', 100))
+
+
+@unittest.skipIf(cv2 is None, 'requer OpenCV e numpy')
+class PreprocessTests(unittest.TestCase):
+
+    def setUp(self):
+        from .preprocess import FramePreprocessor, PreprocessedDecoder
+
+        self.FramePreprocessor = FramePreprocessor
+        self.PreprocessedDecoder = PreprocessedDecoder
+        self.frame = numpy.zeros((480, 640, 3), dtype=numpy.uint8)
+
+    def test_roi_gray_scale(self):
+        preprocessor = self.FramePreprocessor(roi=(0.25, 0.5, 0.5, 0.5), scale=0.5)
+        imagem = preprocessor(self.frame)
+        self.assertEqual(imagem.shape, (120, 160))
+        # Buffers reaproveitados entre quadros da mesma resolução
+        self.assertIs(preprocessor(self.frame), imagem)
+        self.assertEqual(preprocessor.full(self.frame).shape, (480, 640))
+
+    def test_invalid_roi_and_scale(self):
+        with self.assertRaises(ValueError):
+            self.FramePreprocessor(roi=(0.5, 0.5, 0.6, 0.2))
+        with self.assertRaises(ValueError):
+            self.FramePreprocessor(scale=1.5)
+
+    def _decoder(self, results, fallback_every=3, **kwargs):
+        shapes = []
+
+        def decode(imagem):
+            shapes.append(imagem.shape)
+            return results.pop(0) if results else []
+
+        preprocessor = self.FramePreprocessor(**{'scale': 0.5, **kwargs})
+        return self.PreprocessedDecoder(decode, preprocessor, fallback_every), shapes
+
+    def test_full_frame_every_n_empty_frames(self):
+        decoder, shapes = self._decoder([[], [], [], ['FORA']])
+        self.assertEqual([decoder(self.frame) for _ in range(3)], [[], [], ['FORA']])
+        self.assertEqual(shapes, [(240, 320), (240, 320), (240, 320), (480, 640)])
+        self.assertEqual(decoder.fallback_hits, 1)
+
+    def test_found_code_resets_counter(self):
+        decoder, shapes = self._decoder([[], ['QR'], [], []])
+        for _ in range(4):
+            decoder(self.frame)
+        self.assertNotIn((480, 640), shapes)
+
+    def test_no_fallback_without_reduction(self):
+        decoder, shapes = self._decoder([], scale=1.0)
+        for _ in range(6):
+            decoder(self.frame)
+        self.assertEqual(shapes, [(480, 640)] * 6)
+
+        decoder, shapes = self._decoder([], fallback_every=0)
+        for _ in range(6):
+            decoder(self.frame)
+        self.assertEqual(len(shapes), 6)
+
+
+@unittest.skipIf(cv2 is None, 'requer OpenCV e numpy')
+class MotionGateTests(unittest.TestCase):
+
+    def setUp(self):
+        from .motion import MotionGate
+
+        self.motion = MotionGate(threshold=0.02, pixel_delta=12, hold=3)
+        self.frame = numpy.full((480, 640, 3), 100, dtype=numpy.uint8)
+
+    def _changed(self, altura, largura, valor=255):
+        frame = self.frame.copy()
+        frame[:altura, :largura] = valor
+        return frame
+
+    def test_static_scene_stops_after_hold(self):
+        self.assertTrue(self.motion(self.frame, 100))  # primeiro quadro sempre decodifica
+        self.assertTrue(self.motion(self.frame, 102.9))
+        self.assertFalse(self.motion(self.frame, 103.1))
+
+    def test_change_above_threshold_restarts_hold(self):
+        self.motion(self.frame, 100)
+        self.assertFalse(self.motion(self.frame, 110))
+        self.assertTrue(self.motion(self._changed(160, 160), 111))  # ~8% da cena
+        self.assertTrue(self.motion(self._changed(160, 160), 113.5))  # parado de novo, ainda no hold
+        self.assertFalse(self.motion(self._changed(160, 160), 114.5))
+
+    def test_change_below_threshold_ignored(self):
+        self.motion(self.frame, 100)
+        self.assertFalse(self.motion(self._changed(20, 20), 110))  # ~0,1% da cena
+
+    def test_small_intensity_change_ignored(self):
+        self.motion(self.frame, 100)
+        self.assertFalse(self.motion(self._changed(480, 640, 105), 110))  # abaixo do pixel_delta
+
+    def test_gray_frames(self):
+        gray = numpy.full((480, 640), 100, dtype=numpy.uint8)
+        self.motion(gray, 100)
+        self.assertFalse(self.motion(gray, 110))
+        changed = gray.copy()
+        changed[:160, :160] = 255
+        self.assertTrue(self.motion(changed, 111))
+
+    def test_decode_stage_skips_static_frames(self):
+        from .stages import DecodeStage
+
+        decoded = []
+        codes = queue.Queue()
+        stage = DecodeStage(lambda frame: decoded.append(frame) or [], None, codes, threading.Event(),
+                            motion=self.motion)
+        for agora in (100, 104, 105):
+            stage.process((agora, self.frame))
+        self.assertEqual((len(decoded), stage.skipped), (1, 2))
+
+
+class StubFrame:
+    """Quadro falso: o decodificador só responde depois de `release`"""
+
+    def __init__(self, qrcodes, released=True):
+        self.qrcodes = qrcodes
+        self.released = threading.Event()
+        if released:
+            self.released.set()
+
+    def decode(self):
+        self.released.wait(2)
+        if self.qrcodes is None:
+            raise RuntimeError('quadro corrompido')
+        return self.qrcodes
+
+
+def stub_frame_decoder():
+    return StubFrame.decode
+
+
+def pixel_decoder():
+    """Decodificador dos workers em processo: o QR code é o valor do primeiro pixel"""
+    return lambda frame: [f'QR{int(frame[0, 0])}'] if frame[0, 0] else []
+
+
+class ThreadDecodePoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.results = []
+        self.pool = ThreadDecodePool(stub_frame_decoder, 2)
+        self.pool.start(lambda captured_at, qrcodes: self.results.append((captured_at, qrcodes)), self.stop)
+
+    def tearDown(self):
+        self.stop.set()
+        self.pool.stop()
+
+    def _send(self, captured_at, frame):
+        slot = self.pool.acquire(1)
+        self.assertIsNotNone(slot)
+        self.pool.send(slot, captured_at, frame)
+
+    def test_results_in_order(self):
+        for captured_at in range(5):
+            self._send(captured_at, StubFrame([f'QR{captured_at}']))
+            self.assertTrue(wait_until(lambda: len(self.results) == captured_at + 1))
+        self.assertEqual(self.results, [(i, [f'QR{i}']) for i in range(5)])
+
+    def test_stale_result_dropped(self):
+        lento = StubFrame(['VELHO'], released=False)
+        self._send(1, lento)
+        self._send(2, StubFrame(['NOVO']))
+        self.assertTrue(wait_until(lambda: self.results == [(2, ['NOVO'])]))
+
+        lento.released.set()  # o quadro mais antigo termina depois do mais novo
+        self.assertTrue(wait_until(lambda: self.pool.stale == 1))
+        self.assertEqual(self.results, [(2, ['NOVO'])])
+
+    def test_slots_released(self):
+        self._send(1, StubFrame([]))
+        self._send(2, StubFrame(None))
+        self.assertTrue(wait_until(lambda: self.pool.free.qsize() == 2))
+        self.assertEqual(self.pool.errors, 1)
+        self.assertEqual(self.results, [])  # quadro vazio não publica nada
+
+    def test_acquire_times_out_when_busy(self):
+        frames = [StubFrame(['A'], released=False), StubFrame(['B'], released=False)]
+        for captured_at, frame in enumerate(frames):
+            self._send(captured_at, frame)
+        self.assertIsNone(self.pool.acquire(0.01))
+        for frame in frames:
+            frame.released.set()
+
+
+@unittest.skipIf(cv2 is None, 'requer OpenCV e numpy')
+class ProcessDecodePoolTests(unittest.TestCase):
+
+    def test_frames_through_shared_memory(self):
+        stop = threading.Event()
+        results = []
+        pool = ProcessDecodePool(pixel_decoder, 2)
+        pool.start(lambda captured_at, qrcodes: results.append((captured_at, qrcodes)), stop)
+        try:
+            for captured_at, shape in enumerate([(48, 64), (48, 64), (24, 32)], start=1):
+                frame = numpy.full(shape, captured_at, dtype=numpy.uint8)
+                slot = pool.acquire(30)  # a subida dos processos ('spawn') é lenta
+                pool.send(slot, captured_at, frame)
+                self.assertTrue(wait_until(lambda: len(results) == captured_at, 30))
+        finally:
+            stop.set()
+            pool.stop()
+        self.assertEqual(results, [(1, ['QR1']), (2, ['QR2']), (3, ['QR3'])])
+        self.assertEqual(pool.errors, 0)
+
+
+class ReportNotifyTests(unittest.TestCase):
+    """A API fora do ar não pode atrasar nem descartar o histórico"""
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.reports = queue.Queue(1000)
+        self.notifications = queue.Queue(2)
+        self.recorded = []
+        self.recorded_at = []
+        self.notified = []
+        self.api_down = threading.Event()
+
+        def notifier(qrcode):
+            self.api_down.wait(5)  # como o requests.post esperando o timeout
+            self.notified.append(qrcode)
+            return False
+
+        self.stages = [
+            ReportStage(self.recorder, self.reports, self.notifications, self.stop),
+            NotifyStage(notifier, self.notifications, self.stop),
+        ]
+        for stage in self.stages:
+            stage.start()
+
+    def recorder(self, qrcode, allowed, captured_at):
+        self.recorded.append(qrcode)
+        self.recorded_at.append(captured_at)
+
+    def tearDown(self):
+        self.api_down.set()
+        self.stop.set()
+        for stage in self.stages:
+            stage.join(2)
+
+    def test_recording_does_not_wait_for_api(self):
+        for i in range(20):
+            self.reports.put(Decision(f'QR{i}', i % 2 == 0, time.time()))
+
+        self.assertTrue(wait_until(lambda: len(self.recorded) == 20))
+        self.assertEqual(self.notified, [])
+        # Só as notificações mais antigas são descartadas
+        self.assertGreater(self.stages[0].dropped, 0)
+
+        self.api_down.set()
+        self.assertTrue(wait_until(lambda: self.notified[-1:] == ['QR18']))
+        self.assertLess(len(self.notified), 10)
+
+    def test_only_allowed_are_notified(self):
+        self.api_down.set()
+        self.reports.put(Decision('NEGADO', False, time.time()))
+        self.reports.put(Decision('LIBERADO', True, time.time()))
+
+        self.assertTrue(wait_until(lambda: self.notified == ['LIBERADO']))
+        self.assertEqual(self.recorded, ['NEGADO', 'LIBERADO'])
+
+    def test_records_decision_time(self):
+        # A gravação pode sair da fila bem depois: vale o momento da captura
+        self.reports.put(Decision('A', True, 1000.5))
+        self.assertTrue(wait_until(lambda: self.recorded_at == [1000.5]))
+
+
+if __name__ == '__main__':
+    unittest.main()
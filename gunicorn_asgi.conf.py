@@ -0,0 +1,22 @@
+# Gunicorn configuration file - modo assíncrono (ASGI)
+# Uso: gunicorn --config gunicorn_asgi.conf.py rasp_api.asgi_prod:application
+# Cada worker uvicorn atende centenas de requisições concorrentes em vez de uma
+bind = "0.0.0.0:8000"
+workers = 3
+worker_class = "uvicorn.workers.UvicornWorker"
+# Produção: mesmas configurações do WSGI (settings_prod), mesmo se o alvo for rasp_api.asgi
+raw_env = ["QRCODE_ASYNC_VIEWS=1", "DJANGO_SETTINGS_MODULE=rasp_api.settings_prod"]
+timeout = 30
+keepalive = 5
+max_requests = 1000
+max_requests_jitter = 100
+preload_app = False  # cada worker cria seu event loop e pool redis.asyncio
+reload = False
+daemon = False
+user = None
+group = None
+tmp_upload_dir = None
+errorlog = "/home/darley/api-rasp-qrcode/logs/error.log"
+accesslog = "/home/darley/api-rasp-qrcode/logs/access.log"
+loglevel = "info"
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
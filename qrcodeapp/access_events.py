@@ -0,0 +1,58 @@
+"""
+Histórico de acessos das catracas no Redis
+Cada decisão (autorizado/negado) entra em um stream limitado e incrementa
+contadores por minuto e por hora no mesmo script, então os painéis leem os
+contadores em vez de percorrer os eventos. Não depende do Django: os scripts
+das catracas importam este módulo direto
+"""
+import time
+
+from . import scripts
+
+EVENTS_KEY = "qrcodes_events"  # stream com as decisões das catracas
+EVENTS_MAXLEN = 200000  # eventos mantidos no stream (aproximado)
+ROLLUP_KEY = f"{EVENTS_KEY}:rollup"  # HASH por intervalo: <ROLLUP_KEY>:<granularidade>:<início>
+ROLLUPS = {  # granularidade -> (segundos por intervalo, retenção em segundos)
+    'minute': (60, 2 * 24 * 60 * 60),
+    'hour': (60 * 60, 90 * 24 * 60 * 60),
+}
+RESULTS = ('allowed', 'denied')
+
+
+def rollup_start(granularity: str, timestamp: float) -> int:
+    """Início (epoch) do intervalo que contém `timestamp`"""
+    size = ROLLUPS[granularity][0]
+    return int(timestamp) // size * size
+
+
+def rollup_key(granularity: str, start: int) -> str:
+    return f"{ROLLUP_KEY}:{granularity}:{start}"
+
+
+class AccessEventRecorder:
+    """Grava as decisões de uma catraca (um EVALSHA por leitura)"""
+
+    def __init__(self, gate_id: str):
+        self.gate_id = gate_id
+        self._script = None
+
+    def record(self, redis_client, qrcode: str, allowed: bool, direction: str = "E",
+               timestamp: float = None) -> str:
+        """
+        Registra a decisão; retorna o id do evento no stream
+        `timestamp` (epoch) é o momento da decisão, ex.: a captura do quadro;
+        vai no campo 'ts' e escolhe os contadores, mesmo que a gravação atrase
+        """
+        if self._script is None:
+            self._script = redis_client.register_script(scripts.RECORD_ACCESS)
+
+        if timestamp is None:
+            timestamp = time.time()
+        return self._script(
+            keys=[EVENTS_KEY,
+                  rollup_key('minute', rollup_start('minute', timestamp)),
+                  rollup_key('hour', rollup_start('hour', timestamp))],
+            args=[EVENTS_MAXLEN, qrcode, 'allowed' if allowed else 'denied', direction,
+                  self.gate_id, ROLLUPS['minute'][1], ROLLUPS['hour'][1], f"{timestamp:.3f}"],
+            client=redis_client,
+        )
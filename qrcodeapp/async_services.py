@@ -0,0 +1,282 @@
+import asyncio
+import gzip
+import time
+import weakref
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from . import access_events, connections, renderers, scripts
+from .services import QRCodeService, AccessEventService
+
+
+class AsyncQRCodeService:
+    """
+    Variante assíncrona do QRCodeService (redis.asyncio) para o modo ASGI
+    Usa as mesmas chaves e scripts Lua, então os dois modos convivem no
+    mesmo Redis. Cada event loop tem um cliente com pool compartilhado
+    entre todas as requisições do worker
+    """
+
+    _clients = weakref.WeakKeyDictionary()
+    _scripts = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def _get_redis_client(cls, role: str = connections.PRIMARY, blocking: bool = False):
+        """
+        Obtém o cliente Redis assíncrono do event loop atual (primário ou réplica)
+        blocking=True para XREAD BLOCK (sem timeout de leitura)
+        """
+        clients = cls._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get((role, blocking))
+        if client is None:
+            # Sem réplica configurada, as leituras usam o cliente do primário
+            client = (connections.async_client_for(role, blocking)
+                      or cls._get_redis_client(blocking=blocking))
+            clients[(role, blocking)] = client
+        return client
+
+    @classmethod
+    def _get_read_client(cls):
+        """Cliente das leituras (réplica, ou o primário depois de uma mutação na requisição)"""
+        return cls._get_redis_client(connections.read_role())
+
+    @classmethod
+    def _get_script(cls, name: str):
+        """Retorna o script Lua registrado no cliente do event loop atual"""
+        client = cls._get_redis_client()
+        registered = cls._scripts.setdefault(client, {})
+        if name not in registered:
+            registered[name] = client.register_script(getattr(scripts, name))
+        return registered[name]
+
+    @classmethod
+    async def _apply_changes(cls, op: str, qrcodes: List[str], valid_from: Optional[datetime] = None,
+                             valid_until: Optional[datetime] = None) -> List[int]:
+        connections.mark_write()
+        return await cls._get_script('APPLY_CHANGE')(
+            keys=[QRCodeService.REGISTRY_KEY, QRCodeService.VERSION_KEY, QRCodeService.CHANGES_KEY,
+                  *QRCodeService.WINDOW_KEYS],
+            args=[op, QRCodeService.CHANGES_MAXLEN, QRCodeService.INVALIDATION_CHANNEL,
+                  QRCodeService._epoch(valid_from), QRCodeService._epoch(valid_until), *qrcodes],
+        )
+
+    @classmethod
+    async def add_qrcode(cls, qrcode: str, valid_from: Optional[datetime] = None,
+                         valid_until: Optional[datetime] = None) -> bool:
+        """
+        Adiciona um QR code; retorna True se adicionado, False se já existia
+        """
+        try:
+            return (await cls._apply_changes('add', [qrcode], valid_from, valid_until))[0] > 0
+        except Exception as e:
+            print(f"Erro ao adicionar QR code: {e}")
+            return False
+
+    @classmethod
+    async def remove_qrcode(cls, qrcode: str) -> bool:
+        """
+        Remove um QR code; retorna True se removido, False se não existia
+        """
+        try:
+            return (await cls._apply_changes('remove', [qrcode]))[0] > 0
+        except Exception as e:
+            print(f"Erro ao remover QR code: {e}")
+            return False
+
+    @classmethod
+    async def qrcode_exists(cls, qrcode: str) -> bool:
+        """
+        Verifica se um QR code existe (SISMEMBER)
+        """
+        try:
+            return bool(await cls._get_read_client().sismember(QRCodeService.REGISTRY_KEY, qrcode))
+        except Exception as e:
+            print(f"Erro ao verificar QR code: {e}")
+            return False
+
+    @classmethod
+    async def check_qrcodes(cls, qrcodes: List[str]) -> Dict[str, bool]:
+        """
+        Consulta em lote com o mesmo cache local do QRCodeService
+        """
+        check_cache = QRCodeService.check_cache
+        windows = check_cache.get_many(qrcodes)
+        missing = [qrcode for qrcode in dict.fromkeys(qrcodes) if qrcode not in windows]
+
+        if missing:
+            generation = check_cache.generation()
+            redis_client = cls._get_redis_client()
+            fetched = {}
+            for start in range(0, len(missing), QRCodeService.CHECK_CHUNK_SIZE):
+                chunk = missing[start:start + QRCodeService.CHECK_CHUNK_SIZE]
+                pipe = redis_client.pipeline(transaction=False)
+                QRCodeService.queue_window_lookup(pipe, chunk)
+                fetched.update(QRCodeService.parse_windows(chunk, await pipe.execute()))
+
+            check_cache.set_many(fetched, generation)
+            windows.update(fetched)
+
+        now = time.time()
+        return {qrcode: QRCodeService.is_valid_now(window, now) for qrcode, window in windows.items()}
+
+    @classmethod
+    async def scan_qrcodes(cls, cursor: int = 0, limit: int = 1000) -> Tuple[List[str], int]:
+        """
+        Retorna uma página de QR codes usando SSCAN; mesma semântica do QRCodeService
+        """
+        redis_client = cls._get_read_client()
+        qrcodes = []
+
+        while True:
+            cursor, batch = await redis_client.sscan(QRCodeService.REGISTRY_KEY, cursor=cursor, count=limit)
+            qrcodes.extend(member.decode() for member in batch)
+            if cursor == 0 or len(qrcodes) >= limit:
+                return qrcodes, cursor
+
+    @classmethod
+    async def iter_qrcode_batches(cls, batch_size: int = None) -> AsyncIterator[List[str]]:
+        """
+        Percorre todo o registro em lotes de SSCAN, sem carregar tudo em memória
+        """
+        cursor = 0
+        while True:
+            page, cursor = await cls.scan_qrcodes(cursor, batch_size or QRCodeService.SCAN_BATCH_SIZE)
+            if page:
+                yield page
+            if cursor == 0:
+                return
+
+    @classmethod
+    async def search_qrcodes(cls, prefix: str = None, start: str = None, end: str = None,
+                             after: str = None, limit: int = 1000) -> Dict:
+        """
+        Busca por prefixo/faixa no índice lexicográfico; mesma semântica do QRCodeService
+        """
+        bounds = QRCodeService.lex_range(prefix, start, end, after)
+        if bounds is None:
+            return {'qrcodes': [], 'total': 0, 'next_after': None}
+        full = QRCodeService.lex_range(prefix, start, end)
+
+        pipe = cls._get_read_client().pipeline(transaction=False)
+        pipe.zrangebylex(QRCodeService.INDEX_KEY, *bounds, start=0, num=limit + 1)
+        pipe.zlexcount(QRCodeService.INDEX_KEY, *full)
+        members, total = await pipe.execute()
+
+        qrcodes = [member.decode() for member in members[:limit]]
+        return {
+            'qrcodes': qrcodes,
+            'total': total,
+            'next_after': qrcodes[-1] if len(members) > limit else None,
+        }
+
+    @classmethod
+    async def get_version(cls) -> int:
+        """
+        Retorna a versão atual do registro
+        """
+        version = await cls._get_read_client().get(QRCodeService.VERSION_KEY)
+        return int(version) if version else 0
+
+    @classmethod
+    async def get_list_payload(cls, version: int, cursor: int, limit: int, media_format: str = 'json') -> bytes:
+        """
+        Página da listagem (JSON ou MessagePack) + gzip, com o mesmo cache Redis do modo síncrono
+        """
+        redis_client = cls._get_read_client()
+        cache_key = f"{QRCodeService.LIST_CACHE_KEY}:{version}:{cursor}:{limit}:{media_format}"
+
+        payload = await redis_client.get(cache_key)
+        if payload is None:
+            qrcodes, next_cursor = await cls.scan_qrcodes(cursor, limit)
+            body = renderers.encode({
+                'qrcodes': qrcodes,
+                'next_cursor': next_cursor,
+                'total': await redis_client.scard(QRCodeService.REGISTRY_KEY),
+                'version': version,
+            }, media_format)
+            payload = gzip.compress(body)
+            await cls._get_redis_client().set(cache_key, payload, ex=QRCodeService.LIST_CACHE_TTL)
+        return payload
+
+
+class _ClientQueue(asyncio.Queue):
+    dropped = False  # marcada pelo broadcaster quando o cliente não acompanha
+
+
+class AccessEventBroadcaster:
+    """
+    Feed ao vivo dos acessos das catracas (SSE) no modo ASGI
+    Um único XREAD BLOCK por event loop lê o stream e distribui cada evento
+    para as filas dos clientes conectados, então N telas custam uma leitura
+    no Redis. As filas são limitadas: cliente lento é desconectado e
+    reconecta com Last-Event-ID
+    """
+
+    QUEUE_SIZE = 100  # eventos pendentes por cliente antes de desconectá-lo
+    READ_COUNT = 100  # eventos por XREAD
+    BLOCK_MS = 5000  # espera máxima de cada XREAD
+
+    _instances = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self._queues = set()
+        self._task = None
+
+    @classmethod
+    def get(cls) -> 'AccessEventBroadcaster':
+        """Retorna o broadcaster do event loop atual"""
+        loop = asyncio.get_running_loop()
+        broadcaster = cls._instances.get(loop)
+        if broadcaster is None:
+            broadcaster = cls._instances[loop] = cls()
+        return broadcaster
+
+    def subscribe(self) -> _ClientQueue:
+        queue = _ClientQueue(maxsize=self.QUEUE_SIZE)
+        self._queues.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: _ClientQueue):
+        self._queues.discard(queue)
+
+    def _publish(self, event: Dict):
+        for queue in list(self._queues):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                queue.dropped = True
+                self._queues.discard(queue)
+
+    async def _run(self):
+        """Lê o stream enquanto houver clientes conectados"""
+        # XREAD BLOCK espera até BLOCK_MS: cliente sem timeout de leitura
+        redis_client = AsyncQRCodeService._get_redis_client(blocking=True)
+        last_id = None
+        while self._queues:
+            try:
+                if last_id is None:
+                    # Começa do último evento existente ('$' perderia eventos entre dois XREAD)
+                    latest = await redis_client.xrevrange(access_events.EVENTS_KEY, count=1)
+                    last_id = latest[0][0] if latest else '0-0'
+                response = await redis_client.xread(
+                    {access_events.EVENTS_KEY: last_id}, count=self.READ_COUNT, block=self.BLOCK_MS
+                )
+            except Exception as e:
+                print(f"[SSE] Erro ao ler o stream de acessos: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    self._publish(AccessEventService.parse_event(entry_id, fields))
+
+    @staticmethod
+    async def replay(after: str, count: int) -> List[Dict]:
+        """Eventos gravados depois de `after` (reconexão com Last-Event-ID)"""
+        entries = await AsyncQRCodeService._get_redis_client().xrange(
+            access_events.EVENTS_KEY, f"({after}", '+', count=count
+        )
+        return [AccessEventService.parse_event(entry_id, fields) for entry_id, fields in entries]
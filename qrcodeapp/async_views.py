@@ -0,0 +1,304 @@
+import asyncio
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions, permissions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import renderers
+from .async_services import AsyncQRCodeService, AccessEventBroadcaster
+from .permissions import IsAccountUser
+from .serializers import QRCodeSerializer, QRCodeListQuerySerializer, QRCodeCheckBatchSerializer
+from .views import (
+    accepts_gzip, list_etag, list_media_format, not_modified, not_modified_response, list_payload_response,
+    ndjson_chunk, csv_chunk, CSV_HEADER
+)
+
+
+def render_response(request, data, status):
+    """Resposta no formato negociado (JSON ou MessagePack), como o Response do DRF"""
+    renderer = request.accepted_renderer
+    return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+
+class AsyncAPIView(View):
+    """
+    Base das views assíncronas do modo ASGI
+    Negocia o formato, autentica, checa permissões e limites com as mesmas
+    classes configuradas no REST_FRAMEWORK, então os clientes não percebem
+    diferença entre os modos
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Mesma política das APIViews do DRF: autenticação por header, sem CSRF
+        view.csrf_exempt = True
+        return view
+
+    @staticmethod
+    def _negotiate(request):
+        """Renderer pedido no Accept; sem acordo, usa o padrão (JSON)"""
+        # A API navegável precisa do ciclo do APIView; aqui só os formatos de dados
+        renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+                     if renderer.format != 'api']
+        try:
+            return api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS().select_renderer(request, renderers)
+        except exceptions.NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+    def _check_access(self, request):
+        """
+        Roda os autenticadores, permissões e throttles do DRF (podem tocar no cache/banco)
+        Chamado com sync_to_async padrão (thread_sensitive): o ORM usa a conexão da
+        thread síncrona do worker, fechada pelo Django ao fim da requisição, em vez de
+        abrir uma conexão por thread do executor
+        """
+        request.user
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.successful_authenticator is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+        waits = []
+        for throttle in [throttle() for throttle in api_settings.DEFAULT_THROTTLE_CLASSES]:
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait())
+        if waits:
+            waits = [wait for wait in waits if wait is not None]
+            raise exceptions.Throttled(max(waits, default=None))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        request.accepted_renderer, request.accepted_media_type = self._negotiate(request)
+        try:
+            await sync_to_async(self._check_access)(request)
+            if not hasattr(self, request.method.lower()) or request.method.lower() not in self.http_method_names:
+                # Mesmo 405 (com corpo JSON) do APIView
+                raise exceptions.MethodNotAllowed(request.method)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = render_response(request, {'detail': exc.detail}, status=exc.status_code)
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED and request.authenticators:
+                response['WWW-Authenticate'] = request.authenticators[0].authenticate_header(request)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            if exc.status_code == status.HTTP_405_METHOD_NOT_ALLOWED:
+                response['Allow'] = ', '.join(self._allowed_methods())
+            return response
+        except Exception as e:
+            return render_response(request, {'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncQRCodeRegisterView(AsyncAPIView):
+    throttle_scope = 'register'
+
+    async def post(self, request):
+        serializer = QRCodeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return render_response(request, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if await AsyncQRCodeService.add_qrcode(serializer.validated_data['qrcode'], **serializer.validity()):
+            return render_response(request, {
+                'message': 'QR code salvo com sucesso!'
+            }, status=status.HTTP_201_CREATED)
+        return render_response(request, {
+            'error': 'QR code já existe no sistema.'
+        }, status=status.HTTP_409_CONFLICT)
+
+
+class AsyncQRCodeListView(AsyncAPIView):
+    throttle_scope = 'list'
+
+    async def get(self, request):
+        query = QRCodeListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return render_response(request, query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = query.validated_data['cursor']
+        limit = query.validated_data['limit']
+        search = query.search_params()
+
+        if search:
+            result = await AsyncQRCodeService.search_qrcodes(limit=limit, **search)
+            result['version'] = await AsyncQRCodeService.get_version()
+            return render_response(request, result, status=status.HTTP_200_OK)
+
+        media_format = list_media_format(request)
+        version = await AsyncQRCodeService.get_version()
+        etag = list_etag(version, cursor, limit, media_format, accepts_gzip(request))
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+
+        payload = await AsyncQRCodeService.get_list_payload(version, cursor, limit, media_format)
+        return list_payload_response(request, payload, etag, media_format)
+
+
+class AsyncQRCodeDeleteView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated, IsAccountUser]
+    throttle_scope = 'delete'
+
+    async def delete(self, request):
+        qrcode = request.data.get('qrcode')
+        if not qrcode:
+            return render_response(request, {'error': 'O campo qrcode é obrigatório.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if await AsyncQRCodeService.remove_qrcode(qrcode):
+            return render_response(request, {
+                'message': 'QR code removido com sucesso!'
+            }, status=status.HTTP_200_OK)
+        return render_response(request, {
+            'error': 'QR code não encontrado.'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+
+async def _export_ndjson():
+    """Gera o registro como NDJSON, um lote de SSCAN por vez"""
+    async for batch in AsyncQRCodeService.iter_qrcode_batches():
+        yield ndjson_chunk(batch)
+
+
+async def _export_csv():
+    """Gera o registro como CSV, um lote de SSCAN por vez"""
+    yield csv_chunk(CSV_HEADER)
+    async for batch in AsyncQRCodeService.iter_qrcode_batches():
+        yield csv_chunk([qrcode] for qrcode in batch)
+
+
+class AsyncQRCodeExportView(AsyncAPIView):
+    """
+    Exportação no modo ASGI. Com um gerador síncrono o Django 4.2 junta a
+    resposta inteira em memória antes de enviar (sync_to_async(list)); com
+    um gerador assíncrono cada lote vai para o cliente assim que sai do Redis
+    """
+    throttle_scope = 'export'
+
+    EXPORT_FORMATS = {
+        'ndjson': (_export_ndjson, 'application/x-ndjson'),
+        'csv': (_export_csv, 'text/csv'),
+    }
+
+    @staticmethod
+    def _negotiate(request):
+        # `?format=` é o formato do arquivo, não um renderer do DRF
+        renderer = next(renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+                        if renderer.format != 'api')
+        return renderer, renderer.media_type
+
+    async def get(self, request):
+        export_format = request.query_params.get('format', 'ndjson')
+        if export_format not in self.EXPORT_FORMATS:
+            return render_response(request, {
+                'error': 'Formato inválido. Use ndjson ou csv.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        generator, content_type = self.EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(generator(), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="qrcodes.{export_format}"'
+        return response
+
+
+class AsyncQRCodeCheckView(AsyncAPIView):
+    throttle_scope = 'check'
+
+    async def get(self, request, qrcode):
+        authorized = await AsyncQRCodeService.check_qrcodes([qrcode])
+        return render_response(request, {
+            'qrcode': qrcode,
+            'authorized': authorized[qrcode]
+        }, status=status.HTTP_200_OK)
+
+
+class AsyncQRCodeCheckBatchView(AsyncAPIView):
+    throttle_scope = 'check'
+
+    async def post(self, request):
+        serializer = QRCodeCheckBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return render_response(request, serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        qrcodes = serializer.validated_data['qrcodes']
+        authorized = await AsyncQRCodeService.check_qrcodes(qrcodes)
+        return render_response(request, {
+            'results': [{'qrcode': qrcode, 'authorized': authorized[qrcode]} for qrcode in qrcodes]
+        }, status=status.HTTP_200_OK)
+
+
+def _event_key(event_id):
+    """Id do stream ('ms-seq') -> tupla comparável"""
+    return tuple(int(part) for part in event_id.split('-'))
+
+
+def _sse_message(event):
+    # Mesmo orjson dos renderers da API
+    return f"id: {event['id']}\nevent: access\ndata: {renderers.encode(event).decode()}\n\n"
+
+
+class AsyncAccessEventStreamView(AsyncAPIView):
+    """
+    Feed ao vivo (Server-Sent Events) das decisões das catracas
+    """
+
+    throttle_scope = 'events_stream'
+
+    HEARTBEAT = 15  # segundos entre comentários de keep-alive
+    MAX_AGE = 300  # segundos; o Django 4.2 não avisa desconexões, então o stream é renovado
+    REPLAY_MAX = 1000  # eventos reenviados na reconexão com Last-Event-ID
+    EVENT_ID = re.compile(r'^\d+-\d+$')
+
+    async def get(self, request):
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id and not self.EVENT_ID.match(last_event_id):
+            last_event_id = None
+
+        response = StreamingHttpResponse(self._stream(last_event_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # o nginx não deve segurar o feed
+        return response
+
+    async def _stream(self, last_event_id):
+        broadcaster = AccessEventBroadcaster.get()
+        queue = broadcaster.subscribe()
+        last_sent = _event_key(last_event_id) if last_event_id else None
+        deadline = time.monotonic() + self.MAX_AGE
+        try:
+            yield 'retry: 1000\n\n'
+            if last_event_id:
+                for event in await AccessEventBroadcaster.replay(last_event_id, self.REPLAY_MAX):
+                    last_sent = _event_key(event['id'])
+                    yield _sse_message(event)
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if queue.dropped:
+                    yield 'event: dropped\ndata: {}\n\n'
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=min(self.HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+
+                # A fila pode repetir eventos já enviados pelo replay
+                if last_sent and _event_key(event['id']) <= last_sent:
+                    continue
+                last_sent = _event_key(event['id'])
+                yield _sse_message(event)
+        except Exception as e:
+            print(f"[SSE] Feed encerrado: {e}")
+        finally:
+            broadcaster.unsubscribe(queue)
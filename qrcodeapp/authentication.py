@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import HTTP_HEADER_ENCODING
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import connections
+from .check_cache import CheckCache
+from .services import APIKeyService
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que não consulta o SQLite a cada requisição.
+    O usuário do token é resolvido por um cache em memória do processo
+    (TTL curto) na frente do cache Redis do Django (CACHES['default']).
+    Só os campos usados na autenticação vão para o cache (nunca o hash da
+    senha); o usuário é remontado a partir deles.
+    Os signals em qrcodeapp.signals invalidam o cache quando o usuário é
+    salvo (desativado, troca de senha) ou removido: a entrada do Redis é
+    apagada e a invalidação é publicada para o cache local de todos os workers.
+    """
+
+    CACHE_PREFIX = "qrcodeapp:auth_user_fields"  # antes guardava o User inteiro
+    INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:invalidate"  # pub/sub entre os workers
+    LOCAL_MAX_ENTRIES = 1024
+    CACHED_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+    # Mesmo mecanismo do cache de consultas de QR code, com ids de usuário
+    local_cache = CheckCache(
+        INVALIDATION_CHANNEL,
+        maxsize=LOCAL_MAX_ENTRIES,
+        ttl=getattr(settings, 'QRCODE_AUTH_LOCAL_TTL', 10),
+    )
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        fields, password_hash = self._get_cached_user(user_id)
+        # from_db espera os valores na ordem dos campos do modelo; o resto fica adiado
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in fields]
+        user = self.user_model.from_db(None, names, [fields[name] for name in names])
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+    @classmethod
+    def _cache_key(cls, user_id) -> str:
+        return f"{cls.CACHE_PREFIX}:{user_id}"
+
+    def _load_user(self, user_id):
+        """Campos do usuário no banco e o MD5 do hash da senha (o mesmo do claim de revogação)"""
+        names = list(dict.fromkeys([api_settings.USER_ID_FIELD, self.user_model.USERNAME_FIELD,
+                                    *self.CACHED_FIELDS]))
+        try:
+            user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        password_hash = get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+        return {name: getattr(user, name) for name in names}, password_hash
+
+    def _get_cached_user(self, user_id):
+        """Memória do processo -> Redis -> banco, nessa ordem"""
+        local_key = str(user_id)
+        entry = self.local_cache.get_many([local_key]).get(local_key)
+        if entry is not None:
+            return entry
+
+        # Lida antes do Redis: uma invalidação no meio descarta o que foi lido
+        generation = self.local_cache.generation()
+        key = self._cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            entry = self._load_user(user_id)
+            cache.set(key, entry, getattr(settings, 'QRCODE_AUTH_CACHE_TTL', 300))
+
+        self.local_cache.set_many({local_key: entry}, generation)
+        return entry
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        """Remove o usuário do Redis e do cache local deste e dos outros workers"""
+        cache.delete(cls._cache_key(user_id))
+        cls.local_cache.invalidate(str(user_id))
+        try:
+            connections.get_client(connections.PRIMARY).publish(cls.INVALIDATION_CHANNEL, str(user_id))
+        except Exception as e:
+            # Sem a publicação os outros workers só esquecem o usuário no TTL local
+            print(f"Erro ao publicar invalidação do usuário {user_id}: {e}")
+
+
+class DeviceUser:
+    """Usuário sem registro no banco que representa um dispositivo com chave de API"""
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, key_id: str, name: str):
+        self.pk = self.id = None
+        self.key_id = key_id
+        self.username = f"device:{name}"
+
+    def __str__(self):
+        return self.username
+
+
+class APIKeyAuthentication(BaseAuthentication):
+    """
+    Autenticação por chave de API de dispositivo:
+        Authorization: Api-Key <key_id>.<segredo>
+    Um HGET no Redis e uma comparação em tempo constante, sem hash de senha
+    nem acesso ao SQLite
+    """
+
+    keyword = 'Api-Key'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode(HTTP_HEADER_ENCODING):
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid API key header.'))
+
+        try:
+            device = APIKeyService.verify(auth[1].decode(HTTP_HEADER_ENCODING))
+        except UnicodeError:
+            device = None
+        if device is None:
+            raise exceptions.AuthenticationFailed(_('Invalid API key.'))
+
+        return DeviceUser(device['key_id'], device['name']), device['key_id']
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from . import connections
+
+
+class CheckCache:
+    """
+    Cache LRU em memória, por worker, das consultas "este QR code está autorizado?"
+    (guarda a janela de validade; a autorização é avaliada na hora)
+    As entradas vivem poucos segundos e são invalidadas pelas mensagens que
+    os scripts de alteração publicam no Redis (pub/sub). Enquanto a assinatura
+    não estiver ativa o cache fica desligado, pois não haveria como invalidá-lo
+    O CachedJWTAuthentication usa a mesma classe, com ids de usuário como chave
+    """
+
+    def __init__(self, channel: str, maxsize: int, ttl: float):
+        self.channel = channel
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listening = threading.Event()
+        self._pid = None
+
+    def _ensure_listener(self):
+        """Inicia a thread de assinatura no processo atual (workers nascem via fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._listening.clear()
+            self._entries.clear()
+            threading.Thread(target=self._listen, name='qrcode-check-cache', daemon=True).start()
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                # Cliente sem timeout de leitura: listen() fica ocioso entre invalidações
+                pubsub = connections.get_client(connections.PRIMARY, blocking=True).pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self._listening.set()
+                backoff = 1
+                for message in pubsub.listen():
+                    self.invalidate(message['data'].decode())
+            except Exception as e:
+                print(f"[CHECK CACHE] Assinatura perdida, cache desligado: {e}")
+            finally:
+                self._listening.clear()
+                self.invalidate('*')
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def generation(self) -> int:
+        """Marca usada por set_many para descartar leituras anteriores a uma invalidação"""
+        return self._generation
+
+    def get_many(self, qrcodes: Iterable[str]) -> Dict[str, Any]:
+        """Retorna os resultados em cache (apenas os encontrados e não expirados)"""
+        self._ensure_listener()
+        if not self._listening.is_set():
+            return {}
+
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for qrcode in qrcodes:
+                entry = self._entries.get(qrcode)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[qrcode]
+                    continue
+                self._entries.move_to_end(qrcode)
+                found[qrcode] = entry[1]
+        return found
+
+    def set_many(self, results: Dict[str, Any], generation: int):
+        """Guarda resultados lidos do Redis, se nada foi invalidado desde a leitura"""
+        if not self._listening.is_set():
+            return
+
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if generation != self._generation:
+                return
+            for qrcode, value in results.items():
+                self._entries[qrcode] = (expires, value)
+                self._entries.move_to_end(qrcode)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, qrcode: Optional[str]):
+        """Remove um QR code do cache; '*' limpa tudo"""
+        with self._lock:
+            self._generation += 1
+            if qrcode == '*':
+                self._entries.clear()
+            else:
+                self._entries.pop(qrcode, None)
+
@@ -0,0 +1,150 @@
+"""
+Conexões Redis do registro de QR codes: primário para mutações e réplica
+para leituras pesadas (listagem, exportação, contagem)
+
+Sem configuração, as duas são a conexão `default` do django-redis. Com
+QRCODE_REDIS_WRITE_URL / QRCODE_REDIS_READ_URL cada papel usa a sua URL;
+com QRCODE_REDIS_SENTINELS o primário e as réplicas são descobertos pelo
+Sentinel (e acompanham um failover). Depois de uma mutação, as leituras da
+mesma requisição vão para o primário (QRCODE_READ_YOUR_WRITES), então quem
+cadastrou um QR code já o encontra na listagem mesmo com a réplica atrasada
+"""
+import contextvars
+import threading
+from inspect import iscoroutinefunction
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.asyncio.sentinel import Sentinel as AsyncSentinel
+from redis.sentinel import Sentinel
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+_clients = {}
+_lock = threading.Lock()
+
+# True quando a requisição atual alterou o registro (zerado pelo middleware)
+_wrote = contextvars.ContextVar('qrcodeapp_redis_wrote', default=False)
+
+
+def _setting(name, default=None):
+    return getattr(settings, name, default)
+
+
+def _url(role: str):
+    return _setting('QRCODE_REDIS_WRITE_URL' if role == PRIMARY else 'QRCODE_REDIS_READ_URL')
+
+
+def _sentinel_client(sentinel, role: str):
+    service = _setting('QRCODE_REDIS_SENTINEL_SERVICE', 'mymaster')
+    db = _setting('QRCODE_REDIS_DB', 1)
+    if role == PRIMARY:
+        return sentinel.master_for(service, db=db)
+    # Sem réplica disponível, o pool do Sentinel cai para o primário
+    return sentinel.slave_for(service, db=db)
+
+
+def _socket_timeout(blocking: bool):
+    """
+    Timeout dos comandos no primário/réplica. Clientes bloqueantes (pub/sub,
+    XREAD BLOCK) ficam sem timeout: ficar ocioso esperando é o normal deles
+    """
+    return None if blocking else _setting('QRCODE_REDIS_SOCKET_TIMEOUT')
+
+
+def _sentinel_kwargs():
+    # Só as consultas ao Sentinel usam o timeout curto; sem sentinel_kwargs o
+    # redis-py aplicaria os socket_* das conexões de dados também ao Sentinel
+    return {'socket_timeout': _setting('QRCODE_REDIS_SENTINEL_TIMEOUT', 0.5)}
+
+
+def _build(role: str, blocking: bool = False):
+    sentinels = _setting('QRCODE_REDIS_SENTINELS')
+    if sentinels:
+        sentinel = Sentinel(sentinels, sentinel_kwargs=_sentinel_kwargs(),
+                            socket_timeout=_socket_timeout(blocking))
+        return _sentinel_client(sentinel, role)
+    return redis.Redis.from_url(_url(role), socket_timeout=_socket_timeout(blocking))
+
+
+def _configured(role: str) -> bool:
+    return bool(_setting('QRCODE_REDIS_SENTINELS') or _url(role))
+
+
+def _reads_from_primary() -> bool:
+    return _wrote.get() and _setting('QRCODE_READ_YOUR_WRITES', True)
+
+
+def get_client(role: str = PRIMARY, blocking: bool = False):
+    """
+    Cliente Redis síncrono do papel pedido (réplica -> primário se não houver)
+    blocking=True para pub/sub e comandos bloqueantes (sem timeout de leitura)
+    """
+    if role == REPLICA and (_reads_from_primary() or not _configured(REPLICA)):
+        role = PRIMARY
+    if not _configured(role):
+        return get_redis_connection("default")
+
+    key = (role, blocking)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _build(role, blocking)
+    return client
+
+
+def async_client_for(role: str, blocking: bool = False):
+    """
+    Novo cliente redis.asyncio do papel pedido (o AsyncQRCodeService guarda
+    um por event loop). None quando o papel usa a conexão padrão
+    """
+    sentinels = _setting('QRCODE_REDIS_SENTINELS')
+    max_connections = _setting('QRCODE_ASYNC_REDIS_MAX_CONNECTIONS', 50)
+    if sentinels:
+        sentinel = AsyncSentinel(sentinels, sentinel_kwargs=_sentinel_kwargs(),
+                                 socket_timeout=_socket_timeout(blocking), max_connections=max_connections)
+        return _sentinel_client(sentinel, role)
+    url = _url(role) or (settings.CACHES["default"]["LOCATION"] if role == PRIMARY else None)
+    if url is None:
+        return None
+    pool = aioredis.ConnectionPool.from_url(url, max_connections=max_connections,
+                                            socket_timeout=_socket_timeout(blocking))
+    return aioredis.Redis(connection_pool=pool)
+
+
+def read_role() -> str:
+    """Papel das leituras da requisição atual (read-your-writes)"""
+    return PRIMARY if _reads_from_primary() else REPLICA
+
+
+def mark_write():
+    """Registra que a requisição atual alterou o registro"""
+    _wrote.set(True)
+
+
+def read_your_writes_middleware(get_response):
+    """Zera a marca de escrita a cada requisição (threads e tasks são reaproveitadas)"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _wrote.set(False)
+            try:
+                return await get_response(request)
+            finally:
+                _wrote.reset(token)
+    else:
+        def middleware(request):
+            token = _wrote.set(False)
+            try:
+                return get_response(request)
+            finally:
+                _wrote.reset(token)
+    return middleware
+
+
+read_your_writes_middleware.sync_capable = True
+read_your_writes_middleware.async_capable = True
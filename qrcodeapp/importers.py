@@ -0,0 +1,86 @@
+import csv
+from typing import Iterator, Optional
+
+import orjson
+
+
+class QRCodeFileParser:
+    """
+    Lê um arquivo CSV ou NDJSON de QR codes linha a linha, sem carregar tudo
+    em memória. Itera apenas os QR codes válidos; linhas inválidas ficam
+    contadas em `invalid`
+    """
+
+    FORMATS = ('csv', 'ndjson')
+
+    def __init__(self, uploaded_file, file_format: str):
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Formato inválido: {file_format}")
+        self.uploaded_file = uploaded_file
+        self.file_format = file_format
+        self.invalid = 0
+
+    @classmethod
+    def detect_format(cls, filename: str) -> Optional[str]:
+        """Deduz o formato pela extensão do arquivo"""
+        name = (filename or '').lower()
+        if name.endswith('.csv'):
+            return 'csv'
+        if name.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+        return None
+
+    def __iter__(self) -> Iterator[str]:
+        if self.file_format == 'csv':
+            return self._iter_csv()
+        return self._iter_ndjson()
+
+    def _clean(self, value) -> Optional[str]:
+        """Normaliza um QR code; retorna None (e conta como inválido) se não servir"""
+        if isinstance(value, str):
+            value = value.strip()
+            if value:
+                return value
+        self.invalid += 1
+        return None
+
+    def _iter_lines(self) -> Iterator[str]:
+        """Decodifica o upload linha a linha (UploadedFile lê em chunks)"""
+        first = True
+        for raw in self.uploaded_file:
+            try:
+                line = raw.decode('utf-8-sig' if first else 'utf-8')
+            except UnicodeDecodeError:
+                self.invalid += 1
+                continue
+            finally:
+                first = False
+            if line.strip():
+                yield line
+
+    def _iter_csv(self) -> Iterator[str]:
+        column = 0
+        for index, row in enumerate(csv.reader(self._iter_lines())):
+            if index == 0:
+                # Cabeçalho opcional: usa a coluna "qrcode" se existir
+                header = [cell.strip().lower() for cell in row]
+                if 'qrcode' in header:
+                    column = header.index('qrcode')
+                    continue
+            qrcode = self._clean(row[column] if column < len(row) else None)
+            if qrcode is not None:
+                yield qrcode
+
+    def _iter_ndjson(self) -> Iterator[str]:
+        for line in self._iter_lines():
+            try:
+                item = orjson.loads(line)
+            except ValueError:
+                self.invalid += 1
+                continue
+            # Aceita {"qrcode": "..."} ou apenas a string JSON
+            if isinstance(item, dict):
+                item = item.get('qrcode')
+            qrcode = self._clean(item)
+            if qrcode is not None:
+                yield qrcode
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from qrcodeapp.services import APIKeyService
+
+
+class Command(BaseCommand):
+    help = "Emite, revoga e lista chaves de API de dispositivos (catracas e integrações)"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        issue = subparsers.add_parser('issue', help='Emite uma nova chave')
+        issue.add_argument('name', help='Nome do dispositivo (ex.: catraca-portaria)')
+
+        revoke = subparsers.add_parser('revoke', help='Revoga uma chave')
+        revoke.add_argument('key_id', help='Identificador da chave (parte antes do ponto)')
+
+        subparsers.add_parser('list', help='Lista as chaves cadastradas')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"_{options['action']}")(options)
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError(f'Erro ao acessar as chaves de API: {e}')
+
+    def _issue(self, options):
+        api_key = APIKeyService.issue(options['name'])
+        self.stdout.write(self.style.SUCCESS(f"Chave emitida para {options['name']}:"))
+        self.stdout.write(api_key)
+        self.stdout.write("Guarde a chave agora; ela não poderá ser exibida de novo.")
+
+    def _revoke(self, options):
+        if not APIKeyService.revoke(options['key_id']):
+            raise CommandError(f"Chave {options['key_id']} não encontrada.")
+        self.stdout.write(self.style.SUCCESS(f"Chave {options['key_id']} revogada."))
+
+    def _list(self, options):
+        keys = APIKeyService.list_keys()
+        if not keys:
+            self.stdout.write("Nenhuma chave cadastrada.")
+        for key in keys:
+            created = datetime.fromtimestamp(key['created']).strftime('%Y-%m-%d %H:%M')
+            self.stdout.write(f"{key['key_id']}  {key['name']}  (criada em {created})")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from qrcodeapp.services import QRCodeService
+
+
+class Command(BaseCommand):
+    help = "Migra as chaves antigas qrcodes:<code> para o SET indexado do registro"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Chaves processadas por lote de SCAN (padrão: 1000)'
+        )
+        parser.add_argument(
+            '--keep-legacy', action='store_true',
+            help='Não remove as chaves antigas após copiar para o SET'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        try:
+            migrated = QRCodeService.migrate_legacy_keys(
+                batch_size=options['batch_size'],
+                delete_legacy=not options['keep_legacy'],
+            )
+        except Exception as e:
+            raise CommandError(f'Erro ao migrar QR codes: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{migrated} QR codes migrados. Total no registro: {QRCodeService.get_count()}'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from qrcodeapp.services import QRCodeService
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice lexicográfico (busca por prefixo/faixa) a partir do SET do registro"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='QR codes indexados por lote de SSCAN (padrão: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        try:
+            indexed = QRCodeService.rebuild_index(batch_size=options['batch_size'])
+        except Exception as e:
+            raise CommandError(f'Erro ao reconstruir o índice: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{indexed} QR codes adicionados ao índice. Total no registro: {QRCodeService.get_count()}'
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from qrcodeapp.services import QRCodeService
+
+
+class Command(BaseCommand):
+    help = "Remove os QR codes com validade vencida (valid_until no passado)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=QRCodeService.SWEEP_BATCH_SIZE,
+            help=f'QR codes removidos por lote (padrão: {QRCodeService.SWEEP_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Repete a varredura a cada N segundos (padrão: 0, roda uma vez)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        while True:
+            try:
+                removed = QRCodeService.sweep_expired(batch_size=options['batch_size'])
+            except Exception as e:
+                if not options['interval']:
+                    raise CommandError(f'Erro ao remover QR codes vencidos: {e}')
+                self.stderr.write(f'Erro ao remover QR codes vencidos: {e}')
+            else:
+                if removed or not options['interval']:
+                    self.stdout.write(self.style.SUCCESS(f'{removed} QR codes vencidos removidos.'))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,15 @@
+from rest_framework import permissions
+
+from .authentication import DeviceUser
+
+
+class IsAccountUser(permissions.BasePermission):
+    """
+    Operações destrutivas (exclusão, expurgo, importação com replace) só com
+    usuário autenticado por JWT; chaves de API de dispositivo recebem 403
+    """
+
+    message = 'Chaves de API de dispositivo não podem executar esta operação.'
+
+    def has_permission(self, request, view):
+        return not isinstance(request.user, DeviceUser)
@@ -0,0 +1,73 @@
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Tipos que o orjson/msgpack não conhecem (datetime, Decimal, lazy strings...)
+# são convertidos pelo encoder do DRF, então as respostas não mudam de formato
+_default = JSONEncoder().default
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+}
+
+
+def encode(data, media_format: str = 'json') -> bytes:
+    """Serializa `data` em JSON (orjson) ou MessagePack"""
+    if media_format == 'msgpack':
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+    return orjson.dumps(data, default=_default,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSONRenderer com orjson: listas de 100 mil QR codes serializam várias
+    vezes mais rápido que com o json da biblioteca padrão no Raspberry Pi
+    """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return encode(data, 'json')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Respostas em MessagePack para clientes que enviam Accept: application/msgpack"""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return encode(data, 'msgpack')
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,184 @@
+# Scripts Lua executados no Redis (EVALSHA) pelo QRCodeService.
+# Cada script aplica a mudança e registra a nova versão do registro
+# atomicamente, então o log de mudanças nunca fica fora de ordem.
+# As mudanças também são publicadas no canal de invalidação, que limpa o
+# cache local de consultas (check_cache) de cada worker.
+# O índice lexicográfico (ZSET, score 0) e as janelas de validade (ZSETs
+# com o início e o fim em epoch) acompanham o SET em todos eles.
+
+# KEYS: registro (SET), versão, stream de mudanças, índice (ZSET), início e fim da validade (ZSETs)
+# ARGV: operação ('add' | 'remove'), tamanho máximo do stream, canal de invalidação,
+#       início e fim da validade do lote ('' = sem limite), QR codes...
+# Aplica o lote inteiro em um único round trip (EVALSHA)
+# Retorna a nova versão de cada QR code, ou 0 onde nada mudou
+APPLY_CHANGE = """
+local add = ARGV[1] == 'add'
+local versions = {}
+for i = 6, #ARGV do
+    local version = 0
+    local changed
+    if add then
+        changed = redis.call('SADD', KEYS[1], ARGV[i])
+    else
+        changed = redis.call('SREM', KEYS[1], ARGV[i])
+    end
+    if changed == 1 then
+        if add then
+            redis.call('ZADD', KEYS[4], 0, ARGV[i])
+            if ARGV[4] ~= '' then
+                redis.call('ZADD', KEYS[5], ARGV[4], ARGV[i])
+            end
+            if ARGV[5] ~= '' then
+                redis.call('ZADD', KEYS[6], ARGV[5], ARGV[i])
+            end
+        else
+            redis.call('ZREM', KEYS[4], ARGV[i])
+            redis.call('ZREM', KEYS[5], ARGV[i])
+            redis.call('ZREM', KEYS[6], ARGV[i])
+        end
+        version = redis.call('INCR', KEYS[2])
+        redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[2], version .. '-0',
+            'op', ARGV[1], 'qrcode', ARGV[i])
+        redis.call('PUBLISH', ARGV[3], ARGV[i])
+    end
+    versions[#versions + 1] = version
+end
+return versions
+"""
+
+# KEYS: registro (SET), versão, stream de mudanças, índice (ZSET), início e fim da validade (ZSETs)
+# ARGV: canal de invalidação
+# Retorna a nova versão
+CLEAR = """
+redis.call('UNLINK', KEYS[1], KEYS[3], KEYS[4], KEYS[5], KEYS[6])
+local version = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[3], version .. '-0', 'op', 'clear', 'qrcode', '')
+redis.call('PUBLISH', ARGV[1], '*')
+return version
+"""
+
+# KEYS: registro (SET), versão, stream de mudanças, SET temporário da importação,
+#       índice (ZSET), índice temporário da importação, início e fim da validade (ZSETs)
+# ARGV: canal de invalidação
+# Troca o registro pelo SET importado (sem janelas de validade); o log é
+# descartado para forçar resync. Sem o SET importado (nenhum QR code válido
+# ou TTL vencido) o registro fica intacto
+# Retorna a nova versão, ou nil se nada foi trocado
+REPLACE = """
+if redis.call('EXISTS', KEYS[4]) == 0 then
+    return false
+end
+redis.call('UNLINK', KEYS[1], KEYS[3], KEYS[5], KEYS[7], KEYS[8])
+for _, pair in ipairs({{KEYS[4], KEYS[1]}, {KEYS[6], KEYS[5]}}) do
+    if redis.call('EXISTS', pair[1]) == 1 then
+        redis.call('RENAME', pair[1], pair[2])
+        redis.call('PERSIST', pair[2])
+    end
+end
+redis.call('PUBLISH', ARGV[1], '*')
+return redis.call('INCR', KEYS[2])
+"""
+
+# KEYS: registro (SET), versão, stream de mudanças, SET do expurgo,
+#       depois pares (ZSET do registro, ZSET do expurgo): índice, início e fim da validade
+# ARGV: canal de invalidação
+# Tira o registro do ar de uma vez (RENAME, O(1)); os membros são apagados
+# depois, em lotes, pelo job de expurgo
+# Retorna {nova versão, QR codes a apagar}
+PURGE = """
+redis.call('UNLINK', KEYS[3])
+local total = 0
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[4])
+    total = redis.call('SCARD', KEYS[4])
+end
+for i = 5, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('RENAME', KEYS[i], KEYS[i + 1])
+    end
+end
+local version = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[3], version .. '-0', 'op', 'clear', 'qrcode', '')
+redis.call('PUBLISH', ARGV[1], '*')
+return {version, total}
+"""
+
+# KEYS: registro (SET), índice (ZSET)
+# ARGV: QR codes...
+# Reconstrói o índice de um lote; só indexa quem ainda está no SET, então
+# pode rodar junto com cadastros e remoções
+# Retorna quantos QR codes foram indexados
+REINDEX = """
+local indexed = 0
+for i = 1, #ARGV do
+    if redis.call('SISMEMBER', KEYS[1], ARGV[i]) == 1 then
+        indexed = indexed + redis.call('ZADD', KEYS[2], 0, ARGV[i])
+    end
+end
+return indexed
+"""
+
+# KEYS: registro (SET), versão, stream de mudanças, índice (ZSET), início e fim da validade (ZSETs)
+# ARGV: agora (epoch), tamanho do lote, tamanho máximo do stream, canal de invalidação
+# Remove um lote de QR codes vencidos, percorrendo o fim da validade em ordem
+# Retorna quantos QR codes vencidos foram processados
+SWEEP = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[6], '-inf', '(' .. ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, qrcode in ipairs(expired) do
+    redis.call('ZREM', KEYS[4], qrcode)
+    redis.call('ZREM', KEYS[5], qrcode)
+    redis.call('ZREM', KEYS[6], qrcode)
+    if redis.call('SREM', KEYS[1], qrcode) == 1 then
+        local version = redis.call('INCR', KEYS[2])
+        redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[3], version .. '-0',
+            'op', 'remove', 'qrcode', qrcode)
+        redis.call('PUBLISH', ARGV[4], qrcode)
+    end
+end
+return #expired
+"""
+
+# KEYS: stream de acessos, contador do minuto (HASH), contador da hora (HASH)
+# ARGV: tamanho máximo do stream, QR code, resultado ('allowed' | 'denied'),
+#       sentido, catraca, retenção do contador do minuto, retenção do contador da hora,
+#       momento da decisão (epoch)
+# Grava a decisão da catraca e atualiza os contadores no mesmo round trip
+# Retorna o id do evento no stream
+RECORD_ACCESS = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*',
+    'qrcode', ARGV[2], 'result', ARGV[3], 'direction', ARGV[4], 'gate', ARGV[5], 'ts', ARGV[8])
+for i = 2, 3 do
+    redis.call('HINCRBY', KEYS[i], ARGV[3], 1)
+    redis.call('HINCRBY', KEYS[i], ARGV[5] .. ':' .. ARGV[3], 1)
+    redis.call('EXPIRE', KEYS[i], ARGV[i + 4])
+end
+return id
+"""
+
+# KEYS: balde do cliente (HASH com 'tokens' e 'ts')
+# ARGV: capacidade, reposição (tokens por segundo), agora (epoch), retenção do balde
+# Token bucket: repõe os tokens pelo tempo decorrido e consome um, se houver
+# Retorna {1 | 0, segundos até o próximo token}
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+if now > ts then
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    ts = now
+end
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {allowed, tostring(wait)}
+"""
@@ -1,4 +1,143 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.utils import html
+
+from .access_events import ROLLUPS
+
+class QRCodeValiditySerializer(serializers.Serializer):
+    """Janela de validade opcional (ingressos e passes de um dia)"""
+
+    valid_from = serializers.DateTimeField(required=False)
+    valid_until = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'valid_from' in data and 'valid_until' in data and data['valid_from'] > data['valid_until']:
+            raise serializers.ValidationError('valid_from deve ser anterior a valid_until.')
+        return data
+
+    def validity(self):
+        """Argumentos valid_from/valid_until para o QRCodeService"""
+        return {
+            'valid_from': self.validated_data.get('valid_from'),
+            'valid_until': self.validated_data.get('valid_until'),
+        }
+
+class QRCodeListField(serializers.ListField):
+    """
+    Lista de QR codes validada em uma única passada
+    O ListField padrão roda o CharField inteiro (run_validation, validadores)
+    para cada item, o que domina o tempo de lotes com dezenas de milhares de
+    QR codes. Mesmas regras do CharField: números viram texto, espaços nas
+    pontas são removidos e valores vazios são recusados
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(child=serializers.CharField(), **kwargs)
+
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = html.parse_html_list(data, default=[])
+        if isinstance(data, (str, dict)) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        qrcodes = []
+        errors = {}
+        for index, item in enumerate(data):
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                item = str(item)
+            if item is None:
+                errors[index] = [self.child.error_messages['null']]
+                continue
+            if not isinstance(item, str):
+                errors[index] = [self.child.error_messages['invalid']]
+                continue
+            item = item.strip()
+            if not item:
+                errors[index] = [self.child.error_messages['blank']]
+                continue
+            qrcodes.append(item)
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return qrcodes
+
+class QRCodeSerializer(QRCodeValiditySerializer):
+    qrcode = serializers.CharField(required=True)
+
+class QRCodeBulkSerializer(QRCodeValiditySerializer):
+    BULK_MAX_ITEMS = 50000  # limite de QR codes por requisição
+
+    qrcodes = QRCodeListField(allow_empty=False, max_length=BULK_MAX_ITEMS)
+
+class QRCodeListQuerySerializer(serializers.Serializer):
+    LIST_MAX_LIMIT = 5000  # máximo de QR codes por página
+
+    SEARCH_FIELDS = ('prefix', 'start', 'end', 'after')  # busca no índice lexicográfico
+
+    cursor = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=LIST_MAX_LIMIT, default=1000)
+    prefix = serializers.CharField(required=False)
+    start = serializers.CharField(required=False)
+    end = serializers.CharField(required=False)
+    after = serializers.CharField(required=False)
+
+    def search_params(self):
+        """Filtros de busca informados (vazio = listagem completa via SSCAN)"""
+        return {field: self.validated_data[field] for field in self.SEARCH_FIELDS
+                if field in self.validated_data}
+
+class QRCodeChangesQuerySerializer(serializers.Serializer):
+    CHANGES_MAX_LIMIT = 5000  # máximo de mudanças por página
+
+    since = serializers.IntegerField(min_value=0, required=True)
+    limit = serializers.IntegerField(min_value=1, max_value=CHANGES_MAX_LIMIT, default=1000)
+
+class QRCodeCheckBatchSerializer(serializers.Serializer):
+    CHECK_MAX_ITEMS = 10000  # limite de QR codes por consulta em lote
+
+    qrcodes = QRCodeListField(allow_empty=False, max_length=CHECK_MAX_ITEMS)
+
+class FromFieldMixin:
+    """Campo de query `from`: palavra reservada, não pode ser atributo da classe"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateTimeField(required=False)
+        return fields
+
+class QRCodeEventsQuerySerializer(FromFieldMixin, serializers.Serializer):
+    EVENTS_MAX_LIMIT = 1000  # máximo de eventos por página
+
+    to = serializers.DateTimeField(required=False)
+    code = serializers.CharField(required=False)
+    cursor = serializers.RegexField(r'^\d+-\d+$', required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=EVENTS_MAX_LIMIT, default=100)
+
+    def validate(self, data):
+        if 'from' in data and 'to' in data and data['from'] > data['to']:
+            raise serializers.ValidationError('from deve ser anterior a to.')
+        return data
+
+class QRCodeRollupQuerySerializer(FromFieldMixin, serializers.Serializer):
+    ROLLUP_MAX_BUCKETS = 1440  # intervalos por consulta (um dia, minuto a minuto)
+    ROLLUP_DEFAULT_BUCKETS = 60  # sem `from`: os últimos 60 intervalos
+
+    granularity = serializers.ChoiceField(choices=list(ROLLUPS), default='minute')
+    to = serializers.DateTimeField(required=False)
+    gate = serializers.CharField(required=False)
 
-class QRCodeSerializer(serializers.Serializer):
-    qrcode = serializers.CharField(required=True) 
\ No newline at end of file
+    def validate(self, data):
+        size = timedelta(seconds=ROLLUPS[data['granularity']][0])
+        data['to'] = data.get('to') or timezone.now()
+        data['from'] = data.get('from') or data['to'] - size * (self.ROLLUP_DEFAULT_BUCKETS - 1)
+        if data['from'] > data['to']:
+            raise serializers.ValidationError('from deve ser anterior a to.')
+        if (data['to'] - data['from']) / size >= self.ROLLUP_MAX_BUCKETS:
+            raise serializers.ValidationError(
+                f'Intervalo grande demais: máximo de {self.ROLLUP_MAX_BUCKETS} intervalos por consulta.'
+            )
+        return data
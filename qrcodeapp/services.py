@@ -1,36 +1,190 @@
+from django.conf import settings
 from django.core.cache import cache
-from django_redis import get_redis_connection
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import gzip
+import hashlib
+import hmac
 import json
+import secrets
+import threading
+import time
+import uuid
+from . import access_events, connections, renderers, scripts
+from .check_cache import CheckCache
 
 class QRCodeService:
     """Serviço para gerenciar QR codes usando Redis diretamente"""
     
-    CACHE_KEY = "qrcodes"
-    CACHE_TIMEOUT = 60 * 60 * 24 * 365  # 1 ano
+    CACHE_KEY = "qrcodes"  # prefixo do layout antigo (uma chave string por QR code)
+    REGISTRY_KEY = "qrcodes_registry"  # SET com todos os QR codes autorizados
+    VERSION_KEY = f"{REGISTRY_KEY}:version"  # versão monotônica do registro
+    CHANGES_KEY = f"{REGISTRY_KEY}:changes"  # stream com as últimas mudanças
+    INDEX_KEY = f"{REGISTRY_KEY}:index"  # ZSET (score 0) para busca por prefixo/faixa
+    VALID_FROM_KEY = f"{REGISTRY_KEY}:valid_from"  # ZSET com o início da validade (epoch)
+    VALID_UNTIL_KEY = f"{REGISTRY_KEY}:valid_until"  # ZSET com o fim da validade, percorrido pelo sweeper
+    WINDOW_KEYS = (INDEX_KEY, VALID_FROM_KEY, VALID_UNTIL_KEY)  # ZSETs que acompanham o SET
+    CHANGES_MAXLEN = 100000  # mudanças mantidas no stream (aproximado)
+    IMPORT_STAGING_TTL = 60 * 60  # SET temporário de importação some se o processo cair
+    LIST_CACHE_KEY = f"{REGISTRY_KEY}:list_cache"  # páginas da listagem já serializadas
+    LIST_CACHE_TTL = 60 * 5  # segundos; a versão na chave já invalida o conteúdo
+    INVALIDATION_CHANNEL = f"{REGISTRY_KEY}:invalidate"  # pub/sub das alterações
+    CHECK_CHUNK_SIZE = 1000  # membros por SMISMEMBER na consulta em lote
+    
+    # Cache local (por worker) das consultas de autorização
+    check_cache = CheckCache(
+        INVALIDATION_CHANNEL,
+        maxsize=getattr(settings, 'QRCODE_CHECK_CACHE_SIZE', 10000),
+        ttl=getattr(settings, 'QRCODE_CHECK_CACHE_TTL', 5),
+    )
+    BULK_CHUNK_SIZE = 1000  # QR codes por chamada do script no cadastro/remoção em lote
+    SCAN_BATCH_SIZE = 1000  # membros por iteração de SSCAN
+    PURGE_STATUS_KEY = f"{REGISTRY_KEY}:purge"  # HASH com o progresso do último expurgo
+    PURGE_LOCK_KEY = f"{REGISTRY_KEY}:purge:lock"  # um expurgo por vez entre os workers
+    PURGE_LOCK_TTL = 60  # segundos; renovado a cada lote, expira se o worker morrer
+    SWEEP_BATCH_SIZE = 500  # QR codes vencidos removidos por chamada do script
+    
+    _scripts = {}
     
     @classmethod
     def _get_redis_client(cls):
-        """Obtém cliente Redis direto"""
-        return get_redis_connection("default")
+        """Obtém o cliente Redis do primário (mutações e leituras que não podem atrasar)"""
+        return connections.get_client(connections.PRIMARY)
+    
+    @classmethod
+    def _get_read_client(cls):
+        """
+        Obtém o cliente Redis das leituras pesadas (réplica, se configurada)
+        Depois de uma mutação na mesma requisição, volta a ser o primário
+        """
+        return connections.get_client(connections.REPLICA)
+    
+    @classmethod
+    def _get_script(cls, name: str):
+        """Retorna o script Lua registrado (EVALSHA, com fallback para SCRIPT LOAD)"""
+        script = cls._scripts.get(name)
+        if script is None:
+            script = cls._get_redis_client().register_script(getattr(scripts, name))
+            cls._scripts[name] = script
+        return script
+    
+    @staticmethod
+    def _epoch(value: Optional[datetime]):
+        """Datetime -> epoch em segundos para os scripts ('' = sem limite)"""
+        return int(value.timestamp()) if value else ''
+
+    @classmethod
+    def _apply_changes(cls, op: str, qrcodes: List[str], valid_from: Optional[datetime] = None,
+                       valid_until: Optional[datetime] = None) -> List[int]:
+        """
+        Aplica 'add' ou 'remove' a um lote e registra as mudanças no stream
+        atomicamente, em um único round trip
+        Retorna a nova versão de cada QR code, ou 0 onde nada mudou
+        """
+        connections.mark_write()
+        return cls._get_script('APPLY_CHANGE')(
+            keys=[cls.REGISTRY_KEY, cls.VERSION_KEY, cls.CHANGES_KEY, *cls.WINDOW_KEYS],
+            args=[op, cls.CHANGES_MAXLEN, cls.INVALIDATION_CHANNEL,
+                  cls._epoch(valid_from), cls._epoch(valid_until), *qrcodes],
+        )
+    
+    @classmethod
+    def _apply_changes_bulk(cls, op: str, qrcodes: List[str], valid_from: Optional[datetime] = None,
+                            valid_until: Optional[datetime] = None) -> Dict[str, bool]:
+        """
+        Aplica o lote em chamadas de até BULK_CHUNK_SIZE QR codes
+        Retorna dict qrcode -> True se mudou
+        """
+        unique = list(dict.fromkeys(qrcodes))
+        results = {}
+
+        for start in range(0, len(unique), cls.BULK_CHUNK_SIZE):
+            chunk = unique[start:start + cls.BULK_CHUNK_SIZE]
+            for qrcode, version in zip(chunk, cls._apply_changes(op, chunk, valid_from, valid_until)):
+                results[qrcode] = version > 0
+
+        return results
     
     @classmethod
-    def add_qrcode(cls, qrcode: str) -> bool:
+    def add_qrcode(cls, qrcode: str, valid_from: Optional[datetime] = None,
+                   valid_until: Optional[datetime] = None) -> bool:
         """
-        Adiciona um QR code ao Redis diretamente
+        Adiciona um QR code ao Redis diretamente, opcionalmente com janela de validade
         Retorna True se adicionado, False se já existia
         """
         try:
-            redis_client = cls._get_redis_client()
-            key = f"{cls.CACHE_KEY}:{qrcode}"
-            
-            # Usar SET com NX para verificar se já existe
-            result = redis_client.set(key, qrcode, ex=cls.CACHE_TIMEOUT, nx=True)
-            return result
+            # O script retorna 0 quando o membro já existe no SET
+            return cls._apply_changes('add', [qrcode], valid_from, valid_until)[0] > 0
         except Exception as e:
             print(f"Erro ao adicionar QR code: {e}")
             return False
     
+    @classmethod
+    def add_qrcodes(cls, qrcodes: List[str], valid_from: Optional[datetime] = None,
+                    valid_until: Optional[datetime] = None) -> Dict[str, bool]:
+        """
+        Adiciona vários QR codes, um script atômico por lote (um round trip por lote)
+        A janela de validade, se informada, vale para o lote inteiro
+        Retorna dict qrcode -> True se adicionado, False se já existia
+        """
+        return cls._apply_changes_bulk('add', qrcodes, valid_from, valid_until)
+
+    @classmethod
+    def import_qrcodes(cls, qrcodes: Iterable[str], replace: bool = False) -> Dict[str, int]:
+        """
+        Importa QR codes de um iterável (ex.: arquivo lido linha a linha) em lotes
+        Com replace=True os códigos vão para um SET temporário que substitui
+        o registro atomicamente no final; sem nenhum QR code válido o registro
+        não é tocado e levanta ValueError
+        Retorna as contagens de inseridos e duplicados
+        """
+        counts = {'inserted': 0, 'duplicate': 0}
+        staging_key = f"{cls.REGISTRY_KEY}:import:{uuid.uuid4().hex}" if replace else None
+        staging_index = f"{staging_key}:index" if replace else None
+        redis_client = cls._get_redis_client()
+        connections.mark_write()
+
+        def flush(chunk):
+            if replace:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.sadd(staging_key, *chunk)
+                pipe.zadd(staging_index, dict.fromkeys(chunk, 0))
+                pipe.expire(staging_key, cls.IMPORT_STAGING_TTL)
+                pipe.expire(staging_index, cls.IMPORT_STAGING_TTL)
+                inserted = pipe.execute()[0]
+            else:
+                inserted = sum(cls.add_qrcodes(chunk).values())
+            counts['inserted'] += inserted
+            counts['duplicate'] += len(chunk) - inserted
+
+        try:
+            chunk = []
+            for qrcode in qrcodes:
+                chunk.append(qrcode)
+                if len(chunk) >= cls.BULK_CHUNK_SIZE:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+
+            if replace:
+                if not counts['inserted'] + counts['duplicate']:
+                    # Arquivo vazio ou todo inválido: não apaga o registro
+                    raise ValueError('Nenhum QR code válido no arquivo; o registro não foi substituído.')
+                version = cls._get_script('REPLACE')(
+                    keys=[cls.REGISTRY_KEY, cls.VERSION_KEY, cls.CHANGES_KEY, staging_key,
+                          cls.INDEX_KEY, staging_index, cls.VALID_FROM_KEY, cls.VALID_UNTIL_KEY],
+                    args=[cls.INVALIDATION_CHANNEL]
+                )
+                if version is None:
+                    raise ValueError('Importação expirada antes da troca; o registro não foi substituído.')
+        except Exception:
+            if replace:
+                redis_client.unlink(staging_key, staging_index)
+            raise
+
+        return counts
+
     @classmethod
     def remove_qrcode(cls, qrcode: str) -> bool:
         """
@@ -38,63 +192,237 @@ class QRCodeService:
         Retorna True se removido, False se não existia
         """
         try:
-            redis_client = cls._get_redis_client()
-            key = f"{cls.CACHE_KEY}:{qrcode}"
-            
-            # Verificar se existe antes de remover
-            exists = redis_client.exists(key)
-            if exists:
-                redis_client.delete(key)
-                return True
-            return False
+            # O script retorna 0 quando o membro não existia (um único round trip)
+            return cls._apply_changes('remove', [qrcode])[0] > 0
         except Exception as e:
             print(f"Erro ao remover QR code: {e}")
             return False
     
+    @classmethod
+    def remove_qrcodes(cls, qrcodes: List[str]) -> Dict[str, bool]:
+        """
+        Remove vários QR codes, um script atômico por lote (um round trip por lote)
+        Retorna dict qrcode -> True se removido, False se não existia
+        """
+        return cls._apply_changes_bulk('remove', qrcodes)
+    
+    @classmethod
+    def scan_qrcodes(cls, cursor: int = 0, limit: int = 1000) -> Tuple[List[str], int]:
+        """
+        Retorna uma página de QR codes usando SSCAN (não bloqueia o Redis)
+        Retorna (qrcodes, next_cursor); next_cursor 0 indica o fim da listagem
+        A página pode ter um pouco mais que `limit` itens, pois o SSCAN
+        devolve lotes inteiros
+        """
+        redis_client = cls._get_read_client()
+        qrcodes = []
+
+        while True:
+            cursor, batch = redis_client.sscan(cls.REGISTRY_KEY, cursor=cursor, count=limit)
+            qrcodes.extend(member.decode() for member in batch)
+            if cursor == 0 or len(qrcodes) >= limit:
+                return qrcodes, cursor
+
+    @classmethod
+    def iter_qrcode_batches(cls, batch_size: int = None) -> Iterator[List[str]]:
+        """
+        Percorre todo o registro em lotes de SSCAN, sem carregar tudo em memória
+        """
+        cursor = 0
+        while True:
+            page, cursor = cls.scan_qrcodes(cursor, batch_size or cls.SCAN_BATCH_SIZE)
+            if page:
+                yield page
+            if cursor == 0:
+                return
+
     @classmethod
     def get_all_qrcodes(cls) -> List[str]:
         """
         Retorna todos os QR codes salvos diretamente do Redis
+        Percorre o SET com SSCAN em lotes em vez de SMEMBERS
         """
         try:
-            redis_client = cls._get_redis_client()
-            pattern = f"{cls.CACHE_KEY}:*"
-            keys = redis_client.keys(pattern)
-            
-            if not keys:
-                return []
-            
-            # Buscar todos os valores de uma vez
-            values = redis_client.mget(keys)
-            return [v for v in values if v is not None]
+            qrcodes = []
+            for page in cls.iter_qrcode_batches():
+                qrcodes.extend(page)
+            return qrcodes
             
         except Exception as e:
             print(f"Erro ao buscar QR codes: {e}")
             return []
     
+    @classmethod
+    def get_list_payload(cls, version: int, cursor: int, limit: int, media_format: str = 'json') -> bytes:
+        """
+        Retorna a página da listagem serializada (JSON ou MessagePack) e comprimida com gzip
+        O corpo fica em cache no Redis por versão do registro, compartilhado
+        por todos os workers; só um cache miss percorre o SET
+        """
+        cache_key = f"{cls.LIST_CACHE_KEY}:{version}:{cursor}:{limit}:{media_format}"
+
+        payload = cls._get_read_client().get(cache_key)
+        if payload is None:
+            qrcodes, next_cursor = cls.scan_qrcodes(cursor, limit)
+            body = renderers.encode({
+                'qrcodes': qrcodes,
+                'next_cursor': next_cursor,
+                'total': cls.get_count(),
+                'version': version,
+            }, media_format)
+            payload = gzip.compress(body)
+            cls._get_redis_client().set(cache_key, payload, ex=cls.LIST_CACHE_TTL)
+        return payload
+
     @classmethod
     def qrcode_exists(cls, qrcode: str) -> bool:
         """
         Verifica se um QR code existe diretamente no Redis
         """
         try:
-            redis_client = cls._get_redis_client()
-            key = f"{cls.CACHE_KEY}:{qrcode}"
-            return redis_client.exists(key) > 0
+            redis_client = cls._get_read_client()
+            return bool(redis_client.sismember(cls.REGISTRY_KEY, qrcode))
         except Exception as e:
             print(f"Erro ao verificar QR code: {e}")
             return False
     
+    @classmethod
+    def queue_window_lookup(cls, pipe, qrcodes: List[str]):
+        """Enfileira no pipeline a consulta de cadastro e janela de validade de um lote"""
+        pipe.smismember(cls.REGISTRY_KEY, qrcodes)
+        pipe.zmscore(cls.VALID_FROM_KEY, qrcodes)
+        pipe.zmscore(cls.VALID_UNTIL_KEY, qrcodes)
+
+    @staticmethod
+    def parse_windows(qrcodes: List[str], replies) -> Dict[str, Optional[Tuple]]:
+        """
+        Converte as respostas de queue_window_lookup em qrcode -> janela
+        A janela é None para QR codes não cadastrados, ou (início, fim) com None
+        onde não há limite
+        """
+        members, valid_from, valid_until = replies
+        return {
+            qrcode: (start, end) if member else None
+            for qrcode, member, start, end in zip(qrcodes, members, valid_from, valid_until)
+        }
+
+    @staticmethod
+    def is_valid_now(window: Optional[Tuple], now: float) -> bool:
+        """Verifica se o QR code está cadastrado e dentro da janela de validade"""
+        if window is None:
+            return False
+        valid_from, valid_until = window
+        return (valid_from is None or valid_from <= now) and (valid_until is None or now <= valid_until)
+
+    @classmethod
+    def check_qrcodes(cls, qrcodes: List[str]) -> Dict[str, bool]:
+        """
+        Consulta em lote se os QR codes estão autorizados agora
+        Usa o cache local do worker e, só para o que faltar, um pipeline por
+        lote com o cadastro e a janela de validade (um round trip)
+        Retorna dict qrcode -> autorizado
+        """
+        windows = cls.check_cache.get_many(qrcodes)
+        missing = [qrcode for qrcode in dict.fromkeys(qrcodes) if qrcode not in windows]
+
+        if missing:
+            generation = cls.check_cache.generation()
+            redis_client = cls._get_redis_client()
+            fetched = {}
+            for start in range(0, len(missing), cls.CHECK_CHUNK_SIZE):
+                chunk = missing[start:start + cls.CHECK_CHUNK_SIZE]
+                pipe = redis_client.pipeline(transaction=False)
+                cls.queue_window_lookup(pipe, chunk)
+                fetched.update(cls.parse_windows(chunk, pipe.execute()))
+
+            cls.check_cache.set_many(fetched, generation)
+            windows.update(fetched)
+
+        # A janela fica em cache, então a validade é avaliada a cada consulta
+        now = time.time()
+        return {qrcode: cls.is_valid_now(window, now) for qrcode, window in windows.items()}
+    
+    @staticmethod
+    def lex_range(prefix: str = None, start: str = None, end: str = None,
+                  after: str = None) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Converte prefixo, faixa [start, end] e `after` (paginação) nos limites
+        do ZRANGEBYLEX; os filtros são combinados pela faixa mais estreita
+        Retorna None se a faixa for vazia
+        """
+        lower = [(b'', True)]  # (valor, inclusivo)
+        upper = []  # sempre inclusivos
+        if prefix:
+            lower.append((prefix.encode(), True))
+            # 0xff nunca aparece em UTF-8: fica depois de qualquer código com o prefixo
+            upper.append(prefix.encode() + b'\xff')
+        if start:
+            lower.append((start.encode(), True))
+        if end:
+            upper.append(end.encode())
+        if after:
+            lower.append((after.encode(), False))
+
+        # Maior limite inferior (exclusivo vence no empate) e menor superior
+        low, low_inclusive = max(lower, key=lambda bound: (bound[0], not bound[1]))
+        minimum = (b'[' if low_inclusive else b'(') + low if low else b'-'
+        if not upper:
+            return minimum, b'+'
+
+        high = min(upper)
+        if low > high or (low == high and not low_inclusive):
+            return None
+        return minimum, b'[' + high
+
+    @classmethod
+    def search_qrcodes(cls, prefix: str = None, start: str = None, end: str = None,
+                       after: str = None, limit: int = 1000) -> Dict:
+        """
+        Busca por prefixo e/ou faixa no índice lexicográfico (ZRANGEBYLEX, O(log n + k))
+        Retorna os QR codes em ordem, o total da busca e `next_after` para a
+        próxima página (None no fim)
+        """
+        bounds = cls.lex_range(prefix, start, end, after)
+        if bounds is None:
+            return {'qrcodes': [], 'total': 0, 'next_after': None}
+        full = cls.lex_range(prefix, start, end)
+
+        redis_client = cls._get_read_client()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrangebylex(cls.INDEX_KEY, *bounds, start=0, num=limit + 1)
+        pipe.zlexcount(cls.INDEX_KEY, *full)
+        members, total = pipe.execute()
+
+        qrcodes = [member.decode() for member in members[:limit]]
+        return {
+            'qrcodes': qrcodes,
+            'total': total,
+            'next_after': qrcodes[-1] if len(members) > limit else None,
+        }
+
+    @classmethod
+    def rebuild_index(cls, batch_size: int = None) -> int:
+        """
+        Reconstrói o índice lexicográfico a partir do SET (registros antigos)
+        Percorre o SET com SSCAN; cada lote é indexado por um script atômico
+        Retorna quantos QR codes foram adicionados ao índice
+        """
+        indexed = 0
+        for batch in cls.iter_qrcode_batches(batch_size):
+            indexed += cls._get_script('REINDEX')(
+                keys=[cls.REGISTRY_KEY, cls.INDEX_KEY],
+                args=batch
+            )
+        return indexed
+
     @classmethod
     def get_count(cls) -> int:
         """
-        Retorna o total de QR codes diretamente do Redis
+        Retorna o total de QR codes diretamente do Redis (SCARD, O(1))
         """
         try:
-            redis_client = cls._get_redis_client()
-            pattern = f"{cls.CACHE_KEY}:*"
-            keys = redis_client.keys(pattern)
-            return len(keys)
+            redis_client = cls._get_read_client()
+            return redis_client.scard(cls.REGISTRY_KEY)
         except Exception as e:
             print(f"Erro ao contar QR codes: {e}")
             return 0
@@ -103,14 +431,417 @@ class QRCodeService:
     def clear_all(cls) -> bool:
         """
         Remove todos os QR codes diretamente do Redis
+        UNLINK libera a memória do SET em background, sem bloquear o Redis
+        O log de mudanças recomeça com uma entrada 'clear'
         """
         try:
-            redis_client = cls._get_redis_client()
-            pattern = f"{cls.CACHE_KEY}:*"
-            keys = redis_client.keys(pattern)
-            if keys:
-                redis_client.delete(*keys)
+            connections.mark_write()
+            cls._get_script('CLEAR')(
+                keys=[cls.REGISTRY_KEY, cls.VERSION_KEY, cls.CHANGES_KEY, *cls.WINDOW_KEYS],
+                args=[cls.INVALIDATION_CHANNEL]
+            )
             return True
         except Exception as e:
             print(f"Erro ao limpar QR codes: {e}")
-            return False 
\ No newline at end of file
+            return False
+    
+    @classmethod
+    def start_purge(cls) -> Optional[Dict]:
+        """
+        Esvazia o registro sem bloquear o Redis
+        O SET sai do ar na hora (as consultas já negam os QR codes) e os
+        membros são apagados em background, em lotes de SPOP com pausa
+        Retorna o status do job, ou None se já existe um expurgo em andamento
+        """
+        redis_client = cls._get_redis_client()
+        connections.mark_write()
+        lock = redis_client.lock(cls.PURGE_LOCK_KEY, timeout=cls.PURGE_LOCK_TTL,
+                                 blocking=False, thread_local=False)
+        if not lock.acquire():
+            return None
+
+        try:
+            job_id = uuid.uuid4().hex
+            purge_key = f"{cls.PURGE_STATUS_KEY}:{job_id}"
+            batch_size = getattr(settings, 'QRCODE_PURGE_BATCH_SIZE', 1000)
+            pause = getattr(settings, 'QRCODE_PURGE_PAUSE', 0.01)
+
+            # Um job anterior interrompido (worker morto) deixa o SET para trás
+            previous = redis_client.hget(cls.PURGE_STATUS_KEY, 'key')
+            keys = []
+            if previous and redis_client.exists(previous, *cls._purge_window_keys(previous.decode())):
+                keys.append(previous.decode())
+
+            pairs = zip(cls.WINDOW_KEYS, cls._purge_window_keys(purge_key))
+            version, total = cls._get_script('PURGE')(
+                keys=[cls.REGISTRY_KEY, cls.VERSION_KEY, cls.CHANGES_KEY, purge_key,
+                      *[key for pair in pairs for key in pair]],
+                args=[cls.INVALIDATION_CHANNEL]
+            )
+            keys.append(purge_key)
+            if len(keys) > 1:
+                total += redis_client.scard(keys[0])
+
+            status = {
+                'job_id': job_id,
+                'key': purge_key,
+                'status': 'running',
+                'total': total,
+                'removed': 0,
+                'batch_size': batch_size,
+                'pause': pause,
+                'version': version,
+                'started': int(time.time()),
+                'finished': '',
+                'error': '',
+            }
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.delete(cls.PURGE_STATUS_KEY)
+            pipe.hset(cls.PURGE_STATUS_KEY, mapping=status)
+            pipe.execute()
+
+            threading.Thread(
+                target=cls._run_purge, args=(lock, keys, batch_size, pause),
+                name='qrcode-purge', daemon=True
+            ).start()
+        except Exception:
+            lock.release()
+            raise
+
+        return cls.get_purge_status()
+
+    @classmethod
+    def _purge_window_keys(cls, purge_key: str) -> List[str]:
+        """ZSETs (índice e validade) renomeados junto com o SET do expurgo"""
+        return [f"{purge_key}:{key[len(cls.REGISTRY_KEY) + 1:]}" for key in cls.WINDOW_KEYS]
+
+    @classmethod
+    def _run_purge(cls, lock, keys: List[str], batch_size: int, pause: float):
+        """Apaga os SETs do expurgo (e seus ZSETs) em lotes limitados, registrando o progresso"""
+        redis_client = cls._get_redis_client()
+        try:
+            for key in keys:
+                while True:
+                    popped = redis_client.spop(key, batch_size)
+                    if not popped:
+                        break
+                    redis_client.hincrby(cls.PURGE_STATUS_KEY, 'removed', len(popped))
+                    lock.reacquire()
+                    time.sleep(pause)
+                for zset in cls._purge_window_keys(key):
+                    while redis_client.zremrangebyrank(zset, 0, batch_size - 1):
+                        lock.reacquire()
+                        time.sleep(pause)
+            redis_client.hset(cls.PURGE_STATUS_KEY, mapping={
+                'status': 'finished', 'finished': int(time.time())
+            })
+        except Exception as e:
+            print(f"Erro no expurgo de QR codes: {e}")
+            redis_client.hset(cls.PURGE_STATUS_KEY, mapping={
+                'status': 'failed', 'finished': int(time.time()), 'error': str(e)
+            })
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass
+
+    @classmethod
+    def get_purge_status(cls) -> Optional[Dict]:
+        """
+        Retorna o progresso do último expurgo, ou None se nunca houve um
+        Um job 'running' sem o lock foi interrompido (o próximo expurgo termina o serviço)
+        """
+        redis_client = cls._get_redis_client()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(cls.PURGE_STATUS_KEY)
+        pipe.exists(cls.PURGE_LOCK_KEY)
+        raw, locked = pipe.execute()
+        if not raw:
+            return None
+
+        status = {k.decode(): v.decode() for k, v in raw.items()}
+        if status['status'] == 'running' and not locked:
+            status['status'] = 'interrupted'
+        return {
+            'job_id': status['job_id'],
+            'status': status['status'],
+            'total': int(status['total']),
+            'removed': int(status['removed']),
+            'batch_size': int(status['batch_size']),
+            'pause': float(status['pause']),
+            'version': int(status['version']),
+            'started': int(status['started']),
+            'finished': int(status['finished']) if status['finished'] else None,
+            'error': status['error'] or None,
+        }
+
+    @classmethod
+    def sweep_expired(cls, batch_size: int = None) -> int:
+        """
+        Remove os QR codes com validade vencida, em lotes pequenos
+        Percorre o ZSET do fim da validade a partir do mais antigo, então o
+        custo depende só do que venceu, não do tamanho do registro
+        Retorna quantos QR codes vencidos foram removidos
+        """
+        batch_size = batch_size or cls.SWEEP_BATCH_SIZE
+        script = cls._get_script('SWEEP')
+        removed = 0
+
+        while True:
+            swept = script(
+                keys=[cls.REGISTRY_KEY, cls.VERSION_KEY, cls.CHANGES_KEY, *cls.WINDOW_KEYS],
+                args=[int(time.time()), batch_size, cls.CHANGES_MAXLEN, cls.INVALIDATION_CHANNEL]
+            )
+            removed += swept
+            if swept < batch_size:
+                return removed
+
+    @classmethod
+    def migrate_legacy_keys(cls, batch_size: int = 1000, delete_legacy: bool = True) -> int:
+        """
+        Move as chaves antigas `qrcodes:<code>` para o SET do registro
+        Percorre o keyspace com SCAN em lotes; retorna quantos QR codes migrou
+        """
+        redis_client = cls._get_redis_client()
+        keys = []
+        migrated = 0
+
+        for key in redis_client.scan_iter(match=f"{cls.CACHE_KEY}:*", count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                migrated += cls._migrate_batch(redis_client, keys, delete_legacy)
+                keys = []
+
+        if keys:
+            migrated += cls._migrate_batch(redis_client, keys, delete_legacy)
+
+        # A migração não passa pelo log de mudanças: força resync dos espelhos
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(cls.VERSION_KEY)
+        pipe.unlink(cls.CHANGES_KEY)
+        pipe.publish(cls.INVALIDATION_CHANNEL, '*')
+        pipe.execute()
+        return migrated
+
+    @classmethod
+    def _migrate_batch(cls, redis_client, keys: List[bytes], delete_legacy: bool) -> int:
+        """Copia um lote de chaves antigas para o SET em uma única transação"""
+        qrcodes = [v for v in redis_client.mget(keys) if v is not None]
+
+        pipe = redis_client.pipeline(transaction=True)
+        if qrcodes:
+            pipe.sadd(cls.REGISTRY_KEY, *qrcodes)
+            pipe.zadd(cls.INDEX_KEY, dict.fromkeys(qrcodes, 0))
+        if delete_legacy:
+            pipe.unlink(*keys)
+        pipe.execute()
+        return len(qrcodes) 
+    
+    @classmethod
+    def get_version(cls) -> int:
+        """
+        Retorna a versão atual do registro (0 se nunca houve mudança)
+        """
+        version = cls._get_read_client().get(cls.VERSION_KEY)
+        return int(version) if version else 0
+    
+    @classmethod
+    def get_changes(cls, since: int, limit: int = 1000) -> Optional[Dict]:
+        """
+        Retorna as mudanças com versão maior que `since`, em ordem
+        Retorna None quando o stream já foi aparado além de `since`
+        (o cliente precisa refazer a sincronização completa)
+        """
+        redis_client = cls._get_read_client()
+
+        # Versão atual, entrada mais antiga e a página pedida em um único round trip
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.get(cls.VERSION_KEY)
+        pipe.xrange(cls.CHANGES_KEY, count=1)
+        pipe.xrange(cls.CHANGES_KEY, min=f"{since + 1}-0", count=limit)
+        version, oldest, entries = pipe.execute()
+        version = int(version) if version else 0
+
+        if since > version:
+            return None
+        if since < version:
+            oldest_version = int(oldest[0][0].split(b'-')[0]) if oldest else None
+            if oldest_version is None or oldest_version > since + 1:
+                return None
+
+        changes = []
+        for entry_id, fields in entries:
+            changes.append({
+                'version': int(entry_id.split(b'-')[0]),
+                'op': fields[b'op'].decode(),
+                'qrcode': fields[b'qrcode'].decode(),
+            })
+
+        last = changes[-1]['version'] if changes else since
+        return {
+            'version': version,
+            'changes': changes,
+            'has_more': last < version,
+        }
+
+
+class AccessEventService:
+    """Consulta do histórico de acessos gravado pelas catracas (ver access_events)"""
+
+    SCAN_BATCH_SIZE = 1000  # eventos lidos por XRANGE ao filtrar por QR code
+    SCAN_MAX = 50000  # eventos percorridos por requisição; depois disso devolve o cursor
+
+    @classmethod
+    def _get_redis_client(cls):
+        """Obtém cliente Redis do primário"""
+        return connections.get_client(connections.PRIMARY)
+
+    @staticmethod
+    def _stream_id(value: datetime) -> str:
+        """Datetime -> id do stream (milissegundos)"""
+        return str(int(value.timestamp() * 1000))
+
+    @staticmethod
+    def parse_event(entry_id: bytes, fields: Dict) -> Dict:
+        entry_id = entry_id.decode()
+        # Momento da decisão; eventos antigos só têm o da gravação (id do stream)
+        if b'ts' in fields:
+            timestamp = float(fields[b'ts'])
+        else:
+            timestamp = int(entry_id.split('-')[0]) / 1000
+        return {
+            'id': entry_id,
+            'timestamp': datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat(),
+            'qrcode': fields[b'qrcode'].decode(),
+            'result': fields[b'result'].decode(),
+            'direction': fields[b'direction'].decode(),
+            'gate': fields[b'gate'].decode(),
+        }
+
+    @classmethod
+    def get_events(cls, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   qrcode: Optional[str] = None, cursor: Optional[str] = None,
+                   limit: int = 100) -> Dict:
+        """
+        Retorna os eventos do intervalo em ordem cronológica (XRANGE por tempo)
+        Com `qrcode` o stream é filtrado em lotes, no máximo SCAN_MAX por chamada
+        `next_cursor` continua a consulta (None quando não há mais eventos)
+        """
+        redis_client = cls._get_redis_client()
+        minimum = f"({cursor}" if cursor else (cls._stream_id(start) if start else '-')
+        maximum = cls._stream_id(end) if end else '+'
+        count = cls.SCAN_BATCH_SIZE if qrcode else limit
+
+        events = []
+        scanned = 0
+        last_id = None
+        while True:
+            batch = redis_client.xrange(access_events.EVENTS_KEY, minimum, maximum, count=count)
+            for entry_id, fields in batch:
+                scanned += 1
+                last_id = entry_id.decode()
+                if qrcode is None or fields[b'qrcode'].decode() == qrcode:
+                    events.append(cls.parse_event(entry_id, fields))
+                    if len(events) >= limit:
+                        break
+
+            if len(events) >= limit or scanned >= cls.SCAN_MAX:
+                return {'events': events, 'next_cursor': last_id}
+            if len(batch) < count:
+                return {'events': events, 'next_cursor': None}
+            minimum = f"({last_id}"
+
+    @classmethod
+    def get_rollups(cls, granularity: str, start: datetime, end: datetime,
+                    gate: Optional[str] = None) -> List[Dict]:
+        """
+        Retorna os contadores de autorizados/negados por intervalo (minuto ou hora)
+        Um HMGET por intervalo, todos no mesmo pipeline
+        """
+        size = access_events.ROLLUPS[granularity][0]
+        starts = range(
+            access_events.rollup_start(granularity, start.timestamp()),
+            access_events.rollup_start(granularity, end.timestamp()) + 1,
+            size
+        )
+        fields = [f"{gate}:{result}" if gate else result for result in access_events.RESULTS]
+
+        pipe = cls._get_redis_client().pipeline(transaction=False)
+        for bucket in starts:
+            pipe.hmget(access_events.rollup_key(granularity, bucket), fields)
+
+        rollups = []
+        for bucket, counts in zip(starts, pipe.execute()):
+            rollup = {'start': datetime.fromtimestamp(bucket, tz=timezone.utc).isoformat()}
+            for result, count in zip(access_events.RESULTS, counts):
+                rollup[result] = int(count) if count else 0
+            rollups.append(rollup)
+        return rollups
+
+
+class APIKeyService:
+    """
+    Chaves de API por dispositivo (catracas, integrações) guardadas no Redis
+    O segredo nunca é salvo: só o SHA-256, comparado em tempo constante
+    """
+
+    KEYS_HASH = "qrcodeapp:api_keys"  # HASH key_id -> JSON com nome e digest
+
+    @classmethod
+    def _get_redis_client(cls):
+        """Obtém cliente Redis do primário"""
+        return connections.get_client(connections.PRIMARY)
+
+    @staticmethod
+    def _digest(secret: str) -> str:
+        return hashlib.sha256(secret.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, name: str) -> str:
+        """
+        Cria uma chave para o dispositivo `name`
+        Retorna a chave completa `<key_id>.<segredo>` (exibida uma única vez)
+        """
+        key_id = secrets.token_hex(8)
+        secret = secrets.token_urlsafe(32)
+        record = {'name': name, 'digest': cls._digest(secret), 'created': int(time.time())}
+        cls._get_redis_client().hset(cls.KEYS_HASH, key_id, json.dumps(record))
+        return f"{key_id}.{secret}"
+
+    @classmethod
+    def revoke(cls, key_id: str) -> bool:
+        """
+        Revoga uma chave; retorna False se ela não existia
+        """
+        return cls._get_redis_client().hdel(cls.KEYS_HASH, key_id) == 1
+
+    @classmethod
+    def list_keys(cls) -> List[Dict]:
+        """
+        Retorna as chaves cadastradas (sem os digests)
+        """
+        keys = []
+        for key_id, raw in cls._get_redis_client().hgetall(cls.KEYS_HASH).items():
+            record = json.loads(raw)
+            keys.append({'key_id': key_id.decode(), 'name': record['name'], 'created': record['created']})
+        return sorted(keys, key=lambda k: k['created'])
+
+    @classmethod
+    def verify(cls, api_key: str) -> Optional[Dict]:
+        """
+        Valida `<key_id>.<segredo>` com um único HGET, sem tocar no banco
+        Retorna {'key_id', 'name'} se válida, None caso contrário
+        """
+        key_id, _, secret = api_key.partition('.')
+        if not key_id or not secret:
+            return None
+
+        raw = cls._get_redis_client().hget(cls.KEYS_HASH, key_id)
+        if raw is None:
+            return None
+
+        record = json.loads(raw)
+        if not hmac.compare_digest(record['digest'], cls._digest(secret)):
+            return None
+        return {'key_id': key_id, 'name': record['name']}
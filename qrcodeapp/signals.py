@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import CachedJWTAuthentication
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Usuário desativado, com senha trocada ou removido não pode seguir em cache"""
+    CachedJWTAuthentication.invalidate_user(getattr(instance, api_settings.USER_ID_FIELD))
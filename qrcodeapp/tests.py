@@ -1,3 +1,989 @@
-from django.test import TestCase
+"""
+Testes da API de QR codes
 
-# Create your tests here.
+Usam o Redis configurado em CACHES, mas no DB 15, apagado antes de cada
+teste (o registro de produção fica no DB 1)
+"""
+import contextvars
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import connections
+from .authentication import CachedJWTAuthentication
+from .async_views import (
+    AsyncQRCodeCheckBatchView, AsyncQRCodeCheckView, AsyncQRCodeDeleteView, AsyncQRCodeExportView, _sse_message
+)
+from .access_events import AccessEventRecorder
+from .services import AccessEventService, APIKeyService, QRCodeService
+from .throttling import RedisTokenBucketThrottle
+from .views import accepts_gzip
+
+TEST_REDIS_DB = 15
+
+
+def _test_caches():
+    default = dict(settings.CACHES['default'])
+    default['LOCATION'] = default['LOCATION'].rsplit('/', 1)[0] + f'/{TEST_REDIS_DB}'
+    return {**settings.CACHES, 'default': default}
+
+
+# Rotas das views assíncronas, usadas com ROOT_URLCONF='qrcodeapp.tests'
+# (as de qrcodeapp.urls dependem de QRCODE_ASYNC_VIEWS no carregamento)
+urlpatterns = [
+    path('export/', AsyncQRCodeExportView.as_view()),
+    path('check/', AsyncQRCodeCheckBatchView.as_view()),
+    path('check/<path:qrcode>/', AsyncQRCodeCheckView.as_view()),
+    path('delete/', AsyncQRCodeDeleteView.as_view()),
+]
+
+redis_test_settings = override_settings(
+    CACHES=_test_caches(),
+    QRCODE_REDIS_WRITE_URL=None,
+    QRCODE_REDIS_READ_URL=None,
+    QRCODE_REDIS_SENTINELS=[],
+)
+
+
+class RedisTestMixin:
+    def setUp(self):
+        super().setUp()
+        get_redis_connection('default').flushdb()
+        self.user = User.objects.create_user('teste')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@redis_test_settings
+@override_settings(ROOT_URLCONF='qrcodeapp.tests')
+class AsyncExportTests(RedisTestMixin, TestCase):
+    # TestCase (não TransactionTestCase): a autenticação roda na thread síncrona
+    # compartilhada, com a mesma conexão do banco (e a transação) do teste
+
+    async def test_export_streams_each_batch(self):
+        qrcodes = [f'QR{i:04d}' for i in range(600)]
+        await sync_to_async(QRCodeService.add_qrcodes)(qrcodes)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+        with mock.patch.object(QRCodeService, 'SCAN_BATCH_SIZE', 100):
+            response = await AsyncClient().get('/export/?format=ndjson', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            # Gerador assíncrono: o Django não junta a resposta em uma lista
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).splitlines()
+        self.assertEqual(sorted(lines), sorted(f'{{"qrcode":"{qrcode}"}}'.encode() for qrcode in qrcodes))
+
+    async def test_export_csv_header_first(self):
+        await sync_to_async(QRCodeService.add_qrcodes)(['A', 'B'])
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+        response = await AsyncClient().get('/export/?format=csv', headers=headers)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(body.splitlines()[0], 'qrcode')
+        self.assertEqual(sorted(body.splitlines()[1:]), ['A', 'B'])
+
+    async def test_export_invalid_format(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await AsyncClient().get('/export/?format=xml', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+
+@redis_test_settings
+class CheckRoutesTests(RedisTestMixin, TestCase):
+    """GET check/<qrcode>/ consulta um QR code; POST check/ consulta um lote"""
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcode('A')
+
+    def test_single_check(self):
+        response = self.client.get('/api/qrcode/check/A/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'qrcode': 'A', 'authorized': True})
+
+    def test_batch_check(self):
+        response = self.client.post('/api/qrcode/check/', {'qrcodes': ['A', 'B']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'qrcode': 'A', 'authorized': True},
+            {'qrcode': 'B', 'authorized': False},
+        ])
+
+    def test_get_without_qrcode_is_405(self):
+        self.assertEqual(self.client.get('/api/qrcode/check/').status_code, 405)
+
+    def test_post_with_qrcode_is_405(self):
+        response = self.client.post('/api/qrcode/check/A/', {'qrcodes': ['A']}, format='json')
+        self.assertEqual(response.status_code, 405)
+
+    def test_other_methods_are_405(self):
+        self.assertEqual(self.client.put('/api/qrcode/check/', {}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete('/api/qrcode/check/A/').status_code, 405)
+
+
+@redis_test_settings
+@override_settings(ROOT_URLCONF='qrcodeapp.tests')
+class AsyncCheckRoutesTests(RedisTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcode('A')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_single_check(self):
+        response = await AsyncClient().get('/check/A/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'qrcode': 'A', 'authorized': True})
+
+    async def test_batch_check(self):
+        response = await AsyncClient().post('/check/', {'qrcodes': ['A', 'B']},
+                                            content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['authorized'] for item in response.json()['results']], [True, False])
+
+    async def test_get_without_qrcode_is_405(self):
+        response = await AsyncClient().get('/check/', headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'POST, OPTIONS')
+        self.assertIn('detail', response.json())
+
+    async def test_post_with_qrcode_is_405(self):
+        response = await AsyncClient().post('/check/A/', {'qrcodes': ['A']},
+                                            content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS')
+
+    async def test_other_methods_are_405(self):
+        response = await AsyncClient().put('/check/', {}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+        response = await AsyncClient().delete('/check/A/', headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+
+
+@redis_test_settings
+class ListETagTests(RedisTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcodes(['A', 'B'])
+
+    def test_etag_per_encoding(self):
+        identity = self.client.get('/api/qrcode/list/')
+        gzipped = self.client.get('/api/qrcode/list/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertNotEqual(identity['ETag'], gzipped['ETag'])
+        self.assertTrue(gzipped['ETag'].endswith('-gzip"'))
+        for response in (identity, gzipped):
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_modified_only_for_same_encoding(self):
+        etag = self.client.get('/api/qrcode/list/', HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        response = self.client.get('/api/qrcode/list/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get('/api/qrcode/list/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip_refused_with_q_zero(self):
+        response = self.client.get('/api/qrcode/list/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response['ETag'].endswith('-gzip"'))
+        self.assertEqual(sorted(response.json()['qrcodes']), ['A', 'B'])
+
+
+class AcceptsGzipTests(SimpleTestCase):
+
+    def _accepts(self, header):
+        return accepts_gzip(mock.Mock(headers={'Accept-Encoding': header}))
+
+    def test_q_values(self):
+        cases = {
+            'gzip': True,
+            'deflate, gzip;q=0.5': True,
+            'GZIP; Q=1.0': True,
+            'x-gzip': True,
+            'gzip;q=0': False,
+            'gzip; q=0.000, br': False,
+            'gzip;q=abc': False,
+            'br, identity': False,
+            '*': True,
+            '*;q=0': False,
+            'gzip;q=0, *': False,
+            'br, *;q=0.1': True,
+            'notgzip': False,
+            '': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertIs(self._accepts(header), expected)
+
+
+@redis_test_settings
+class ImportReplaceTests(RedisTestMixin, TestCase):
+    """mode=replace sem nenhum QR code válido não pode apagar o registro"""
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcodes(['A', 'B', 'C', 'D', 'E'])
+
+    def _import(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post('/api/qrcode/import/', {'file': upload, 'mode': 'replace', **data},
+                                format='multipart')
+
+    def test_replace(self):
+        response = self._import('novos.csv', b'qrcode\nX\nY\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 2)
+        self.assertEqual(sorted(QRCodeService.get_all_qrcodes()), ['X', 'Y'])
+
+    def test_header_only_keeps_registry(self):
+        response = self._import('vazio.csv', b'qrcode\n\n\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(QRCodeService.get_count(), 5)
+
+    def test_all_invalid_keeps_registry(self):
+        version = QRCodeService.get_version()
+        response = self._import('ruim.ndjson', b'{"qrcode": ""}\nnao e json\n{"outro": 1}\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['invalid'], 3)
+        self.assertEqual(QRCodeService.get_count(), 5)
+        self.assertEqual(QRCodeService.get_version(), version)
+        # Nenhum SET temporário ficou para trás
+        self.assertEqual(list(get_redis_connection('default').scan_iter('qrcodes_registry:import:*')), [])
+
+    def test_wrong_format_keeps_registry(self):
+        response = self._import('codigos.csv', b'A\nB\n', format='ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(QRCodeService.get_count(), 5)
+
+    def test_replace_script_without_staging_is_noop(self):
+        keys = [QRCodeService.REGISTRY_KEY, QRCodeService.VERSION_KEY, QRCodeService.CHANGES_KEY,
+                'qrcodes_registry:import:inexistente', QRCodeService.INDEX_KEY,
+                'qrcodes_registry:import:inexistente:index', QRCodeService.VALID_FROM_KEY,
+                QRCodeService.VALID_UNTIL_KEY]
+        result = QRCodeService._get_script('REPLACE')(keys=keys, args=[QRCodeService.INVALIDATION_CHANNEL])
+        self.assertIsNone(result)
+        self.assertEqual(QRCodeService.get_count(), 5)
+        self.assertEqual(QRCodeService.search_qrcodes(prefix='')['total'], 5)
+
+
+@redis_test_settings
+class APIKeyTests(RedisTestMixin, TestCase):
+    """Chaves de API de dispositivo: emissão, validação, revogação e escopo"""
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcodes(['A', 'B'])
+        self.api_key = APIKeyService.issue('catraca-portaria')
+        self.key_id = self.api_key.split('.')[0]
+        self.device = APIClient()
+        self.device.credentials(HTTP_AUTHORIZATION=f'Api-Key {self.api_key}')
+
+    def test_issue_and_verify(self):
+        self.assertEqual(APIKeyService.verify(self.api_key), {'key_id': self.key_id, 'name': 'catraca-portaria'})
+        self.assertIsNone(APIKeyService.verify(self.key_id + '.outro-segredo'))
+        self.assertIsNone(APIKeyService.verify('inexistente.' + self.api_key.split('.', 1)[1]))
+        self.assertIsNone(APIKeyService.verify(self.key_id))
+
+    def test_list_keys_hides_digest(self):
+        keys = APIKeyService.list_keys()
+        self.assertEqual([(k['key_id'], k['name']) for k in keys], [(self.key_id, 'catraca-portaria')])
+        self.assertNotIn('digest', keys[0])
+
+    def test_revoke(self):
+        self.assertTrue(APIKeyService.revoke(self.key_id))
+        self.assertFalse(APIKeyService.revoke(self.key_id))
+        self.assertIsNone(APIKeyService.verify(self.api_key))
+        self.assertEqual(self.device.get('/api/qrcode/check/A/').status_code, 401)
+
+    def test_header_authenticates_check(self):
+        response = self.device.get('/api/qrcode/check/A/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['authorized'])
+
+    def test_invalid_headers(self):
+        for header in (f'Api-Key {self.key_id}.errado', 'Api-Key', f'Api-Key {self.api_key} extra'):
+            with self.subTest(header=header):
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION=header)
+                self.assertEqual(client.get('/api/qrcode/check/A/').status_code, 401)
+
+    def test_destructive_endpoints_denied(self):
+        self.assertEqual(self.device.delete('/api/qrcode/delete/', {'qrcode': 'A'}, format='json').status_code, 403)
+        self.assertEqual(
+            self.device.delete('/api/qrcode/delete/bulk/', {'qrcodes': ['A', 'B']}, format='json').status_code, 403
+        )
+        self.assertEqual(self.device.post('/api/qrcode/purge/').status_code, 403)
+        self.assertEqual(self.device.get('/api/qrcode/purge/').status_code, 403)
+        upload = SimpleUploadedFile('novos.csv', b'qrcode\nX\n')
+        response = self.device.post('/api/qrcode/import/', {'file': upload, 'mode': 'replace'}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(sorted(QRCodeService.get_all_qrcodes()), ['A', 'B'])
+
+    def test_append_import_allowed(self):
+        upload = SimpleUploadedFile('novos.csv', b'qrcode\nX\n')
+        response = self.device.post('/api/qrcode/import/', {'file': upload, 'mode': 'append'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(QRCodeService.get_all_qrcodes()), ['A', 'B', 'X'])
+
+
+@redis_test_settings
+@override_settings(ROOT_URLCONF='qrcodeapp.tests')
+class AsyncDeletePermissionTests(RedisTestMixin, TestCase):
+    """A view assíncrona de remoção aplica o mesmo escopo das chaves de API"""
+
+    async def test_device_denied(self):
+        await sync_to_async(QRCodeService.add_qrcodes)(['A'])
+        api_key = await sync_to_async(APIKeyService.issue)('catraca')
+        headers = {'Authorization': f'Api-Key {api_key}'}
+        response = await AsyncClient().delete('/delete/', {'qrcode': 'A'},
+                                              content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(await sync_to_async(QRCodeService.get_all_qrcodes)(), ['A'])
+
+    async def test_user_allowed(self):
+        await sync_to_async(QRCodeService.add_qrcodes)(['A'])
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await AsyncClient().delete('/delete/', {'qrcode': 'A'},
+                                              content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await sync_to_async(QRCodeService.get_all_qrcodes)(), [])
+
+
+@redis_test_settings
+class CachedJWTAuthenticationTests(RedisTestMixin, TestCase):
+    """Usuário desativado ou com senha trocada deixa de autenticar na hora"""
+
+    def setUp(self):
+        super().setUp()
+        CachedJWTAuthentication.local_cache.invalidate('*')
+        self.user.set_password('senha-antiga')
+        self.user.save()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def _status(self):
+        return self.client.get('/api/qrcode/check/A/').status_code
+
+    def _wait_local_invalidation(self):
+        key = str(self.user.pk)
+        deadline = time.monotonic() + 2
+        while CachedJWTAuthentication.local_cache.get_many([key]) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_deactivate_then_401(self):
+        self.assertEqual(self._status(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._status(), 401)
+
+    def test_delete_then_401(self):
+        self.assertEqual(self._status(), 200)
+        self.user.delete()
+        self.assertEqual(self._status(), 401)
+
+    def test_invalidation_from_another_worker(self):
+        self.assertEqual(self._status(), 200)
+        self.assertTrue(CachedJWTAuthentication.local_cache._listening.wait(2))
+        self.assertEqual(self._status(), 200)
+        # Outro worker desativou o usuário: aqui só chega a mensagem do pub/sub
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.delete(CachedJWTAuthentication._cache_key(self.user.pk))
+        self.assertEqual(self._status(), 200)  # ainda no cache local deste worker
+        get_redis_connection('default').publish(CachedJWTAuthentication.INVALIDATION_CHANNEL, str(self.user.pk))
+        self._wait_local_invalidation()
+        self.assertEqual(self._status(), 401)
+
+    def test_invalidate_publishes(self):
+        pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CachedJWTAuthentication.INVALIDATION_CHANNEL)
+        pubsub.get_message(timeout=1)  # confirmação da assinatura
+        CachedJWTAuthentication.invalidate_user(self.user.pk)
+        message = pubsub.get_message(timeout=1)
+        pubsub.close()
+        self.assertEqual(message['data'], str(self.user.pk).encode())
+
+    # Os módulos do simplejwt guardam a referência ao api_settings original
+    @mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True, create=True)
+    def test_password_change_revokes_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self._status(), 200)
+        self.user.set_password('senha-nova')
+        self.user.save()
+        self.assertEqual(self._status(), 401)
+
+    def test_cache_has_no_password_hash(self):
+        self.assertEqual(self._status(), 200)
+        fields, _ = cache.get(CachedJWTAuthentication._cache_key(self.user.pk))
+        self.assertNotIn('password', fields)
+        self.assertNotIn(self.user.password, repr(fields))
+        self.assertEqual(fields['username'], 'teste')
+
+
+@redis_test_settings
+class AccessEventRecorderTests(RedisTestMixin, TestCase):
+    """Gravação atrasada (fila do estágio de registro) mantém o momento da decisão"""
+
+    def test_late_record_uses_decision_time(self):
+        redis_client = get_redis_connection('default')
+        decided = datetime(2026, 10, 18, 13, 59, 59, 500000, tzinfo=timezone.utc)
+        AccessEventRecorder('catraca-01').record(redis_client, 'A', True, 'E', decided.timestamp())
+
+        events = AccessEventService.get_events()['events']
+        self.assertEqual(events[0]['timestamp'], decided.isoformat())
+
+        # Contadores do minuto/hora da decisão, não do da gravação
+        rollups = AccessEventService.get_rollups('minute', decided, decided + timedelta(minutes=1))
+        self.assertEqual([rollup['allowed'] for rollup in rollups], [1, 0])
+        hours = AccessEventService.get_rollups('hour', decided, decided, gate='catraca-01')
+        self.assertEqual(hours, [{'start': '2026-10-18T13:00:00+00:00', 'allowed': 1, 'denied': 0}])
+
+    def test_record_without_timestamp(self):
+        before = time.time()
+        AccessEventRecorder('catraca-01').record(get_redis_connection('default'), 'A', False)
+        event = AccessEventService.get_events()['events'][0]
+        self.assertEqual(event['result'], 'denied')
+        self.assertGreaterEqual(datetime.fromisoformat(event['timestamp']).timestamp(), before - 0.001)
+
+
+@redis_test_settings
+class AccessEventsQueryTests(RedisTestMixin, TestCase):
+    """Parâmetro `from` das consultas do histórico"""
+
+    def setUp(self):
+        super().setUp()
+        self.recorder = AccessEventRecorder('catraca-01')
+        redis_client = get_redis_connection('default')
+        self.ids = [self.recorder.record(redis_client, 'A', True).decode()]
+        # IDs do stream em milissegundos diferentes, para o `from` separar os dois
+        time.sleep(0.002)
+        self.ids.append(self.recorder.record(redis_client, 'B', True).decode())
+
+    def test_events_from(self):
+        milliseconds = int(self.ids[1].split('-')[0])
+        start = datetime.fromtimestamp(milliseconds / 1000, tz=timezone.utc)
+        response = self.client.get('/api/qrcode/events/', {'from': start.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['qrcode'] for event in response.json()['events']], ['B'])
+
+    def test_events_from_after_to(self):
+        response = self.client.get('/api/qrcode/events/',
+                                   {'from': '2026-10-18T12:00:00Z', 'to': '2026-10-18T11:00:00Z'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/qrcode/events/', {'from': 'ontem'})
+        self.assertIn('from', response.json())
+
+    def test_rollup_from(self):
+        now = datetime.now(timezone.utc)
+        response = self.client.get('/api/qrcode/events/rollup/', {
+            'granularity': 'hour', 'from': (now - timedelta(hours=2)).isoformat(), 'to': now.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        rollups = response.json()['rollups']
+        self.assertEqual(len(rollups), 3)
+        self.assertEqual(rollups[-1]['allowed'], 2)
+
+
+@redis_test_settings
+class ChangesTests(RedisTestMixin, TestCase):
+    """Log de mudanças versionado e sincronização incremental"""
+
+    def _changes(self, since, limit=1000):
+        return self.client.get('/api/qrcode/changes/', {'since': since, 'limit': limit})
+
+    def test_changes_in_order(self):
+        QRCodeService.add_qrcodes(['A', 'B'])
+        QRCodeService.remove_qrcode('A')
+
+        response = self._changes(0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'version': 3,
+            'changes': [
+                {'version': 1, 'op': 'add', 'qrcode': 'A'},
+                {'version': 2, 'op': 'add', 'qrcode': 'B'},
+                {'version': 3, 'op': 'remove', 'qrcode': 'A'},
+            ],
+            'has_more': False,
+        })
+
+    def test_up_to_date(self):
+        QRCodeService.add_qrcode('A')
+        self.assertEqual(self._changes(1).json(), {'version': 1, 'changes': [], 'has_more': False})
+
+    def test_pages_with_has_more(self):
+        QRCodeService.add_qrcodes(['A', 'B', 'C'])
+
+        page = self._changes(0, limit=2).json()
+        self.assertEqual([change['qrcode'] for change in page['changes']], ['A', 'B'])
+        self.assertTrue(page['has_more'])
+
+        page = self._changes(page['changes'][-1]['version'], limit=2).json()
+        self.assertEqual([change['qrcode'] for change in page['changes']], ['C'])
+        self.assertFalse(page['has_more'])
+
+    def test_trimmed_log_requires_resync(self):
+        QRCodeService.add_qrcodes(['A', 'B', 'C'])
+        get_redis_connection('default').xtrim(QRCodeService.CHANGES_KEY, maxlen=1, approximate=False)
+
+        response = self._changes(0)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['version'], 3)
+        self.assertTrue(response.json()['resync_required'])
+        # A partir da entrada mais antiga que sobrou ainda dá para seguir
+        self.assertEqual(self._changes(2).json()['changes'], [{'version': 3, 'op': 'add', 'qrcode': 'C'}])
+
+    def test_since_ahead_of_version_requires_resync(self):
+        QRCodeService.add_qrcode('A')
+        self.assertEqual(self._changes(5).status_code, 410)
+
+    def test_clear_requires_resync(self):
+        QRCodeService.add_qrcodes(['A', 'B'])
+        QRCodeService.clear_all()
+
+        self.assertEqual(self._changes(0).status_code, 410)
+        self.assertEqual(self._changes(2).json()['changes'], [{'version': 3, 'op': 'clear', 'qrcode': ''}])
+
+
+@redis_test_settings
+class ApplyChangeScriptTests(RedisTestMixin, TestCase):
+    """Scripts APPLY_CHANGE e CLEAR: SET, versão, log, índices e pub/sub juntos"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis_connection('default')
+
+    def test_bulk_add_in_chunks(self):
+        with mock.patch.object(QRCodeService, 'BULK_CHUNK_SIZE', 2):
+            added = QRCodeService.add_qrcodes(['A', 'B', 'A', 'C', 'D'])
+        self.assertEqual(added, {'A': True, 'B': True, 'C': True, 'D': True})
+
+        again = QRCodeService.add_qrcodes(['A', 'E'])
+        self.assertEqual(again, {'A': False, 'E': True})
+        # Só o que mudou gera versão e entrada no log
+        self.assertEqual(QRCodeService.get_version(), 5)
+        self.assertEqual(self.redis.xlen(QRCodeService.CHANGES_KEY), 5)
+        self.assertEqual(self.redis.zcard(QRCodeService.INDEX_KEY), 5)
+
+    def test_script_returns_version_per_member(self):
+        QRCodeService.add_qrcode('A')
+        self.assertEqual(QRCodeService._apply_changes('add', ['A', 'B', 'C']), [0, 2, 3])
+        self.assertEqual(QRCodeService._apply_changes('remove', ['X', 'B']), [0, 4])
+
+    def test_remove_cleans_index_and_windows(self):
+        until = datetime.now(timezone.utc) + timedelta(days=1)
+        QRCodeService.add_qrcodes(['A', 'B'], valid_until=until)
+        removed = QRCodeService.remove_qrcodes(['A', 'X'])
+
+        self.assertEqual(removed, {'A': True, 'X': False})
+        self.assertEqual(QRCodeService.get_all_qrcodes(), ['B'])
+        for key in QRCodeService.WINDOW_KEYS:
+            self.assertIsNone(self.redis.zscore(key, 'A'))
+        self.assertEqual(self.redis.zscore(QRCodeService.VALID_UNTIL_KEY, 'B'), int(until.timestamp()))
+
+    def test_changes_are_published(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(QRCodeService.INVALIDATION_CHANNEL)
+        pubsub.get_message(timeout=1)
+        QRCodeService.add_qrcodes(['A', 'B'])
+        QRCodeService.add_qrcode('A')  # sem mudança: nada publicado
+        QRCodeService.clear_all()
+
+        messages = []
+        while (message := pubsub.get_message(timeout=0.2)) is not None:
+            messages.append(message['data'])
+        pubsub.close()
+        self.assertEqual(messages, [b'A', b'B', b'*'])
+
+    def test_clear(self):
+        QRCodeService.add_qrcodes(['A', 'B'], valid_from=datetime.now(timezone.utc))
+        self.assertTrue(QRCodeService.clear_all())
+
+        self.assertEqual(QRCodeService.get_count(), 0)
+        self.assertEqual(QRCodeService.get_version(), 3)
+        for key in QRCodeService.WINDOW_KEYS:
+            self.assertFalse(self.redis.exists(key))
+        # O log recomeça com a entrada 'clear'
+        self.assertEqual(self.redis.xlen(QRCodeService.CHANGES_KEY), 1)
+
+
+@redis_test_settings
+@override_settings(QRCODE_PURGE_BATCH_SIZE=2, QRCODE_PURGE_PAUSE=0)
+class PurgeTests(RedisTestMixin, TestCase):
+    """Expurgo em background: registro sai do ar na hora, membros apagados em lotes"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis_connection('default')
+        QRCodeService.add_qrcodes(['A', 'B', 'C', 'D', 'E'])
+
+    def _wait_finished(self):
+        deadline = time.monotonic() + 5
+        while QRCodeService.get_purge_status()['status'] == 'running' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return QRCodeService.get_purge_status()
+
+    def test_purge(self):
+        response = self.client.post('/api/qrcode/purge/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['total'], 5)
+        # Consultas já negam antes do job terminar
+        self.assertEqual(QRCodeService.get_count(), 0)
+        self.assertFalse(QRCodeService.check_qrcodes(['A'])['A'])
+
+        job = self._wait_finished()
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['removed'], 5)
+        self.assertEqual(list(self.redis.scan_iter('qrcodes_registry:purge:*')), [])
+        self.assertEqual(self.client.get('/api/qrcode/purge/').json()['job_id'], job['job_id'])
+
+    def test_purge_requires_resync(self):
+        QRCodeService.start_purge()
+        self._wait_finished()
+        self.assertEqual(self.client.get('/api/qrcode/changes/', {'since': 0}).status_code, 410)
+
+    def test_one_purge_at_a_time(self):
+        lock = self.redis.lock(QRCodeService.PURGE_LOCK_KEY, timeout=5)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            self.assertEqual(self.client.post('/api/qrcode/purge/').status_code, 409)
+        finally:
+            lock.release()
+        self.assertEqual(QRCodeService.get_count(), 5)
+
+    def test_no_purge_yet(self):
+        self.assertEqual(self.client.get('/api/qrcode/purge/').status_code, 404)
+
+    def test_resume_interrupted_purge(self):
+        # Worker morto no meio de um expurgo: status 'running' sem o lock
+        old_key = f'{QRCodeService.PURGE_STATUS_KEY}:antigo'
+        self.redis.sadd(old_key, 'X', 'Y', 'Z')
+        self.redis.zadd(f'{old_key}:index', {'X': 0, 'Y': 0, 'Z': 0})
+        self.redis.hset(QRCodeService.PURGE_STATUS_KEY, mapping={
+            'job_id': 'antigo', 'key': old_key, 'status': 'running', 'total': 10, 'removed': 7,
+            'batch_size': 2, 'pause': 0, 'version': 1, 'started': 0, 'finished': '', 'error': '',
+        })
+        self.assertEqual(QRCodeService.get_purge_status()['status'], 'interrupted')
+
+        job = QRCodeService.start_purge()
+        self.assertEqual(job['total'], 8)
+        job = self._wait_finished()
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['removed'], 8)
+        self.assertEqual(list(self.redis.scan_iter(f'{old_key}*')), [])
+
+
+class LexRangeTests(SimpleTestCase):
+    """Limites do ZRANGEBYLEX a partir de prefixo, faixa e paginação"""
+
+    def test_no_filters(self):
+        self.assertEqual(QRCodeService.lex_range(), (b'-', b'+'))
+
+    def test_prefix(self):
+        self.assertEqual(QRCodeService.lex_range(prefix='ABC'), (b'[ABC', b'[ABC\xff'))
+
+    def test_range_inclusive(self):
+        self.assertEqual(QRCodeService.lex_range(start='A', end='C'), (b'[A', b'[C'))
+
+    def test_after_is_exclusive(self):
+        self.assertEqual(QRCodeService.lex_range(after='B'), (b'(B', b'+'))
+        # Empate com o início: o exclusivo vence
+        self.assertEqual(QRCodeService.lex_range(start='B', after='B'), (b'(B', b'+'))
+
+    def test_narrowest_range_wins(self):
+        self.assertEqual(QRCodeService.lex_range(prefix='AB', start='AA', end='AC'), (b'[AB', b'[AB\xff'))
+        self.assertEqual(QRCodeService.lex_range(prefix='A', start='AM', end='AN'), (b'[AM', b'[AN'))
+
+    def test_empty_ranges(self):
+        self.assertIsNone(QRCodeService.lex_range(start='C', end='A'))
+        self.assertIsNone(QRCodeService.lex_range(prefix='A', start='B'))
+        self.assertIsNone(QRCodeService.lex_range(end='B', after='B'))
+        self.assertEqual(QRCodeService.lex_range(start='B', end='B'), (b'[B', b'[B'))
+
+    def test_special_characters_are_literal(self):
+        # '-', '+', '[' e '(' no valor nunca viram limite especial do Redis
+        self.assertEqual(QRCodeService.lex_range(prefix='-'), (b'[-', b'[-\xff'))
+        self.assertEqual(QRCodeService.lex_range(start='+'), (b'[+', b'+'))
+        self.assertEqual(QRCodeService.lex_range(after='[x'), (b'([x', b'+'))
+        self.assertEqual(QRCodeService.lex_range(prefix='Á'), ('[Á'.encode(), '[Á'.encode() + b'\xff'))
+
+
+@redis_test_settings
+class SearchTests(RedisTestMixin, TestCase):
+    """Busca por prefixo/faixa na listagem"""
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.add_qrcodes(['AB1', 'AB2', 'AB3', 'AC1', 'B1', '-X', '[Y', 'ÁZ'])
+
+    def _search(self, **params):
+        response = self.client.get('/api/qrcode/list/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_paginated(self):
+        page = self._search(prefix='AB', limit=2)
+        self.assertEqual(page['qrcodes'], ['AB1', 'AB2'])
+        self.assertEqual(page['total'], 3)
+        self.assertEqual(page['next_after'], 'AB2')
+
+        page = self._search(prefix='AB', limit=2, after=page['next_after'])
+        self.assertEqual(page['qrcodes'], ['AB3'])
+        self.assertIsNone(page['next_after'])
+
+    def test_range(self):
+        self.assertEqual(self._search(start='AB2', end='B1')['qrcodes'], ['AB2', 'AB3', 'AC1', 'B1'])
+
+    def test_special_characters(self):
+        self.assertEqual(self._search(prefix='-')['qrcodes'], ['-X'])
+        self.assertEqual(self._search(prefix='[')['qrcodes'], ['[Y'])
+        self.assertEqual(self._search(prefix='Á')['qrcodes'], ['ÁZ'])
+
+    def test_removed_leave_index(self):
+        QRCodeService.remove_qrcode('AB2')
+        self.assertEqual(self._search(prefix='AB')['qrcodes'], ['AB1', 'AB3'])
+
+    def test_rebuild_index(self):
+        get_redis_connection('default').delete(QRCodeService.INDEX_KEY)
+        self.assertEqual(QRCodeService.rebuild_index(batch_size=3), 8)
+        self.assertEqual(self._search(prefix='A')['total'], 4)
+
+
+@redis_test_settings
+class ValidityWindowTests(RedisTestMixin, TestCase):
+    """Janelas de validade na consulta e remoção dos vencidos pelo sweeper"""
+
+    def setUp(self):
+        super().setUp()
+        QRCodeService.check_cache.invalidate('*')
+        self.now = datetime.now(timezone.utc)
+
+    def _check(self, qrcode):
+        return self.client.get(f'/api/qrcode/check/{qrcode}/').json()['authorized']
+
+    def test_window_checked(self):
+        hour = timedelta(hours=1)
+        QRCodeService.add_qrcode('FUTURO', valid_from=self.now + hour)
+        QRCodeService.add_qrcode('VENCIDO', valid_until=self.now - hour)
+        QRCodeService.add_qrcode('VALIDO', valid_from=self.now - hour, valid_until=self.now + hour)
+        QRCodeService.add_qrcode('SEMPRE')
+
+        self.assertEqual(QRCodeService.check_qrcodes(['FUTURO', 'VENCIDO', 'VALIDO', 'SEMPRE', 'NENHUM']), {
+            'FUTURO': False, 'VENCIDO': False, 'VALIDO': True, 'SEMPRE': True, 'NENHUM': False,
+        })
+
+    def test_register_with_window(self):
+        response = self.client.post('/api/qrcode/register/', {
+            'qrcode': 'INGRESSO', 'valid_from': (self.now + timedelta(days=1)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(self._check('INGRESSO'))
+
+        response = self.client.post('/api/qrcode/register/bulk/', {
+            'qrcodes': ['P1', 'P2'], 'valid_until': (self.now + timedelta(days=1)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self._check('P1'))
+
+    def test_window_order_validated(self):
+        response = self.client.post('/api/qrcode/register/', {
+            'qrcode': 'X', 'valid_from': self.now.isoformat(),
+            'valid_until': (self.now - timedelta(days=1)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_window_evaluated_each_check(self):
+        until = self.now + timedelta(minutes=1)
+        QRCodeService.add_qrcode('A', valid_until=until)
+        self.assertTrue(QRCodeService.check_qrcodes(['A'])['A'])
+
+        # Mesmo servido pelo cache local, vence no horário
+        with mock.patch('qrcodeapp.services.time.time', return_value=until.timestamp() + 1):
+            self.assertFalse(QRCodeService.check_qrcodes(['A'])['A'])
+
+    def test_sweep_expired(self):
+        redis_client = get_redis_connection('default')
+        QRCodeService.add_qrcodes(['V1', 'V2', 'V3'], valid_until=self.now - timedelta(minutes=1))
+        QRCodeService.add_qrcode('NOVO', valid_until=self.now + timedelta(days=1))
+        QRCodeService.add_qrcode('SEMPRE')
+        version = QRCodeService.get_version()
+
+        self.assertEqual(QRCodeService.sweep_expired(batch_size=2), 3)
+        self.assertEqual(sorted(QRCodeService.get_all_qrcodes()), ['NOVO', 'SEMPRE'])
+        for key in QRCodeService.WINDOW_KEYS:
+            self.assertEqual(redis_client.zmscore(key, ['V1', 'V2', 'V3']), [None, None, None])
+
+        changes = QRCodeService.get_changes(version)['changes']
+        self.assertEqual(sorted((change['op'], change['qrcode']) for change in changes),
+                         [('remove', 'V1'), ('remove', 'V2'), ('remove', 'V3')])
+        self.assertEqual(QRCodeService.sweep_expired(), 0)
+
+    def test_sweep_skips_already_removed(self):
+        QRCodeService.add_qrcode('A', valid_until=self.now - timedelta(minutes=1))
+        # Sobra de um ZSET sem o membro no SET: limpa sem gerar versão
+        get_redis_connection('default').srem(QRCodeService.REGISTRY_KEY, 'A')
+        version = QRCodeService.get_version()
+        self.assertEqual(QRCodeService.sweep_expired(), 1)
+        self.assertEqual(QRCodeService.get_version(), version)
+
+
+@redis_test_settings
+class TokenBucketTests(RedisTestMixin, TestCase):
+    """Script TOKEN_BUCKET e o throttle por usuário/endpoint"""
+
+    def _take(self, now, capacity=2, rate=1.0):
+        allowed, wait = QRCodeService._get_script('TOKEN_BUCKET')(
+            keys=['qrcodeapp:throttle:teste'], args=[capacity, rate, now, 10])
+        return allowed, float(wait)
+
+    def test_parse_rate(self):
+        self.assertEqual(RedisTokenBucketThrottle.parse_rate('120/min'), (120, 2.0))
+        self.assertEqual(RedisTokenBucketThrottle.parse_rate('10/s'), (10, 10.0))
+
+    def test_bucket_burst_and_refill(self):
+        self.assertEqual(self._take(1000), (1, 0.0))
+        self.assertEqual(self._take(1000), (1, 0.0))
+        self.assertEqual(self._take(1000), (0, 1.0))
+        self.assertEqual(self._take(1000.5), (0, 0.5))
+        self.assertEqual(self._take(1001), (1, 0.0))
+        # Nunca passa da capacidade, por mais tempo que fique parado
+        self.assertEqual([self._take(2000)[0] for _ in range(3)], [1, 1, 0])
+
+    @override_settings(QRCODE_THROTTLE_RATES={'check': '2/min'})
+    def test_throttled_with_retry_after(self):
+        QRCodeService.add_qrcode('A')
+        statuses = [self.client.get('/api/qrcode/check/A/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get('/api/qrcode/check/A/')
+        self.assertEqual(int(response['Retry-After']), 30)
+        # Cada endpoint tem o seu balde
+        self.assertEqual(self.client.get('/api/qrcode/list/').status_code, 200)
+
+    @override_settings(QRCODE_THROTTLE_RATES={'check': '1/min'},
+                       QRCODE_THROTTLE_USER_RATES={'teste': {'check': '3/min'}})
+    def test_per_user_rate(self):
+        statuses = [self.client.get('/api/qrcode/check/A/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    @override_settings(QRCODE_THROTTLE_RATES={'check': '1/min'})
+    def test_fails_open_without_redis(self):
+        with mock.patch.object(QRCodeService, '_get_script', side_effect=ConnectionError('Redis fora do ar')):
+            throttle = RedisTokenBucketThrottle()
+            request = mock.Mock(user=self.user)
+            view = mock.Mock(throttle_scope='check')
+            self.assertTrue(all(throttle.allow_request(request, view) for _ in range(5)))
+
+
+@override_settings(QRCODE_REDIS_WRITE_URL='redis://primario:6379/1', QRCODE_REDIS_READ_URL='redis://replica:6379/1',
+                   QRCODE_REDIS_SENTINELS=[], QRCODE_READ_YOUR_WRITES=True)
+class ConnectionRoutingTests(SimpleTestCase):
+    """Leituras na réplica, mutações no primário e read-your-writes por requisição"""
+
+    def setUp(self):
+        self.clients = {connections.PRIMARY: mock.Mock(name='primario'),
+                        connections.REPLICA: mock.Mock(name='replica')}
+        patches = [
+            mock.patch.dict(connections._clients, clear=True),
+            mock.patch.object(connections, '_build', side_effect=lambda role, blocking=False: self.clients[role]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # Contexto vazio: sem a marca deixada por outros testes (que chamam os
+        # serviços fora do middleware), e mark_write daqui não vaza para eles
+        self.context = contextvars.Context()
+
+    def test_roles(self):
+        def run():
+            self.assertIs(connections.get_client(connections.PRIMARY), self.clients[connections.PRIMARY])
+            self.assertIs(connections.get_client(connections.REPLICA), self.clients[connections.REPLICA])
+            self.assertEqual(connections.read_role(), connections.REPLICA)
+        self.context.run(run)
+
+    def test_reads_follow_write(self):
+        def run():
+            connections.mark_write()
+            self.assertEqual(connections.read_role(), connections.PRIMARY)
+            self.assertIs(connections.get_client(connections.REPLICA), self.clients[connections.PRIMARY])
+        self.context.run(run)
+
+    @override_settings(QRCODE_READ_YOUR_WRITES=False)
+    def test_read_your_writes_disabled(self):
+        def run():
+            connections.mark_write()
+            self.assertIs(connections.get_client(connections.REPLICA), self.clients[connections.REPLICA])
+        self.context.run(run)
+
+    @override_settings(QRCODE_REDIS_WRITE_URL=None, QRCODE_REDIS_READ_URL=None)
+    def test_default_connection_without_config(self):
+        default = get_redis_connection('default')
+        self.assertIs(connections.get_client(connections.PRIMARY), default)
+        self.assertIs(connections.get_client(connections.REPLICA), default)
+
+    @override_settings(QRCODE_REDIS_READ_URL=None)
+    def test_replica_falls_back_to_primary(self):
+        self.assertIs(connections.get_client(connections.REPLICA), self.clients[connections.PRIMARY])
+
+    def test_middleware_resets_mark(self):
+        roles = []
+
+        def view(request):
+            roles.append(connections.read_role())
+            connections.mark_write()
+            roles.append(connections.read_role())
+
+        middleware = connections.read_your_writes_middleware(view)
+
+        def run():
+            # Marca deixada por uma requisição anterior na mesma thread
+            connections.mark_write()
+            middleware(None)
+            middleware(None)
+        self.context.run(run)
+        self.assertEqual(roles, [connections.REPLICA, connections.PRIMARY] * 2)
+
+    def test_async_middleware_resets_mark(self):
+        roles = []
+
+        async def view(request):
+            roles.append(connections.read_role())
+            connections.mark_write()
+            roles.append(connections.read_role())
+
+        middleware = connections.read_your_writes_middleware(view)
+
+        async def requests():
+            await middleware(None)
+            await middleware(None)
+            roles.append(connections.read_role())
+        self.context.run(async_to_sync(requests))
+        self.assertEqual(roles, [connections.REPLICA, connections.PRIMARY] * 2 + [connections.REPLICA])
+
+
+class SSEMessageTests(SimpleTestCase):
+
+    def test_event_encoded_with_orjson(self):
+        event = {'id': '1729260000000-0', 'qrcode': 'ÁBC', 'result': 'allowed', 'direction': 'E'}
+        self.assertEqual(
+            _sse_message(event),
+            'id: 1729260000000-0\nevent: access\n'
+            'data: {"id":"1729260000000-0","qrcode":"ÁBC","result":"allowed","direction":"E"}\n\n'
+        )
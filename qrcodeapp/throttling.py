@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .services import QRCodeService
+
+
+class RedisTokenBucketThrottle(BaseThrottle):
+    """
+    Limite de requisições por usuário e por endpoint (token bucket no Redis)
+    O endpoint é o `throttle_scope` da view e o orçamento vem de
+    QRCODE_THROTTLE_RATES: '60/min' é um balde de 60 tokens reposto ao longo
+    de um minuto, então rajadas curtas passam e o ritmo médio é limitado.
+    QRCODE_THROTTLE_USER_RATES troca o orçamento de um usuário específico.
+    Cada requisição custa um único EVALSHA (o throttle padrão do DRF faz
+    get + set no cache); se o Redis falhar, a requisição passa
+    """
+
+    KEY_PREFIX = "qrcodeapp:throttle"
+    PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    @classmethod
+    def parse_rate(cls, rate: str):
+        """'60/min' -> (capacidade, tokens por segundo)"""
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, capacity / cls.PERIODS[period[0]]
+
+    def get_rate(self, request, scope: str):
+        user_rates = getattr(settings, 'QRCODE_THROTTLE_USER_RATES', {})
+        username = getattr(request.user, 'username', None)
+        if username in user_rates and scope in user_rates[username]:
+            return user_rates[username][scope]
+        return getattr(settings, 'QRCODE_THROTTLE_RATES', {}).get(scope)
+
+    def get_ident(self, request):
+        """Chave de API, id do usuário ou IP (nessa ordem)"""
+        user = request.user
+        if getattr(user, 'key_id', None):
+            return f"key:{user.key_id}"
+        if user and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = self.get_rate(request, scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, refill = self.parse_rate(rate)
+        try:
+            allowed, wait = QRCodeService._get_script('TOKEN_BUCKET')(
+                keys=[f"{self.KEY_PREFIX}:{scope}:{self.get_ident(request)}"],
+                # O balde expira quando estaria cheio de novo
+                args=[capacity, refill, time.time(), int(capacity / refill) + 1],
+            )
+        except Exception as e:
+            print(f"Erro ao verificar limite de requisições: {e}")
+            return True
+
+        if allowed:
+            return True
+        self.wait_seconds = float(wait)
+        return False
+
+    def wait(self):
+        return self.wait_seconds
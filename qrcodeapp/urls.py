@@ -1,8 +1,42 @@
+from django.conf import settings
 from django.urls import path
-from .views import QRCodeRegisterView, QRCodeListView, QRCodeDeleteView
+from .views import (
+    QRCodeRegisterView, QRCodeBulkRegisterView, QRCodeImportView, QRCodeListView, QRCodeExportView,
+    QRCodeChangesView, QRCodeCheckView, QRCodeCheckBatchView, QRCodeDeleteView, QRCodeBulkDeleteView,
+    QRCodePurgeView, QRCodeEventsView, QRCodeEventsRollupView,
+    QRCodeEventsStreamView
+)
+
+if getattr(settings, 'QRCODE_ASYNC_VIEWS', False):
+    # Modo ASGI: as rotas mais acessadas usam views assíncronas (redis.asyncio)
+    from .async_views import (
+        AsyncQRCodeRegisterView as RegisterView,
+        AsyncQRCodeListView as ListView,
+        AsyncQRCodeExportView as ExportView,
+        AsyncQRCodeCheckView as CheckView,
+        AsyncQRCodeCheckBatchView as CheckBatchView,
+        AsyncQRCodeDeleteView as DeleteView,
+        AsyncAccessEventStreamView as EventsStreamView,
+    )
+else:
+    RegisterView, ListView, ExportView, CheckView, CheckBatchView, DeleteView, EventsStreamView = (
+        QRCodeRegisterView, QRCodeListView, QRCodeExportView, QRCodeCheckView, QRCodeCheckBatchView,
+        QRCodeDeleteView, QRCodeEventsStreamView
+    )
 
 urlpatterns = [
-    path('register/', QRCodeRegisterView.as_view(), name='register-qrcode'),
-    path('list/', QRCodeListView.as_view(), name='list-qrcodes'),
-    path('delete/', QRCodeDeleteView.as_view(), name='delete-qrcode'),
-] 
\ No newline at end of file
+    path('register/', RegisterView.as_view(), name='register-qrcode'),
+    path('register/bulk/', QRCodeBulkRegisterView.as_view(), name='register-qrcode-bulk'),
+    path('import/', QRCodeImportView.as_view(), name='import-qrcodes'),
+    path('list/', ListView.as_view(), name='list-qrcodes'),
+    path('export/', ExportView.as_view(), name='export-qrcodes'),
+    path('changes/', QRCodeChangesView.as_view(), name='qrcode-changes'),
+    path('check/', CheckBatchView.as_view(), name='check-qrcodes'),
+    path('check/<path:qrcode>/', CheckView.as_view(), name='check-qrcode'),
+    path('delete/', DeleteView.as_view(), name='delete-qrcode'),
+    path('delete/bulk/', QRCodeBulkDeleteView.as_view(), name='delete-qrcode-bulk'),
+    path('purge/', QRCodePurgeView.as_view(), name='purge-qrcodes'),
+    path('events/', QRCodeEventsView.as_view(), name='qrcode-events'),
+    path('events/rollup/', QRCodeEventsRollupView.as_view(), name='qrcode-events-rollup'),
+    path('events/stream/', EventsStreamView.as_view(), name='qrcode-events-stream'),
+]
@@ -1,15 +1,30 @@
 from django.shortcuts import render
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.parsers import MultiPartParser
+import csv
+import gzip
+import io
 import os
-from .serializers import QRCodeSerializer
-from .services import QRCodeService
+import orjson
+from .serializers import (
+    QRCodeSerializer, QRCodeBulkSerializer, QRCodeListQuerySerializer, QRCodeChangesQuerySerializer,
+    QRCodeCheckBatchSerializer, QRCodeEventsQuerySerializer, QRCodeRollupQuerySerializer
+)
+from .services import QRCodeService, AccessEventService
+from .importers import QRCodeFileParser
+from .permissions import IsAccountUser
+from .renderers import CONTENT_TYPES
 
 # Create your views here.
 
 class QRCodeRegisterView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'register'
 
     def post(self, request):
         serializer = QRCodeSerializer(data=request.data)
@@ -20,7 +35,7 @@ class QRCodeRegisterView(APIView):
         
         try:
             # Tentar adicionar o QR code (Redis verifica duplicatas automaticamente)
-            success = QRCodeService.add_qrcode(qrcode)
+            success = QRCodeService.add_qrcode(qrcode, **serializer.validity())
             
             if success:
                 return Response({
@@ -34,24 +49,304 @@ class QRCodeRegisterView(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class QRCodeBulkRegisterView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'register_bulk'
+
+    def post(self, request):
+        serializer = QRCodeBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        qrcodes = serializer.validated_data['qrcodes']
+        
+        try:
+            # Grava todos os QR codes em pipelines (poucos round trips por requisição)
+            added = QRCodeService.add_qrcodes(qrcodes, **serializer.validity())
+            
+            results = []
+            seen = set()
+            for qrcode in qrcodes:
+                created = added[qrcode] and qrcode not in seen
+                seen.add(qrcode)
+                results.append({
+                    'qrcode': qrcode,
+                    'status': 'created' if created else 'duplicate'
+                })
+            
+            created_count = sum(1 for r in results if r['status'] == 'created')
+            return Response({
+                'created': created_count,
+                'duplicates': len(results) - created_count,
+                'results': results
+            }, status=status.HTTP_201_CREATED if created_count else status.HTTP_200_OK)
+                
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeImportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'import'
+    parser_classes = [MultiPartParser]
+
+    IMPORT_MODES = ('append', 'replace')
+
+    def post(self, request):
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'O campo file é obrigatório.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        mode = request.data.get('mode') or request.query_params.get('mode') or 'append'
+        if mode not in self.IMPORT_MODES:
+            return Response({'error': 'Modo inválido. Use append ou replace.'}, status=status.HTTP_400_BAD_REQUEST)
+        if mode == 'replace':
+            # Substituir o registro inteiro é destrutivo: só usuários, não dispositivos
+            permission = IsAccountUser()
+            if not permission.has_permission(request, self):
+                self.permission_denied(request, message=permission.message)
+        
+        file_format = request.data.get('format') or QRCodeFileParser.detect_format(uploaded_file.name)
+        if file_format not in QRCodeFileParser.FORMATS:
+            return Response({'error': 'Formato inválido. Use csv ou ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # O arquivo é lido linha a linha e gravado em lotes pipelined
+            rows = QRCodeFileParser(uploaded_file, file_format)
+            counts = QRCodeService.import_qrcodes(rows, replace=(mode == 'replace'))
+            
+            return Response({
+                'mode': mode,
+                'inserted': counts['inserted'],
+                'duplicate': counts['duplicate'],
+                'invalid': rows.invalid
+            }, status=status.HTTP_200_OK)
+            
+        except ValueError as e:
+            # replace sem nenhum QR code válido: o registro continua como estava
+            return Response({
+                'error': str(e),
+                'invalid': rows.invalid
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def list_media_format(request):
+    """Formato do corpo da listagem: MessagePack se negociado, senão JSON"""
+    media_format = request.accepted_renderer.format
+    return media_format if media_format in CONTENT_TYPES else 'json'
+
+def accepts_gzip(request):
+    """
+    True se a página vai comprimida (o payload em cache já está em gzip)
+    Respeita os q-values do Accept-Encoding: `gzip;q=0` recusa o gzip e `*`
+    vale para ele quando não é citado
+    """
+    qualities = {}
+    for entry in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [part.strip() for part in entry.split(';')]
+        coding = 'gzip' if coding.lower() == 'x-gzip' else coding.lower()
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+def list_etag(version, cursor, limit, media_format='json', gzipped=False):
+    """
+    ETag da página da listagem: muda junto com a versão do registro
+    Cada representação (formato e gzip/identity) tem o seu, então um cache
+    intermediário nunca entrega o corpo comprimido a quem não pediu gzip
+    """
+    etag = f'{version}-{cursor}-{limit}'
+    if media_format != 'json':
+        etag += f'-{media_format}'
+    if gzipped:
+        etag += '-gzip'
+    return f'"{etag}"'
+
+def not_modified(request, etag):
+    """Verifica se o If-None-Match do cliente já corresponde ao ETag"""
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match))
+
+def not_modified_response(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    # Mesmo Vary do 200: o ETag só vale para a representação negociada
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
+
+def list_payload_response(request, payload, etag, media_format='json'):
+    """Envia a página já comprimida se o cliente aceitar gzip"""
+    content_type = CONTENT_TYPES[media_format]
+    if accepts_gzip(request):
+        response = HttpResponse(payload, content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(payload), content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
+
 class QRCodeListView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'list'
 
     def get(self, request):
+        query = QRCodeListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        cursor = query.validated_data['cursor']
+        limit = query.validated_data['limit']
+        search = query.search_params()
+        
+        try:
+            if search:
+                # Prefixo/faixa: ZRANGEBYLEX no índice, paginado por `after`
+                result = QRCodeService.search_qrcodes(limit=limit, **search)
+                result['version'] = QRCodeService.get_version()
+                return Response(result, status=status.HTTP_200_OK)
+            
+            # A versão do registro muda a cada alteração: basta um GET para o ETag
+            version = QRCodeService.get_version()
+            # O corpo já sai serializado do cache, no formato negociado (JSON ou MessagePack)
+            media_format = list_media_format(request)
+            etag = list_etag(version, cursor, limit, media_format, accepts_gzip(request))
+            
+            if not_modified(request, etag):
+                return not_modified_response(etag)
+            
+            # Página via SSCAN; o cliente segue next_cursor até receber 0
+            payload = QRCodeService.get_list_payload(version, cursor, limit, media_format)
+            return list_payload_response(request, payload, etag, media_format)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def ndjson_chunk(batch):
+    """Lote de QR codes como linhas NDJSON"""
+    return b''.join(orjson.dumps({'qrcode': qrcode}) + b'\n' for qrcode in batch)
+
+def csv_chunk(rows):
+    """Linhas CSV de um lote (ou do cabeçalho)"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+CSV_HEADER = [['qrcode']]
+
+def _export_ndjson():
+    """Gera o registro como NDJSON, um lote de SSCAN por vez"""
+    for batch in QRCodeService.iter_qrcode_batches():
+        yield ndjson_chunk(batch)
+
+def _export_csv():
+    """Gera o registro como CSV, um lote de SSCAN por vez"""
+    yield csv_chunk(CSV_HEADER)
+    for batch in QRCodeService.iter_qrcode_batches():
+        yield csv_chunk([qrcode] for qrcode in batch)
+
+class QRCodeExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'export'
+
+    EXPORT_FORMATS = {
+        'ndjson': (_export_ndjson, 'application/x-ndjson'),
+        'csv': (_export_csv, 'text/csv'),
+    }
+
+    def perform_content_negotiation(self, request, force=False):
+        # `?format=` é o formato do arquivo, não um renderer do DRF
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        export_format = request.query_params.get('format', 'ndjson')
+        if export_format not in self.EXPORT_FORMATS:
+            return Response({
+                'error': 'Formato inválido. Use ndjson ou csv.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # A memória fica constante: cada lote é enviado assim que sai do Redis
+        generator, content_type = self.EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(generator(), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="qrcodes.{export_format}"'
+        return response
+
+class QRCodeChangesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'changes'
+
+    def get(self, request):
+        query = QRCodeChangesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
-            qrcodes = QRCodeService.get_all_qrcodes()
-            total = QRCodeService.get_count()
+            changes = QRCodeService.get_changes(
+                query.validated_data['since'],
+                query.validated_data['limit']
+            )
             
+            if changes is None:
+                # Histórico já descartado: o cliente deve recarregar a lista completa
+                return Response({
+                    'error': 'Histórico de mudanças indisponível, sincronização completa necessária.',
+                    'resync_required': True,
+                    'version': QRCodeService.get_version()
+                }, status=status.HTTP_410_GONE)
+            
+            return Response(changes, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeCheckView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'check'
+
+    def get(self, request, qrcode):
+        try:
+            # Cache local do worker na frente do Redis (invalidado via pub/sub)
+            authorized = QRCodeService.check_qrcodes([qrcode])[qrcode]
             return Response({
-                'qrcodes': qrcodes,
-                'total': total
+                'qrcode': qrcode,
+                'authorized': authorized
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class QRCodeDeleteView(APIView):
+class QRCodeCheckBatchView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'check'
+
+    def post(self, request):
+        serializer = QRCodeCheckBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        qrcodes = serializer.validated_data['qrcodes']
+        
+        try:
+            authorized = QRCodeService.check_qrcodes(qrcodes)
+            return Response({
+                'results': [{'qrcode': qrcode, 'authorized': authorized[qrcode]} for qrcode in qrcodes]
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeDeleteView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAccountUser]
+    throttle_scope = 'delete'
 
     def delete(self, request):
         qrcode = request.data.get('qrcode')
@@ -73,3 +368,127 @@ class QRCodeDeleteView(APIView):
                 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeBulkDeleteView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAccountUser]
+    throttle_scope = 'delete_bulk'
+
+    def delete(self, request):
+        serializer = QRCodeBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        qrcodes = serializer.validated_data['qrcodes']
+        
+        try:
+            # Cada lote é removido por um script atômico (um round trip por lote)
+            removed = QRCodeService.remove_qrcodes(qrcodes)
+            
+            results = []
+            seen = set()
+            for qrcode in qrcodes:
+                deleted = removed[qrcode] and qrcode not in seen
+                seen.add(qrcode)
+                results.append({
+                    'qrcode': qrcode,
+                    'status': 'removed' if deleted else 'not_found'
+                })
+            
+            removed_count = sum(1 for r in results if r['status'] == 'removed')
+            return Response({
+                'removed': removed_count,
+                'not_found': len(results) - removed_count,
+                'results': results
+            }, status=status.HTTP_200_OK)
+                
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodePurgeView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAccountUser]
+    throttle_scope = 'purge'
+
+    def post(self, request):
+        try:
+            # O registro é esvaziado na hora; a memória é liberada em lotes pelo job
+            job = QRCodeService.start_purge()
+            if job is None:
+                return Response({
+                    'error': 'Já existe um expurgo em andamento.',
+                    'job': QRCodeService.get_purge_status()
+                }, status=status.HTTP_409_CONFLICT)
+            
+            return Response(job, status=status.HTTP_202_ACCEPTED)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get(self, request):
+        try:
+            job = QRCodeService.get_purge_status()
+            if job is None:
+                return Response({'error': 'Nenhum expurgo executado.'}, status=status.HTTP_404_NOT_FOUND)
+            
+            return Response(job, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeEventsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'events'
+
+    def get(self, request):
+        query = QRCodeEventsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # Intervalo de tempo = faixa de ids do stream (XRANGE), sem percorrer o resto
+            events = AccessEventService.get_events(
+                start=query.validated_data.get('from'),
+                end=query.validated_data.get('to'),
+                qrcode=query.validated_data.get('code'),
+                cursor=query.validated_data.get('cursor'),
+                limit=query.validated_data['limit']
+            )
+            return Response(events, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeEventsRollupView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'events'
+
+    def get(self, request):
+        query = QRCodeRollupQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        granularity = query.validated_data['granularity']
+        gate = query.validated_data.get('gate')
+        
+        try:
+            # Contadores mantidos pelas catracas a cada leitura: não relê os eventos
+            rollups = AccessEventService.get_rollups(
+                granularity, query.validated_data['from'], query.validated_data['to'], gate
+            )
+            return Response({
+                'granularity': granularity,
+                'gate': gate,
+                'rollups': rollups
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class QRCodeEventsStreamView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'events_stream'
+
+    def get(self, request):
+        # Workers síncronos ficariam presos a cada tela conectada
+        return Response({
+            'error': 'O feed ao vivo exige o modo assíncrono (gunicorn_asgi.conf.py).'
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
@@ -0,0 +1,11 @@
+"""
+ASGI config for rasp_api project - Production
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rasp_api.settings_prod')
+
+application = get_asgi_application()
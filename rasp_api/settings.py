@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'qrcodeapp.connections.read_your_writes_middleware',
 ]
 
 ROOT_URLCONF = 'rasp_api.urls'
@@ -126,11 +128,54 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuração do Django REST Framework para usar JWT
+# O usuário do token fica em cache (memória + Redis) para não ler o SQLite a cada requisição
+# Dispositivos podem usar chave de API (manage.py api_keys) em vez de JWT
+# Limite de requisições: token bucket no Redis, um EVALSHA por requisição
+# JSON com orjson; clientes podem pedir/enviar MessagePack (application/msgpack)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'qrcodeapp.authentication.CachedJWTAuthentication',
+        'qrcodeapp.authentication.APIKeyAuthentication',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'qrcodeapp.throttling.RedisTokenBucketThrottle',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'qrcodeapp.renderers.ORJSONRenderer',
+        'qrcodeapp.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'qrcodeapp.renderers.ORJSONParser',
+        'qrcodeapp.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# Orçamento por usuário (ou chave de API) em cada endpoint ('throttle_scope' da view)
+# '120/min' = rajada de até 120 requisições, repostas ao longo de um minuto
+# Excedido: 429 com Retry-After. Endpoint fora da lista não é limitado
+QRCODE_THROTTLE_RATES = {
+    'register': '120/min',
+    'register_bulk': '30/min',
+    'import': '10/min',
+    'list': '120/min',
+    'export': '10/min',
+    'changes': '600/min',
+    'check': '1200/min',
+    'delete': '120/min',
+    'delete_bulk': '30/min',
+    'purge': '5/min',
+    'events': '120/min',
+    'events_stream': '30/min',
 }
+# Exceções por usuário: {'username': {'register': '600/min'}} (chaves de API: 'device:<nome>')
+QRCODE_THROTTLE_USER_RATES = {}
+
+# Cache do usuário autenticado via JWT (segundos)
+QRCODE_AUTH_CACHE_TTL = 300  # no Redis, compartilhado entre os workers
+QRCODE_AUTH_LOCAL_TTL = 10   # na memória de cada worker
 
 # Configuração do Redis
 CACHES = {
@@ -143,6 +188,42 @@ CACHES = {
     }
 }
 
+# Conexões do registro de QR codes (qrcodeapp.connections)
+# Sem configuração, leituras e mutações usam a conexão acima. Com uma réplica,
+# list/export/contagem/busca leem dela e as mutações vão para o primário
+QRCODE_REDIS_WRITE_URL = os.environ.get('QRCODE_REDIS_WRITE_URL')  # ex.: redis://127.0.0.1:6379/1
+QRCODE_REDIS_READ_URL = os.environ.get('QRCODE_REDIS_READ_URL')    # ex.: redis://127.0.0.1:6380/1
+# Sentinel (opcional, tem precedência sobre as URLs): descobre primário e réplicas
+# QRCODE_REDIS_SENTINELS="host:porta,host:porta" -> [('host', porta), ...]
+QRCODE_REDIS_SENTINELS = [
+    (host, int(port))
+    for host, _, port in (
+        entry.strip().rpartition(':') for entry in os.environ.get('QRCODE_REDIS_SENTINELS', '').split(',')
+        if entry.strip()
+    )
+]
+QRCODE_REDIS_SENTINEL_SERVICE = os.environ.get('QRCODE_REDIS_SENTINEL_SERVICE', 'mymaster')
+QRCODE_REDIS_SENTINEL_TIMEOUT = 0.5  # segundos; só as consultas ao Sentinel
+# Timeout dos comandos no primário/réplica (URLs ou Sentinel). Pub/sub e XREAD
+# BLOCK usam clientes próprios, sem timeout de leitura
+QRCODE_REDIS_SOCKET_TIMEOUT = 10
+QRCODE_REDIS_DB = 1
+# Depois de uma mutação, as leituras da mesma requisição vão para o primário
+QRCODE_READ_YOUR_WRITES = True
+
+# Cache local (por worker) das consultas /api/qrcode/check/, invalidado via Redis pub/sub
+QRCODE_CHECK_CACHE_SIZE = 10000  # QR codes em memória por worker
+QRCODE_CHECK_CACHE_TTL = 5       # segundos
+
+# Expurgo do registro (POST /api/qrcode/purge/): ritmo do job em background
+QRCODE_PURGE_BATCH_SIZE = 1000  # QR codes apagados por lote (SPOP)
+QRCODE_PURGE_PAUSE = 0.01       # segundos entre lotes
+
+# Modo assíncrono (ASGI + uvicorn, ver gunicorn_asgi.conf.py): register/list/delete/check
+# passam a usar views async com redis.asyncio
+QRCODE_ASYNC_VIEWS = os.environ.get('QRCODE_ASYNC_VIEWS') == '1'
+QRCODE_ASYNC_REDIS_MAX_CONNECTIONS = 50  # pool compartilhado por worker
+
 # Usar Redis para sessões
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
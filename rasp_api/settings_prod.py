@@ -71,6 +71,18 @@ CACHES = {
     }
 }
 
+# Limite de requisições em produção: os workers síncronos também atendem as catracas,
+# então um integrador não pode monopolizar register/list
+QRCODE_THROTTLE_RATES = {
+    **QRCODE_THROTTLE_RATES,
+    'register': '60/min',
+    'register_bulk': '10/min',
+    'import': '5/min',
+    'list': '60/min',
+    'export': '5/min',
+}
+QRCODE_THROTTLE_USER_RATES = {}
+
 # Usar Redis para sessões
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default" 
\ No newline at end of file
@@ -36,6 +36,7 @@ scp gunicorn.conf.py $RASPBERRY_USER@$RASPBERRY_IP:$RASPBERRY_PATH/
 
 # 3. Copiar arquivos do QR Code Gate
 echo "📦 Copiando arquivos do QR Code Gate..."
+scp -r gate/ $RASPBERRY_USER@$RASPBERRY_IP:$RASPBERRY_PATH/
 scp qrcode_gate_redis.py $RASPBERRY_USER@$RASPBERRY_IP:$RASPBERRY_PATH/
 scp configure_raspberry_redis.py $RASPBERRY_USER@$RASPBERRY_IP:$RASPBERRY_PATH/
 